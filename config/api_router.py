@@ -0,0 +1,9 @@
+from rest_framework.routers import DefaultRouter
+
+from fare.users.api.views import UserViewSet
+
+router = DefaultRouter()
+router.register("users", UserViewSet, basename="user")
+
+app_name = "api"
+urlpatterns = router.urls
@@ -41,6 +41,19 @@ DATABASES = {
     'default': env.db('DATABASE_URL'),
 }
 DATABASES['default']['ATOMIC_REQUESTS'] = True
+# read replicas, see fare.core.replicas
+DATABASE_REPLICAS = []
+for index, url in enumerate(env.list('DATABASE_REPLICA_URLS', default=[]), start=1):
+    DATABASES[f'replica_{index}'] = env.db_url_config(url)
+    DATABASE_REPLICAS.append(f'replica_{index}')
+DATABASE_ROUTERS = ['fare.core.replicas.ReplicaRouter']
+# models read from the replicas, by app label
+DATABASE_REPLICA_APPS = ['users', 'account', 'socialaccount']
+# after a write, the client reads from the primary for this long
+DATABASE_REPLICA_STICKY_SECONDS = env.int('DATABASE_REPLICA_STICKY_SECONDS', default=10)
+# replicas lagging more (in seconds) or unreachable are skipped, checked at most every interval
+DATABASE_REPLICA_MAX_LAG = env.float('DATABASE_REPLICA_MAX_LAG', default=5.0)
+DATABASE_REPLICA_CHECK_INTERVAL = 5
 
 # URLS
 # ------------------------------------------------------------------------------
@@ -69,7 +82,9 @@ THIRD_PARTY_APPS = [
     'rest_framework',
 ]
 LOCAL_APPS = [
+    'fare.core.apps.CoreAppConfig',
     'fare.users.apps.UsersAppConfig',
+    'fare.announcements.apps.AnnouncementsAppConfig',
     # Your stuff: custom apps go here
 ]
 # https://docs.djangoproject.com/en/dev/ref/settings/#installed-apps
@@ -102,11 +117,19 @@ LOGIN_URL = 'account_login'
 PASSWORD_HASHERS = [
     # https://docs.djangoproject.com/en/dev/topics/auth/passwords/#using-argon2-with-django
     'django.contrib.auth.hashers.Argon2PasswordHasher',
+    # legacy PBKDF2 hashes wrapped in Argon2 by fare.users.tasks.upgrade_legacy_password_hashes
+    'fare.users.hashers.Argon2WrappedPBKDF2PasswordHasher',
+    'fare.users.hashers.Argon2WrappedPBKDF2SHA1PasswordHasher',
     'django.contrib.auth.hashers.PBKDF2PasswordHasher',
     'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
     'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
     'django.contrib.auth.hashers.BCryptPasswordHasher',
 ]
+# fare.users.hashing: processes hashing passwords off the request thread, 0 hashes inline
+PASSWORD_HASHING_POOL_SIZE = env.int('PASSWORD_HASHING_POOL_SIZE', default=0)
+# requests of a process allowed to wait for the pool, and how long the others wait for a slot
+PASSWORD_HASHING_MAX_PENDING = env.int('PASSWORD_HASHING_MAX_PENDING', default=4)
+PASSWORD_HASHING_ADMISSION_TIMEOUT = env.float('PASSWORD_HASHING_ADMISSION_TIMEOUT', default=2.0)
 # https://docs.djangoproject.com/en/dev/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -128,13 +151,50 @@ AUTH_PASSWORD_VALIDATORS = [
 # https://docs.djangoproject.com/en/dev/ref/settings/#middleware
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # above the page cache, which stores no header set by the middleware below it
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'fare.core.middleware.QueryInstrumentationMiddleware',
+    'fare.core.pagecache.PageCacheMiddleware',
+    'fare.core.middleware.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'fare.users.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'fare.users.middleware.PasswordHashingBusyMiddleware',
+    'fare.core.middleware.ReadOnlyViewMiddleware',
+]
+# fare.core.handlers: URL groups served by a shorter middleware chain, the first matching wins
+MIDDLEWARE_GROUPS = [
+    {
+        # health checks of the load balancer and the containers
+        'PATHS': [r'^/health/$'],
+        'MIDDLEWARE': ['django.middleware.security.SecurityMiddleware'],
+    },
+    {
+        # the public pages, for the visitors without a session: no session, CSRF, user or messages
+        'PATHS': [r'^/$', r'^/about/$'],
+        'ANONYMOUS_ONLY': True,
+        'MIDDLEWARE': [
+            'django.middleware.security.SecurityMiddleware',
+            'django.middleware.clickjacking.XFrameOptionsMiddleware',
+            'fare.core.middleware.QueryInstrumentationMiddleware',
+            'fare.core.pagecache.PageCacheMiddleware',
+            'fare.core.middleware.AnonymousUserMiddleware',
+            'fare.core.middleware.ReadOnlyViewMiddleware',
+        ],
+    },
 ]
+# fare.core.queries: statements run this many times in a request are logged as a likely N+1
+QUERY_REPEAT_THRESHOLD = env.int('QUERY_REPEAT_THRESHOLD', default=5)
+# statements slower than this are explained and stored in SlowQuery, for a sample of the requests
+SLOW_QUERY_THRESHOLD_MS = env.float('SLOW_QUERY_THRESHOLD_MS', default=200)
+SLOW_QUERY_SAMPLE_RATE = env.float('SLOW_QUERY_SAMPLE_RATE', default=1.0)
+# fare.core.pagecache: seconds an anonymous page is cached, and the max-age sent with it
+PAGE_CACHE_TIMEOUT = env.int('PAGE_CACHE_TIMEOUT', default=300)
+PAGE_CACHE_BROWSER_TIMEOUT = env.int('PAGE_CACHE_BROWSER_TIMEOUT', default=60)
+# bearer token of the scrapers of /metrics/, which staff users can read anyway
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
 
 # STATIC
 # ------------------------------------------------------------------------------
@@ -193,6 +253,8 @@ TEMPLATES = [
         },
     },
 ]
+# fare.core.warmup: compile the templates when the WSGI application loads (needs the cached loader)
+TEMPLATE_WARMUP = env.bool('DJANGO_TEMPLATE_WARMUP', default=False)
 # http://django-crispy-forms.readthedocs.io/en/latest/install.html#template-packs
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
@@ -203,6 +265,15 @@ FIXTURE_DIRS = (
     str(APPS_DIR.path('fixtures')),
 )
 
+# SESSIONS
+# ------------------------------------------------------------------------------
+# https://docs.djangoproject.com/en/dev/ref/settings/#session-engine
+SESSION_ENGINE = env('DJANGO_SESSION_ENGINE', default='django.contrib.sessions.backends.db')
+# used by the Redis session engine, see fare.users.sessions
+SESSION_REDIS_ALIAS = 'default'
+SESSION_DB_FALLBACK = env.bool('DJANGO_SESSION_DB_FALLBACK', default=True)
+SESSION_WRITE_BEHIND = env.bool('DJANGO_SESSION_WRITE_BEHIND', default=False)
+
 # SECURITY
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#session-cookie-httponly
@@ -217,7 +288,11 @@ X_FRAME_OPTIONS = 'DENY'
 # EMAIL
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#email-backend
-EMAIL_BACKEND = env('DJANGO_EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+# messages are queued to Celery on commit and sent by CELERY_EMAIL_BACKEND, see fare.taskapp.backends
+EMAIL_BACKEND = 'fare.taskapp.backends.CeleryEmailBackend'
+CELERY_EMAIL_BACKEND = env('DJANGO_EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+# failed sends are retried with a growing delay, then kept as DeadLetterEmail
+CELERY_EMAIL_MAX_RETRIES = env.int('CELERY_EMAIL_MAX_RETRIES', default=8)
 
 # ADMIN
 # ------------------------------------------------------------------------------
@@ -252,6 +327,13 @@ CELERYD_TASK_TIME_LIMIT = 5 * 60
 # http://docs.celeryproject.org/en/latest/userguide/configuration.html#task-soft-time-limit
 # TODO: set to whatever value is adequate in your circumstances
 CELERYD_TASK_SOFT_TIME_LIMIT = 60
+# http://docs.celeryproject.org/en/latest/userguide/periodic-tasks.html
+CELERY_BEAT_SCHEDULE = {
+    'clear-expired-sessions': {
+        'task': 'fare.users.tasks.clear_expired_sessions',
+        'schedule': 60 * 60,
+    },
+}
 # django-allauth
 # ------------------------------------------------------------------------------
 ACCOUNT_ALLOW_REGISTRATION = env.bool('DJANGO_ACCOUNT_ALLOW_REGISTRATION', True)
@@ -266,6 +348,21 @@ ACCOUNT_ADAPTER = 'fare.users.adapters.AccountAdapter'
 # https://django-allauth.readthedocs.io/en/latest/configuration.html
 SOCIALACCOUNT_ADAPTER = 'fare.users.adapters.SocialAccountAdapter'
 
+# django-rest-framework
+# ------------------------------------------------------------------------------
+# https://www.django-rest-framework.org/api-guide/settings/
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': [
+        'rest_framework.permissions.IsAuthenticated',
+    ],
+    # https://www.django-rest-framework.org/api-guide/versioning/#urlpathversioning
+    'DEFAULT_VERSIONING_CLASS': 'rest_framework.versioning.URLPathVersioning',
+    'ALLOWED_VERSIONS': ['v1'],
+}
+
 # django-compressor
 # ------------------------------------------------------------------------------
 # https://django-compressor.readthedocs.io/en/latest/quickstart/#installation
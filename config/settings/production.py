@@ -13,21 +13,64 @@ ALLOWED_HOSTS = env.list('DJANGO_ALLOWED_HOSTS', default=['fare.polito.it'])
 DATABASES['default'] = env.db('DATABASE_URL')  # noqa F405
 DATABASES['default']['ATOMIC_REQUESTS'] = True  # noqa F405
 DATABASES['default']['CONN_MAX_AGE'] = env.int('CONN_MAX_AGE', default=60)  # noqa F405
+for alias in DATABASE_REPLICAS:  # noqa F405
+    DATABASES[alias]['CONN_MAX_AGE'] = DATABASES['default']['CONN_MAX_AGE']  # noqa F405
+# a positive DATABASE_POOL_SIZE swaps in the pooled backend, see fare.core.pool:
+# connections go back to the pool of the process at the end of each request or task
+if env.int('DATABASE_POOL_SIZE', default=0):
+    for alias in ['default', *DATABASE_REPLICAS]:  # noqa F405
+        DATABASES[alias]['ENGINE'] = 'fare.core.db.postgresql_pool'  # noqa F405
+        DATABASES[alias]['CONN_MAX_AGE'] = 0  # noqa F405
+        DATABASES[alias]['POOL'] = {  # noqa F405
+            'MAX_SIZE': env.int('DATABASE_POOL_SIZE'),
+            'TIMEOUT': env.float('DATABASE_POOL_TIMEOUT', default=5.0),
+        }
 
 # CACHES
 # ------------------------------------------------------------------------------
 CACHES = {
+    # an in-process copy of the hot keys in front of Redis, see fare.core.cache
     'default': {
+        'BACKEND': 'fare.core.cache.TieredCache',
+        'LOCATION': 'default',
+        'OPTIONS': {
+            'REMOTE': 'remote',
+            'PUBSUB_ALIAS': 'redis',
+            'LOCAL_MAX_ENTRIES': env.int('CACHE_LOCAL_MAX_ENTRIES', default=5000),
+            'LOCAL_TIMEOUT': env.float('CACHE_LOCAL_TIMEOUT', default=5),
+        }
+    },
+    # hit ratio, latency and size by key prefix, see fare.core.cache_metrics
+    'remote': {
+        'BACKEND': 'fare.core.cache_metrics.InstrumentedCache',
+        'LOCATION': 'remote',
+        'OPTIONS': {
+            'CACHE': 'redis',
+            'STATS_REDIS_ALIAS': 'redis',
+            # Mimicing memcache behavior, the errors are counted and logged
+            'IGNORE_EXCEPTIONS': True,
+        }
+    },
+    'redis': {
         'BACKEND': 'django_redis.cache.RedisCache',
         'LOCATION': env('REDIS_URL'),
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
-            # Mimicing memcache behavior.
-            # http://niwinz.github.io/django-redis/latest/#_memcached_exceptions_behavior
-            'IGNORE_EXCEPTIONS': True,
+            # the errors reach the instrumented cache above, which ignores them
+            'IGNORE_EXCEPTIONS': False,
         }
     }
 }
+# sessions live in Redis too, see fare.users.sessions
+SESSION_ENGINE = env('DJANGO_SESSION_ENGINE', default='fare.users.sessions')
+SESSION_REDIS_ALIAS = 'redis'
+# the username availability filter is shared by all the workers, see fare.users.availability
+USERNAME_FILTER_REDIS_ALIAS = 'redis'
+
+# PASSWORDS
+# ------------------------------------------------------------------------------
+# Argon2 runs in a per-worker process pool, see fare.users.hashing
+PASSWORD_HASHING_POOL_SIZE = env.int('PASSWORD_HASHING_POOL_SIZE', default=1)
 
 # SECURITY
 # ------------------------------------------------------------------------------
@@ -108,6 +151,8 @@ TEMPLATES[0]['OPTIONS']['loaders'] = [  # noqa F405
         ]
     ),
 ]
+# compiled before the workers fork, see fare.core.warmup
+TEMPLATE_WARMUP = env.bool('DJANGO_TEMPLATE_WARMUP', default=True)
 
 # EMAIL
 # ------------------------------------------------------------------------------
@@ -130,8 +175,10 @@ ADMIN_URL = env('DJANGO_ADMIN_URL')
 # ------------------------------------------------------------------------------
 # https://anymail.readthedocs.io/en/stable/installation/#installing-anymail
 INSTALLED_APPS += ['anymail']  # noqa F405
-EMAIL_BACKEND = 'anymail.backends.mailgun.EmailBackend'
+CELERY_EMAIL_BACKEND = 'anymail.backends.mailgun.EmailBackend'
 # https://anymail.readthedocs.io/en/stable/installation/#anymail-settings-reference
+# announcements go out as Mailgun batch sends with recipient variables, see fare.announcements.mailing
+ANNOUNCEMENT_MERGE_TAG = '%recipient.{}%'
 ANYMAIL = {
     'MAILGUN_API_KEY': env('MAILGUN_API_KEY'),
     'MAILGUN_SENDER_DOMAIN': env('MAILGUN_DOMAIN')
@@ -201,7 +248,13 @@ LOGGING = {
             'level': 'ERROR',
             'handlers': ['console', 'mail_admins'],
             'propagate': True
-        }
+        },
+        # query count and SQL time of every request, WARNING keeps only the likely N+1s
+        'fare.core.queries': {
+            'level': env('DJANGO_QUERY_LOG_LEVEL', default='INFO'),
+            'handlers': ['console'],
+            'propagate': False
+        },
     }
 }
 
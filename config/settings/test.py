@@ -14,13 +14,24 @@ SECRET_KEY = env("DJANGO_SECRET_KEY", default="0CmsovBQlVZF61pEenNrvlCPcvaBdB61o
 # https://docs.djangoproject.com/en/dev/ref/settings/#test-runner
 TEST_RUNNER = "django.test.runner.DiscoverRunner"
 
+# DATABASES
+# ------------------------------------------------------------------------------
+# stands in for a replica in fare.core tests, which set DATABASE_REPLICAS to use it
+DATABASES["replica"] = dict(DATABASES["default"], ATOMIC_REQUESTS=False, TEST={"MIRROR": "default"})  # noqa F405
+
 # CACHES
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#caches
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": ""
-    }
+        "BACKEND": "fare.core.cache.TieredCache", "LOCATION": "default", "OPTIONS": {"REMOTE": "remote"}
+    },
+    "remote": {
+        "BACKEND": "fare.core.cache_metrics.InstrumentedCache", "LOCATION": "remote", "OPTIONS": {"CACHE": "locmem"}
+    },
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "remote"
+    },
 }
 
 # PASSWORDS
@@ -46,10 +57,20 @@ TEMPLATES[0]["OPTIONS"]["loaders"] = [  # noqa F405
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#email-backend
 EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+CELERY_EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
 # https://docs.djangoproject.com/en/dev/ref/settings/#email-host
 EMAIL_HOST = "localhost"
 # https://docs.djangoproject.com/en/dev/ref/settings/#email-port
 EMAIL_PORT = 1025
 
+# Celery
+# ------------------------------------------------------------------------------
+# http://docs.celeryproject.org/en/latest/userguide/configuration.html#task-always-eager
+CELERY_TASK_ALWAYS_EAGER = True
+# http://docs.celeryproject.org/en/latest/userguide/configuration.html#task-eager-propagates
+CELERY_TASK_EAGER_PROPAGATES = True
+
 # Your stuff...
 # ------------------------------------------------------------------------------
+# no statement is stored as slow, the tests of fare.core.queries set their own threshold
+SLOW_QUERY_THRESHOLD_MS = None
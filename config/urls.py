@@ -1,15 +1,19 @@
 from django.conf import settings
-from django.urls import include, path
+from django.urls import include, path, re_path
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.views.generic import TemplateView
 from django.views import defaults as default_views
 
+from fare.core.pagecache import cache_anonymous
+from fare.core.transaction import read_only
+from fare.core.views import health_view, metrics_view
+
 urlpatterns = [
-    path("", TemplateView.as_view(template_name="pages/home.html"), name="home"),
+    path("", cache_anonymous(read_only(TemplateView.as_view(template_name="pages/home.html"))), name="home"),
     path(
         "about/",
-        TemplateView.as_view(template_name="pages/about.html"),
+        cache_anonymous(read_only(TemplateView.as_view(template_name="pages/about.html"))),
         name="about",
     ),
     # Django Admin, use {% url 'admin:index' %}
@@ -20,6 +24,11 @@ urlpatterns = [
         include("fare.users.urls", namespace="users"),
     ),
     path("accounts/", include("allauth.urls")),
+    # API
+    re_path(r"^api/(?P<version>v1)/", include("config.api_router")),
+    path("health/", health_view, name="health"),
+    # Prometheus metrics of the caches, for staff users or METRICS_TOKEN
+    path("metrics/", metrics_view, name="metrics"),
     # Your stuff: custom urls includes go here
 ] + static(
     settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
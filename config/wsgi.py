@@ -16,7 +16,7 @@ framework.
 import os
 import sys
 
-from django.core.wsgi import get_wsgi_application
+from fare.core.handlers import get_wsgi_application
 
 # This allows easy placement of apps within the interior
 # fare directory.
@@ -0,0 +1,56 @@
+from django.contrib import admin
+from django.db import transaction
+from django.utils.translation import ugettext_lazy as _
+
+from fare.announcements.mailing import start
+from fare.announcements.models import Announcement, AnnouncementBatch
+from fare.announcements.tasks import resend_failed_batch, send_announcement
+
+
+@admin.register(Announcement)
+class AnnouncementAdmin(admin.ModelAdmin):
+
+    list_display = ["subject", "status", "recipient_count", "created", "started", "finished"]
+    list_filter = ["status"]
+    actions = ["send"]
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+
+    def send(self, request, queryset):
+        started = [announcement.pk for announcement in queryset if start(announcement)]
+
+        def enqueue():
+            for pk in started:
+                send_announcement.delay(pk)
+
+        transaction.on_commit(enqueue)
+        self.message_user(request, _("%(count)d announcements are being sent.") % {"count": len(started)})
+
+    setattr(send, "short_description", _("Send to all users"))
+
+
+@admin.register(AnnouncementBatch)
+class AnnouncementBatchAdmin(admin.ModelAdmin):
+
+    list_display = ["announcement", "first_user_id", "last_user_id", "size", "status", "sent"]
+    list_filter = ["status"]
+    readonly_fields = ["announcement", "first_user_id", "last_user_id", "size", "status", "error", "created", "sent"]
+    actions = ["resend"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def resend(self, request, queryset):
+        failed = list(queryset.filter(status=AnnouncementBatch.FAILED).values_list("pk", flat=True))
+
+        def enqueue():
+            for pk in failed:
+                resend_failed_batch.delay(pk)
+
+        transaction.on_commit(enqueue)
+        self.message_user(request, _("%(count)d failed batches requeued.") % {"count": len(failed)})
+
+    setattr(resend, "short_description", _("Send failed batches again"))
@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+
+class AnnouncementsAppConfig(AppConfig):
+
+    name = "fare.announcements"
+    verbose_name = "Announcements"
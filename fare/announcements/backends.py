@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.mail.backends.base import BaseEmailBackend
+
+
+class FakeProviderBackend(BaseEmailBackend):
+    """
+    Stand-in for the email provider, to measure the announcement throughput locally
+
+    Each connection and each send call waits ANNOUNCEMENT_FAKE_LATENCY seconds,
+    like an HTTP round-trip would; the counters are shared by all instances.
+    """
+
+    connections = 0
+    calls = 0
+    recipients = 0
+
+    def latency(self):
+        time.sleep(getattr(settings, "ANNOUNCEMENT_FAKE_LATENCY", 0))
+
+    def open(self):
+        FakeProviderBackend.connections += 1
+        self.latency()
+        return True
+
+    def send_messages(self, email_messages):
+        FakeProviderBackend.calls += 1
+        self.latency()
+        FakeProviderBackend.recipients += sum(len(message.recipients()) for message in email_messages)
+        return len(email_messages)
+
+    @classmethod
+    def reset(cls):
+        cls.connections = cls.calls = cls.recipients = 0
@@ -0,0 +1,149 @@
+from typing import Any, Dict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.template import Context, Template
+from django.utils import timezone
+
+from fare.announcements.models import Announcement, AnnouncementBatch
+
+User = get_user_model()
+
+# Mailgun accepts up to 1000 recipients in a batch send
+DEFAULT_BATCH_SIZE = 1000
+MERGE_FIELDS = ("username", "name")
+
+
+def get_batch_size():
+    return getattr(settings, "ANNOUNCEMENT_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+
+
+def get_backend():
+    # the sending already runs in a worker: go to the provider, not through the Celery email backend
+    return getattr(settings, "ANNOUNCEMENT_EMAIL_BACKEND", None) or settings.CELERY_EMAIL_BACKEND
+
+
+def recipients():
+    return User.objects.filter(is_active=True).exclude(email="").order_by("pk")
+
+
+def recipient_rows(queryset):
+    return list(queryset.values_list("pk", "email", *MERGE_FIELDS))
+
+
+def start(announcement):
+    """
+    Mark a draft as sending; return False if it was already started
+    """
+    started = Announcement.objects.filter(pk=announcement.pk, status=Announcement.DRAFT).update(
+        status=Announcement.SENDING, started=timezone.now()
+    )
+    return bool(started)
+
+
+def claim_batch(announcement_pk, batch_size):
+    """
+    Claim the next recipients of an announcement and move its checkpoint past them
+
+    The claim is committed before anything is sent, so a worker that crashes
+    while sending leaves the batch CLAIMED and the next run starts after it:
+    a recipient gets the announcement at most once.
+
+    :return: the claimed batch and its recipient rows, (None, []) when there is nothing left
+    """
+    with transaction.atomic():
+        announcement = Announcement.objects.select_for_update().get(pk=announcement_pk)
+        if announcement.status != Announcement.SENDING:
+            return None, []
+
+        rows = recipient_rows(recipients().filter(pk__gt=announcement.checkpoint)[:batch_size])
+        if not rows:
+            announcement.status = Announcement.SENT
+            announcement.finished = timezone.now()
+            announcement.save(update_fields=["status", "finished"])
+            return None, []
+
+        batch = AnnouncementBatch.objects.create(
+            announcement=announcement, first_user_id=rows[0][0], last_user_id=rows[-1][0], size=len(rows)
+        )
+        announcement.checkpoint = rows[-1][0]
+        announcement.recipient_count += len(rows)
+        announcement.save(update_fields=["checkpoint", "recipient_count"])
+    return batch, rows
+
+
+def compile_template(text):
+    # plain text email, nothing to escape
+    return Template("{% autoescape off %}" + text + "{% endautoescape %}")
+
+
+def build_messages(announcement, rows, merge_tag=None):
+    """
+    Build the messages for a batch of recipients
+
+    With a merge tag (Mailgun: "%recipient.{}%") the body is rendered once with
+    the provider placeholders and the batch is a single anymail message with
+    per-recipient merge data, i.e. one API call. Otherwise every recipient
+    gets their own rendered message.
+    """
+    template = compile_template(announcement.body)
+    from_email = getattr(settings, "ANNOUNCEMENT_FROM_EMAIL", None) or settings.DEFAULT_FROM_EMAIL
+
+    if merge_tag:
+        from anymail.message import AnymailMessage
+
+        body = template.render(Context({field: merge_tag.format(field) for field in MERGE_FIELDS}))
+        merge_data: Dict[str, Dict[str, Any]] = {}
+        for pk, email, *values in rows:
+            merge_data.setdefault(email, dict(zip(MERGE_FIELDS, values)))
+        message = AnymailMessage(announcement.subject, body, from_email, to=list(merge_data))
+        message.merge_data = merge_data
+        return [message]
+
+    return [
+        EmailMessage(
+            announcement.subject, template.render(Context(dict(zip(MERGE_FIELDS, values)))), from_email, [email]
+        )
+        for pk, email, *values in rows
+    ]
+
+
+def send_batch(announcement, batch, rows, backend=None):
+    """
+    Send a claimed batch over a single backend connection, recording the outcome on it
+    """
+    messages = build_messages(announcement, rows, getattr(settings, "ANNOUNCEMENT_MERGE_TAG", None))
+    try:
+        with get_connection(backend or get_backend()) as connection:
+            connection.send_messages(messages)
+    except Exception as exc:
+        batch.status = AnnouncementBatch.FAILED
+        batch.error = repr(exc)
+        batch.save(update_fields=["status", "error"])
+        return False
+
+    batch.status = AnnouncementBatch.SENT
+    batch.error = ""
+    batch.sent = timezone.now()
+    batch.save(update_fields=["status", "error", "sent"])
+    return True
+
+
+def resend_batch(batch, backend=None):
+    """
+    Send a failed batch again, to the users of its range who can still receive it
+    """
+    rows = recipient_rows(recipients().filter(pk__range=(batch.first_user_id, batch.last_user_id)))
+    return send_batch(batch.announcement, batch, rows, backend)
+
+
+def send_step(announcement_pk, batch_size=None, backend=None):
+    """
+    Claim and send the next batch; return the batch, None when the announcement is done
+    """
+    batch, rows = claim_batch(announcement_pk, batch_size or get_batch_size())
+    if batch is not None:
+        send_batch(batch.announcement, batch, rows, backend)
+    return batch
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fare.announcements.mailing import get_batch_size, send_step, start
+from fare.announcements.models import Announcement, AnnouncementBatch
+
+
+class Command(BaseCommand):
+    help = "Send an announcement from this process and report the throughput"
+
+    def add_arguments(self, parser):
+        parser.add_argument("announcement", type=int, help="pk of the announcement")
+        parser.add_argument("--batch-size", type=int, default=get_batch_size(), help="Recipients per provider call")
+        parser.add_argument(
+            "--backend", help="Email backend to send with, e.g. fare.announcements.backends.FakeProviderBackend"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            announcement = Announcement.objects.get(pk=options["announcement"])
+        except Announcement.DoesNotExist:
+            raise CommandError("Announcement not found")
+        # a draft is started, an interrupted announcement resumes after its checkpoint
+        if not start(announcement) and announcement.status != Announcement.SENDING:
+            raise CommandError("The announcement was already sent")
+
+        began = time.monotonic()
+        batches = failed = recipients = 0
+        while True:
+            batch = send_step(announcement.pk, options["batch_size"], options["backend"])
+            if batch is None:
+                break
+            batches += 1
+            recipients += batch.size
+            failed += batch.status == AnnouncementBatch.FAILED
+        elapsed = time.monotonic() - began
+
+        self.stdout.write(
+            f"{recipients} recipients in {batches} batches ({failed} failed), "
+            f"{elapsed:.2f}s, {recipients / elapsed if elapsed else 0:.0f} recipients/s"
+        )
@@ -0,0 +1,53 @@
+# Generated by Django 2.2.28 on 2026-10-18 11:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Announcement',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=255, verbose_name='Subject')),
+                ('body', models.TextField(help_text='{{ username }} and {{ name }} are replaced for each recipient.', verbose_name='Body')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Created')),
+                ('status', models.CharField(choices=[('draft', 'Draft'), ('sending', 'Sending'), ('sent', 'Sent')], default='draft', editable=False, max_length=10, verbose_name='Status')),
+                ('checkpoint', models.PositiveIntegerField(default=0, editable=False)),
+                ('recipient_count', models.PositiveIntegerField(default=0, editable=False, verbose_name='Recipients')),
+                ('started', models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Started')),
+                ('finished', models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Finished')),
+                ('created_by', models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AnnouncementBatch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_user_id', models.PositiveIntegerField()),
+                ('last_user_id', models.PositiveIntegerField()),
+                ('size', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('claimed', 'Claimed'), ('sent', 'Sent'), ('failed', 'Failed')], default='claimed', max_length=10)),
+                ('error', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('sent', models.DateTimeField(blank=True, null=True)),
+                ('announcement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batches', to='announcements.Announcement')),
+            ],
+            options={
+                'verbose_name_plural': 'announcement batches',
+                'ordering': ['first_user_id'],
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.db.models import (
+    CASCADE, SET_NULL, CharField, DateTimeField, ForeignKey, Model, PositiveIntegerField, TextField,
+)
+from django.utils.translation import ugettext_lazy as _
+
+
+class Announcement(Model):
+    """
+    An email sent to every active user with an address
+
+    :attr body: plain text Django template, rendered with the recipient's
+        username and name
+    :type body: string
+    :attr checkpoint: pk of the last user a batch was claimed for, sending
+        resumes after it
+    :type checkpoint: int
+    """
+
+    DRAFT = "draft"
+    SENDING = "sending"
+    SENT = "sent"
+    STATUS_CHOICES = [(DRAFT, _("Draft")), (SENDING, _("Sending")), (SENT, _("Sent"))]
+
+    subject = CharField(_("Subject"), max_length=255)
+    body = TextField(_("Body"), help_text=_("{{ username }} and {{ name }} are replaced for each recipient."))
+    created_by = ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=SET_NULL, editable=False)
+    created = DateTimeField(_("Created"), auto_now_add=True)
+    status = CharField(_("Status"), max_length=10, choices=STATUS_CHOICES, default=DRAFT, editable=False)
+    checkpoint = PositiveIntegerField(default=0, editable=False)
+    recipient_count = PositiveIntegerField(_("Recipients"), default=0, editable=False)
+    started = DateTimeField(_("Started"), null=True, blank=True, editable=False)
+    finished = DateTimeField(_("Finished"), null=True, blank=True, editable=False)
+
+    class Meta:
+        ordering = ["-created"]
+
+    def __str__(self):
+        return self.subject
+
+
+class AnnouncementBatch(Model):
+    """
+    A range of recipients claimed for one provider call
+
+    A batch is claimed, and the checkpoint moved past it, before it is sent:
+    a batch left CLAIMED by a crashed worker may or may not have been
+    delivered and is never sent again automatically.
+    """
+
+    CLAIMED = "claimed"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = [(CLAIMED, _("Claimed")), (SENT, _("Sent")), (FAILED, _("Failed"))]
+
+    announcement = ForeignKey(Announcement, on_delete=CASCADE, related_name="batches")
+    first_user_id = PositiveIntegerField()
+    last_user_id = PositiveIntegerField()
+    size = PositiveIntegerField()
+    status = CharField(max_length=10, choices=STATUS_CHOICES, default=CLAIMED)
+    error = TextField(blank=True)
+    created = DateTimeField(auto_now_add=True)
+    sent = DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["first_user_id"]
+        verbose_name_plural = "announcement batches"
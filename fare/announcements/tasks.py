@@ -0,0 +1,21 @@
+from fare.announcements.mailing import resend_batch, send_step
+from fare.announcements.models import AnnouncementBatch
+from fare.taskapp.celery import app
+
+
+@app.task(acks_late=True, ignore_result=True)
+def send_announcement(announcement_pk):
+    """
+    Send the next batch of an announcement, then enqueue the one after it
+
+    A redelivered task claims a fresh batch, the interrupted one is not sent twice.
+    """
+    if send_step(announcement_pk) is not None:
+        send_announcement.delay(announcement_pk)
+
+
+@app.task(ignore_result=True)
+def resend_failed_batch(batch_pk):
+    batch = AnnouncementBatch.objects.select_related("announcement").get(pk=batch_pk)
+    if batch.status == AnnouncementBatch.FAILED:
+        resend_batch(batch)
@@ -0,0 +1,131 @@
+from io import StringIO
+
+import pytest
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from fare.announcements.backends import FakeProviderBackend
+from fare.announcements.mailing import build_messages, claim_batch, send_step, start
+from fare.announcements.models import Announcement, AnnouncementBatch
+from fare.announcements.tasks import resend_failed_batch, send_announcement
+from fare.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+FAKE_BACKEND = "fare.announcements.backends.FakeProviderBackend"
+
+
+class BrokenBackend(FakeProviderBackend):
+
+    def send_messages(self, email_messages):
+        raise ConnectionError("Mailgun is down")
+
+
+@pytest.fixture
+def announcement():
+    announcement = Announcement.objects.create(subject="Exams", body="Hello {{ name }} ({{ username }})")
+    start(announcement)
+    return announcement
+
+
+@pytest.fixture(autouse=True)
+def fake_backend(settings):
+    settings.ANNOUNCEMENT_EMAIL_BACKEND = FAKE_BACKEND
+    settings.ANNOUNCEMENT_BATCH_SIZE = 10
+    FakeProviderBackend.reset()
+
+
+class TestSending:
+
+    def test_one_connection_per_batch(self, announcement):
+        UserFactory.create_batch(25)
+        UserFactory(email="")
+        UserFactory(is_active=False)
+
+        send_announcement.delay(announcement.pk)
+
+        announcement.refresh_from_db()
+        assert announcement.status == Announcement.SENT
+        assert announcement.recipient_count == 25
+        assert list(announcement.batches.values_list("size", "status")) == [
+            (10, AnnouncementBatch.SENT), (10, AnnouncementBatch.SENT), (5, AnnouncementBatch.SENT)
+        ]
+        assert (FakeProviderBackend.connections, FakeProviderBackend.calls, FakeProviderBackend.recipients) == (
+            3, 3, 25
+        )
+
+    def test_messages_are_personalized(self, announcement, settings):
+        settings.ANNOUNCEMENT_EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+        UserFactory(username="ada", name="Ada Lovelace", email="ada@example.com")
+
+        send_step(announcement.pk)
+
+        assert [(message.to, message.body) for message in mail.outbox] == [
+            (["ada@example.com"], "Hello Ada Lovelace (ada)")
+        ]
+
+    def test_merge_tag_builds_a_single_provider_message(self, announcement):
+        pytest.importorskip("anymail")
+        rows = [(1, "ada@example.com", "ada", "Ada"), (2, "alan@example.com", "alan", "Alan")]
+
+        [message] = build_messages(announcement, rows, merge_tag="%recipient.{}%")
+
+        assert message.body == "Hello %recipient.name% (%recipient.username%)"
+        assert message.to == ["ada@example.com", "alan@example.com"]
+        assert message.merge_data["alan@example.com"] == {"username": "alan", "name": "Alan"}
+
+    def test_queries_per_batch_do_not_grow_with_its_size(self, announcement, settings):
+        UserFactory.create_batch(30)
+
+        with CaptureQueriesContext(connection) as small:
+            send_step(announcement.pk, batch_size=5)
+        with CaptureQueriesContext(connection) as large:
+            send_step(announcement.pk, batch_size=25)
+
+        assert len(small) == len(large)
+
+
+class TestCheckpoint:
+
+    def test_crashed_batch_is_not_sent_again(self, announcement):
+        UserFactory.create_batch(15)
+        # a worker claims a batch and dies before sending it
+        claim_batch(announcement.pk, 10)
+
+        while send_step(announcement.pk):
+            pass
+
+        assert FakeProviderBackend.recipients == 5
+        assert list(announcement.batches.values_list("status", flat=True)) == [
+            AnnouncementBatch.CLAIMED, AnnouncementBatch.SENT
+        ]
+
+    def test_failed_batch_can_be_sent_again(self, announcement, settings):
+        users = UserFactory.create_batch(3)
+        settings.ANNOUNCEMENT_EMAIL_BACKEND = "fare.announcements.tests.test_mailing.BrokenBackend"
+        send_step(announcement.pk)
+        batch = announcement.batches.get()
+        assert batch.status == AnnouncementBatch.FAILED
+        assert "Mailgun is down" in batch.error
+
+        users[0].delete()
+        settings.ANNOUNCEMENT_EMAIL_BACKEND = FAKE_BACKEND
+        resend_failed_batch.delay(batch.pk)
+
+        batch.refresh_from_db()
+        assert batch.status == AnnouncementBatch.SENT
+        assert FakeProviderBackend.recipients == 2
+
+    def test_announcement_is_started_once(self, announcement):
+        assert not start(announcement)
+
+
+def test_command_reports_throughput(announcement):
+    UserFactory.create_batch(12)
+    stdout = StringIO()
+
+    call_command("send_announcement", announcement.pk, backend=FAKE_BACKEND, batch_size=5, stdout=stdout)
+
+    assert stdout.getvalue().startswith("12 recipients in 3 batches (0 failed)")
@@ -2,6 +2,7 @@ import pytest
 from django.conf import settings
 from django.test import RequestFactory
 
+from fare.core.testing import assert_query_budget
 from fare.users.tests.factories import UserFactory
 
 
@@ -18,3 +19,11 @@ def user() -> settings.AUTH_USER_MODEL:
 @pytest.fixture
 def request_factory() -> RequestFactory:
     return RequestFactory()
+
+
+@pytest.fixture
+def query_budget():
+    """
+    assert_query_budget, to declare the queries a block may run
+    """
+    return assert_query_budget
@@ -0,0 +1,17 @@
+from django.contrib import admin
+
+from fare.core.models import SlowQuery
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+
+    list_display = ["__str__", "view", "calls", "total_ms", "max_ms", "last_seen"]
+    readonly_fields = [
+        "fingerprint", "example", "view", "calls", "total_ms", "max_ms", "plan", "first_seen", "last_seen"
+    ]
+    exclude = ["digest", "samples"]
+    search_fields = ["fingerprint", "view"]
+
+    def has_add_permission(self, request):
+        return False
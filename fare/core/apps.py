@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+
+class CoreAppConfig(AppConfig):
+
+    name = "fare.core"
+    verbose_name = "Core"
@@ -0,0 +1,393 @@
+"""
+Cache backend keeping a small in-process copy of another cache, usually Redis
+
+    CACHES = {
+        "default": {
+            "BACKEND": "fare.core.cache.TieredCache",
+            "LOCATION": "default",
+            "OPTIONS": {"REMOTE": "redis", "PUBSUB_ALIAS": "redis"},
+        },
+        "redis": {"BACKEND": "django_redis.cache.RedisCache", ...},
+    }
+
+Reads are served from a bounded LRU for at most LOCAL_TIMEOUT seconds and go
+to the remote cache on a miss. Every write goes to the remote cache and is
+published on a Redis channel, which each process listens to in a thread to
+drop its local copy: the local tier is only used while that subscription is
+up, and is emptied whenever it is lost. Without PUBSUB_ALIAS the local tier
+is only safe for a single process (tests, runserver). Counters are the
+exception: incr and decr are too frequent to publish, so they only drop the
+local copy of their own process, and the others may read a counter up to
+LOCAL_TIMEOUT seconds old.
+
+get_or_set recomputes a missing value in one process at a time, the others
+wait for it, and recomputes a present one a little before it expires, with a
+probability growing as the expiry gets closer, while the old value is served.
+"""
+import logging
+import math
+import os
+import pickle
+import random
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Dict, Tuple
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+logger = logging.getLogger(__name__)
+
+# a value stored by get_or_set, with its expiry and how long it took to compute
+Computed = namedtuple("Computed", ["value", "expires", "delta"])
+
+CLEAR_ALL = "*"
+
+
+class LocalLRU:
+    """
+    Thread safe LRU of pickled values with a per entry expiry
+
+    Values are kept pickled so that a request never shares an object with
+    another one, as with a remote cache.
+
+    :attr max_entries: entries kept, the least recently used are dropped first
+    :type max_entries: int
+    :attr generation: bumped by every delete and clear, see set
+    :type generation: int
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+
+    def get(self, key):
+        """
+        Return the pickled value, or None if missing or expired
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, data, ttl, generation=None):
+        """
+        Store the pickled value, unless a delete or clear happened since
+        ``generation`` was read: the value may be older than what it deleted
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (data, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, keys):
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalTier:
+    """
+    The in-process tier of a TieredCache, shared by its per-thread instances
+
+    A tier inherited through fork is emptied and subscribes again, the
+    listener thread does not survive the fork.
+    """
+
+    def __init__(self, max_entries, channel, pubsub_alias):
+        self.lru = LocalLRU(max_entries)
+        self.channel = channel
+        self.pubsub_alias = pubsub_alias
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.lru.clear()
+        self.subscribed = self.pubsub_alias is None
+        self._listener = None
+
+    def usable(self):
+        """
+        Tell whether the local copies can be trusted, starting the listener if needed
+        """
+        if self.pid != os.getpid():
+            with self._lock:
+                if self.pid != os.getpid():
+                    self._reset()
+        if self.pubsub_alias is not None and self._listener is None:
+            with self._lock:
+                if self._listener is None:
+                    self._listener = threading.Thread(
+                        target=self._listen, args=(self.pid,), name="cache-invalidation", daemon=True
+                    )
+                    self._listener.start()
+        return self.subscribed
+
+    def get_client(self):
+        from django_redis import get_redis_connection
+
+        return get_redis_connection(self.pubsub_alias)
+
+    def _listen(self, pid):
+        while self.pid == pid:
+            try:
+                pubsub = self.get_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # anything cached before the subscription may have missed its invalidation
+                self.lru.clear()
+                self.subscribed = True
+                for message in pubsub.listen():
+                    self.evict(message["data"])
+            except Exception:
+                logger.warning("Cache invalidation channel lost, the local cache is off", exc_info=True)
+            self.subscribed = False
+            self.lru.clear()
+            time.sleep(1)
+
+    def evict(self, payload):
+        keys = (payload.decode() if isinstance(payload, bytes) else payload).split("\n")
+        if CLEAR_ALL in keys:
+            self.lru.clear()
+        else:
+            self.lru.delete(keys)
+
+    def publish(self, keys):
+        """
+        Drop the keys from the local tier of this process and of all the others
+        """
+        keys = list(keys)
+        if CLEAR_ALL in keys:
+            self.lru.clear()
+        else:
+            self.lru.delete(keys)
+        if self.pubsub_alias is None:
+            return
+        # once more on error, e.g. with a pooled connection Redis closed
+        for attempt in range(2):
+            try:
+                self.get_client().publish(self.channel, "\n".join(keys))
+                return
+            except Exception:
+                if attempt:
+                    logger.error(
+                        "Cannot publish a cache invalidation, the other processes keep their copy "
+                        "until it expires", exc_info=True,
+                    )
+
+
+_tiers: Dict[str, LocalTier] = {}
+_tiers_lock = threading.Lock()
+
+
+def get_local_tier(name, max_entries, channel, pubsub_alias):
+    with _tiers_lock:
+        if name not in _tiers:
+            _tiers[name] = LocalTier(max_entries, channel, pubsub_alias)
+        return _tiers[name]
+
+
+class TieredCache(BaseCache):
+    """
+    OPTIONS:
+
+    :attr REMOTE: alias of the cache holding the values, shared by the processes
+    :type REMOTE: string
+    :attr PUBSUB_ALIAS: django_redis alias whose Redis carries the invalidations
+    :type PUBSUB_ALIAS: string
+    :attr LOCAL_MAX_ENTRIES: values kept in each process
+    :type LOCAL_MAX_ENTRIES: int
+    :attr LOCAL_TIMEOUT: most seconds a value is served from the process
+    :type LOCAL_TIMEOUT: float
+    :attr LOCK_TIMEOUT: most seconds get_or_set waits for another process computing a value
+    :type LOCK_TIMEOUT: float
+    :attr BETA: eagerness of the early recomputation, 0 disables it
+    :type BETA: float
+    """
+
+    def __init__(self, location, params):
+        options = params.get("OPTIONS", {})
+        super().__init__(params)
+        self.remote_alias = options.get("REMOTE", "redis")
+        self.local_timeout = options.get("LOCAL_TIMEOUT", 5)
+        self.lock_timeout = options.get("LOCK_TIMEOUT", 10)
+        self.lock_poll = options.get("LOCK_POLL", 0.05)
+        self.beta = options.get("BETA", 1.0)
+        self.tier = get_local_tier(
+            location or self.remote_alias,
+            options.get("LOCAL_MAX_ENTRIES", 1000),
+            options.get("CHANNEL", f"cache:invalidate:{location or self.remote_alias}"),
+            options.get("PUBSUB_ALIAS"),
+        )
+
+    @property
+    def remote(self):
+        return caches[self.remote_alias]
+
+    def _local_ttl(self, timeout):
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    def _store_locally(self, key, value, timeout, generation=None):
+        ttl = self._local_ttl(timeout)
+        if ttl > 0 and self.tier.usable():
+            self.tier.lru.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ttl, generation)
+
+    def _get_stored(self, key, version):
+        """
+        Return what is stored under the key, a Computed for get_or_set values, or None
+        """
+        full_key = self.make_key(key, version=version)
+        if self.tier.usable():
+            data = self.tier.lru.get(full_key)
+            if data is not None:
+                return pickle.loads(data)
+        # an invalidation received during the remote read may be about the value read
+        generation = self.tier.lru.generation
+        value = self.remote.get(key, version=version)
+        if value is not None:
+            self._store_locally(full_key, value, DEFAULT_TIMEOUT, generation)
+        return value
+
+    @staticmethod
+    def _unwrap(value):
+        return value.value if isinstance(value, Computed) else value
+
+    def get(self, key, default=None, version=None):
+        value = self._unwrap(self._get_stored(key, version))
+        return default if value is None else value
+
+    def get_many(self, keys, version=None):
+        found, missing = {}, []
+        usable = self.tier.usable()
+        for key in keys:
+            data = self.tier.lru.get(self.make_key(key, version=version)) if usable else None
+            if data is None:
+                missing.append(key)
+            else:
+                found[key] = self._unwrap(pickle.loads(data))
+        if missing:
+            generation = self.tier.lru.generation
+            fetched = self.remote.get_many(missing, version=version)
+            for key, value in fetched.items():
+                self._store_locally(self.make_key(key, version=version), value, DEFAULT_TIMEOUT, generation)
+                found[key] = self._unwrap(value)
+        return found
+
+    def has_key(self, key, version=None):
+        return self._get_stored(key, version) is not None
+
+    def _invalidate(self, keys, version):
+        self.tier.publish(self.make_key(key, version=version) for key in keys)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.remote.set(key, value, timeout, version=version)
+        self._invalidate([key], version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.remote.add(key, value, timeout, version=version)
+        if added:
+            self._invalidate([key], version)
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.remote.set_many(data, timeout, version=version)
+        self._invalidate(data, version)
+        return failed
+
+    def delete(self, key, version=None):
+        self.remote.delete(key, version=version)
+        self._invalidate([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.remote.delete_many(keys, version=version)
+        self._invalidate(keys, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.remote.touch(key, timeout, version=version)
+
+    def _forget_counter(self, key, version):
+        # not published, see the module docstring
+        self.tier.lru.delete([self.make_key(key, version=version)])
+
+    def incr(self, key, delta=1, version=None):
+        value = self.remote.incr(key, delta, version=version)
+        self._forget_counter(key, version)
+        return value
+
+    def decr(self, key, delta=1, version=None):
+        value = self.remote.decr(key, delta, version=version)
+        self._forget_counter(key, version)
+        return value
+
+    def clear(self):
+        self.remote.clear()
+        self.tier.publish([CLEAR_ALL])
+
+    def close(self, **kwargs):
+        self.remote.close(**kwargs)
+
+    def _recompute_early(self, computed):
+        # XFetch: the closer the expiry and the slower the computation, the likelier
+        if computed.expires is None or not self.beta:
+            return False
+        return time.time() - computed.delta * self.beta * math.log(1 - random.random()) >= computed.expires
+
+    def _compute(self, key, default, timeout, version):
+        started = time.monotonic()
+        value = default() if callable(default) else default
+        if value is not None:
+            expires = self.remote.get_backend_timeout(timeout)
+            self.set(key, Computed(value, expires, time.monotonic() - started), timeout, version)
+        return value
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        """
+        Return the value, computing it from ``default`` in a single process at a time
+        """
+        stored = self._get_stored(key, version)
+        if stored is not None and not (isinstance(stored, Computed) and self._recompute_early(stored)):
+            return self._unwrap(stored)
+
+        lock_key = f"{key}:lock"
+        locked = self.remote.add(lock_key, os.getpid(), self.lock_timeout, version=version)
+        if locked or locked is None:
+            # None: the remote cache is failing and ignoring the error, nothing to coordinate with
+            try:
+                return self._compute(key, default, timeout, version)
+            finally:
+                if locked:
+                    self.remote.delete(lock_key, version=version)
+
+        # another process is recomputing: serve the old value, or wait for the new one
+        if stored is not None:
+            return self._unwrap(stored)
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.lock_poll)
+            value = self.remote.get(key, version=version)
+            if value is not None:
+                return self._unwrap(value)
+        return self._compute(key, default, timeout, version)
@@ -0,0 +1,314 @@
+"""
+Cache backend wrapping another cache to measure it, by key prefix
+
+    CACHES = {
+        "remote": {
+            "BACKEND": "fare.core.cache_metrics.InstrumentedCache",
+            "LOCATION": "remote",
+            "OPTIONS": {"CACHE": "redis", "STATS_REDIS_ALIAS": "redis"},
+        },
+        "redis": {"BACKEND": "django_redis.cache.RedisCache", ...},
+    }
+
+Every operation is counted under the first PREFIX_DEPTH parts of its key
+("users:stamp" for "users:stamp:12"), with its hits and misses, latency and
+the size of the values written. Redis errors are swallowed here instead of
+by django_redis, so that they are counted and logged: the wrapped cache must
+not ignore them.
+
+Each process adds its counters to a Redis hash every FLUSH_INTERVAL seconds,
+which get_cache_stats reads for the metrics endpoint and the cache_stats
+command. Without STATS_REDIS_ALIAS the counters stay in the process. The
+counters are named after LOCATION, which must differ between the
+instrumented caches.
+"""
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import defaultdict
+from typing import DefaultDict, Dict, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django_redis.exceptions import ConnectionInterrupted
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+CACHE_ERRORS = (ConnectionInterrupted, RedisError, OSError)
+
+# upper bounds of the latency histogram, in seconds
+BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, float("inf"))
+
+STATS_KEY = "cachestats:{alias}"
+
+COUNTERS = ("ops", "seconds", "hits", "misses", "writes", "bytes", "deletes", "errors")
+
+
+def key_prefix(key, depth):
+    return ":".join(str(key).split(":")[:depth])
+
+
+class CacheStats:
+    """
+    Counters of an instrumented cache in this process, not yet added to Redis
+
+    :attr counters: value of each (prefix, metric)
+    :type counters: dict
+    """
+
+    def __init__(self, alias, redis_alias, flush_interval):
+        self.alias = alias
+        self.redis_alias = redis_alias
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.counters: DefaultDict[Tuple[str, str], float] = defaultdict(float)
+        self.flushed = time.monotonic()
+
+    def add(self, values):
+        """
+        Add to the counters, given as {(prefix, metric): value}
+        """
+        with self._lock:
+            # counters inherited through fork were already counted by the parent
+            if self.pid != os.getpid():
+                self._reset()
+            for key, value in values.items():
+                if value:
+                    self.counters[key] += value
+            due = self.redis_alias is not None and time.monotonic() - self.flushed >= self.flush_interval
+        if due:
+            self.flush()
+
+    def record(self, prefix, seconds, **values):
+        bucket = next(bound for bound in BUCKETS if seconds <= bound)
+        values.update({"ops": 1, "seconds": seconds, f"le:{bucket}": 1})
+        self.add({(prefix, metric): value for metric, value in values.items()})
+
+    def take(self):
+        with self._lock:
+            counters, self.counters = self.counters, defaultdict(float)
+            self.flushed = time.monotonic()
+        return counters
+
+    def get_client(self):
+        from django_redis import get_redis_connection
+
+        return get_redis_connection(self.redis_alias)
+
+    def flush(self):
+        """
+        Add the counters of this process to the shared hash, keeping them on failure
+        """
+        if self.redis_alias is None:
+            return
+        counters = self.take()
+        if not counters:
+            return
+        try:
+            pipeline = self.get_client().pipeline(transaction=False)
+            for (prefix, metric), value in counters.items():
+                pipeline.hincrbyfloat(STATS_KEY.format(alias=self.alias), f"{prefix}|{metric}", value)
+            pipeline.execute()
+        except CACHE_ERRORS:
+            logger.warning("Cannot save the cache statistics", exc_info=True)
+            with self._lock:
+                for key, value in counters.items():
+                    self.counters[key] += value
+
+    def read(self):
+        """
+        Return the counters of every process, as {prefix: {metric: value}}
+        """
+        totals: DefaultDict[str, DefaultDict[str, float]] = defaultdict(lambda: defaultdict(float))
+        if self.redis_alias is not None:
+            self.flush()
+            for field, value in self.get_client().hgetall(STATS_KEY.format(alias=self.alias)).items():
+                prefix, metric = (field.decode() if isinstance(field, bytes) else field).rsplit("|", 1)
+                totals[prefix][metric] += float(value)
+        with self._lock:
+            for (prefix, metric), value in self.counters.items():
+                totals[prefix][metric] += value
+        return totals
+
+    def reset(self):
+        self.take()
+        if self.redis_alias is not None:
+            self.get_client().delete(STATS_KEY.format(alias=self.alias))
+
+
+_stats: Dict[str, CacheStats] = {}
+_stats_lock = threading.Lock()
+
+
+def get_stats(alias, redis_alias=None, flush_interval=10):
+    with _stats_lock:
+        if alias not in _stats:
+            _stats[alias] = CacheStats(alias, redis_alias, flush_interval)
+        return _stats[alias]
+
+
+class InstrumentedCache(BaseCache):
+    """
+    OPTIONS:
+
+    :attr CACHE: alias of the measured cache
+    :type CACHE: string
+    :attr IGNORE_EXCEPTIONS: answer as a miss when the measured cache fails, as django_redis would
+    :type IGNORE_EXCEPTIONS: bool
+    :attr PREFIX_DEPTH: colon separated parts of the keys grouped together
+    :type PREFIX_DEPTH: int
+    :attr STATS_REDIS_ALIAS: django_redis alias whose Redis holds the counters of all the processes
+    :type STATS_REDIS_ALIAS: string
+    :attr FLUSH_INTERVAL: seconds between two additions of the counters to Redis
+    :type FLUSH_INTERVAL: float
+    """
+
+    def __init__(self, location, params):
+        options = params.get("OPTIONS", {})
+        super().__init__(params)
+        self.cache_alias = options["CACHE"]
+        self.ignore_exceptions = options.get("IGNORE_EXCEPTIONS", True)
+        self.prefix_depth = options.get("PREFIX_DEPTH", 2)
+        self.stats = get_stats(location, options.get("STATS_REDIS_ALIAS"), options.get("FLUSH_INTERVAL", 10))
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _prefix(self, key):
+        return key_prefix(key, self.prefix_depth)
+
+    def _run(self, operation, key, call, default=None, **values):
+        started = time.perf_counter()
+        errors = 0
+        try:
+            result = call()
+        except CACHE_ERRORS:
+            if not self.ignore_exceptions:
+                raise
+            logger.warning("Cache %s of %s failed", operation, key, exc_info=True)
+            result, errors = default, 1
+        self.stats.record(self._prefix(key), time.perf_counter() - started, errors=errors, **values)
+        return result
+
+    def _count_reads(self, keys, found):
+        reads: DefaultDict[Tuple[str, str], int] = defaultdict(int)
+        for key in keys:
+            reads[self._prefix(key), "hits" if key in found else "misses"] += 1
+        self.stats.add(reads)
+
+    @staticmethod
+    def _size(value):
+        return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+    def get(self, key, default=None, version=None):
+        value = self._run("get", key, lambda: self.cache.get(key, version=version))
+        # a failed get is a miss too: the caller recomputes
+        self._count_reads([key], () if value is None else (key,))
+        return default if value is None else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        # the latency goes to the prefix of the first key, the hits and misses to their own
+        found = self._run("get_many", keys[0], lambda: self.cache.get_many(keys, version=version), default={})
+        self._count_reads(keys, found)
+        return found
+
+    def has_key(self, key, version=None):
+        # the cache method, which takes the version, unlike the in operator
+        return self._run(
+            "has_key", key, lambda: self.cache.has_key(key, version=version), default=False,  # noqa: W601
+        )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._run(
+            "set", key, lambda: self.cache.set(key, value, timeout, version=version),
+            writes=1, bytes=self._size(value),
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._run(
+            "add", key, lambda: self.cache.add(key, value, timeout, version=version),
+            default=None, writes=1, bytes=self._size(value),
+        )
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if not data:
+            return []
+        size = sum(self._size(value) for value in data.values())
+        return self._run(
+            "set_many", next(iter(data)), lambda: self.cache.set_many(data, timeout, version=version),
+            default=list(data), writes=len(data), bytes=size,
+        )
+
+    def delete(self, key, version=None):
+        self._run("delete", key, lambda: self.cache.delete(key, version=version), deletes=1)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        if keys:
+            self._run(
+                "delete_many", keys[0], lambda: self.cache.delete_many(keys, version=version), deletes=len(keys)
+            )
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._run("touch", key, lambda: self.cache.touch(key, timeout, version=version), default=False)
+
+    def incr(self, key, delta=1, version=None):
+        # a missing key raises ValueError, which is not a cache failure
+        return self._run("incr", key, lambda: self.cache.incr(key, delta, version=version), writes=1)
+
+    def decr(self, key, delta=1, version=None):
+        return self._run("decr", key, lambda: self.cache.decr(key, delta, version=version), writes=1)
+
+    def clear(self):
+        self._run("clear", "", self.cache.clear)
+
+    def close(self, **kwargs):
+        self.cache.close(**kwargs)
+
+
+def get_cache_stats():
+    """
+    Return the statistics of every instrumented cache, as {alias: {prefix: {metric: value}}}
+
+    Besides the counters, each prefix has its hit_ratio, mean_ms, p99_ms (the
+    histogram bucket holding the 99th percentile) and mean_bytes.
+    """
+    report = {}
+    for alias, params in settings.CACHES.items():
+        if params["BACKEND"] != f"{__name__}.InstrumentedCache":
+            continue
+        prefixes = caches[alias].stats.read()
+        for metrics in prefixes.values():
+            for counter in COUNTERS:
+                metrics.setdefault(counter, 0.0)
+            reads = metrics["hits"] + metrics["misses"]
+            metrics["hit_ratio"] = metrics["hits"] / reads if reads else 0.0
+            metrics["mean_ms"] = metrics["seconds"] / metrics["ops"] * 1000 if metrics["ops"] else 0.0
+            metrics["mean_bytes"] = metrics["bytes"] / metrics["writes"] if metrics["writes"] else 0.0
+            metrics["p99_ms"] = percentile_bound(metrics, 0.99) * 1000
+        report[alias] = {prefix: dict(metrics) for prefix, metrics in sorted(prefixes.items())}
+    return report
+
+
+def percentile_bound(metrics, fraction):
+    """
+    Return the upper bound of the latency bucket holding the given fraction of the operations
+    """
+    seen = 0
+    for bound in BUCKETS:
+        seen += metrics.get(f"le:{bound}", 0)
+        if metrics["ops"] and seen >= metrics["ops"] * fraction:
+            return bound
+    return 0.0
@@ -0,0 +1,74 @@
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgreSQLDatabaseWrapper
+from django.db.utils import OperationalError
+from psycopg2 import extensions
+
+from fare.core.pool import PoolExhausted, get_pool
+
+
+def check_connection(connection):
+    if connection.closed:
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+    return True
+
+
+def reset_connection(connection):
+    """
+    Roll back whatever the last user left open and turn autocommit back on, as
+    Django expects of a new connection; False if the connection is broken
+    """
+    if connection.closed:
+        return False
+    status = connection.get_transaction_status()
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    if not connection.autocommit:
+        connection.autocommit = True
+    return True
+
+
+def close_connection(connection):
+    connection.close()
+
+
+class DatabaseWrapper(PostgreSQLDatabaseWrapper):
+    """
+    PostgreSQL backend borrowing its connections from a pool of the process,
+    see fare.core.pool
+
+    Use it with CONN_MAX_AGE = 0: closing the connection at the end of each
+    request or task gives it back to the pool. The pool is configured by the
+    POOL key of the database settings: MAX_SIZE, TIMEOUT, CHECK_INTERVAL and
+    MAX_LIFETIME.
+    """
+
+    def get_pool(self):
+        options = self.settings_dict.get("POOL", {})
+        return get_pool(
+            self.alias,
+            check=check_connection,
+            reset=reset_connection,
+            close=close_connection,
+            max_size=options.get("MAX_SIZE", 4),
+            timeout=options.get("TIMEOUT", 5.0),
+            check_interval=options.get("CHECK_INTERVAL", 30.0),
+            max_lifetime=options.get("MAX_LIFETIME", 30 * 60),
+        )
+
+    def get_new_connection(self, conn_params):
+        try:
+            connection = self.get_pool().acquire(
+                lambda: super(DatabaseWrapper, self).get_new_connection(conn_params)
+            )
+        except PoolExhausted as exc:
+            raise OperationalError(str(exc)) from exc
+        # set by the parent class only for the connections it creates
+        self.isolation_level = self.settings_dict["OPTIONS"].get("isolation_level", connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            self.get_pool().release(self.connection)
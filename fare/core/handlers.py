@@ -0,0 +1,121 @@
+"""
+WSGI handler running a shorter middleware chain for some URL groups
+
+    MIDDLEWARE_GROUPS = [
+        {
+            "PATHS": [r"^/health/$"],
+            "MIDDLEWARE": ["django.middleware.security.SecurityMiddleware"],
+        },
+    ]
+
+A request whose path matches one of the PATHS of a group (the first group
+wins) goes through the MIDDLEWARE of that group instead of settings.MIDDLEWARE.
+With ANONYMOUS_ONLY, only the requests without session, CSRF or messages
+cookie are matched, so a group can leave out the sessions, authentication
+and messages for the public pages while logged in users still get the full
+chain. Views served by such a group must not need what it leaves out: the
+templates can read request.user only if AnonymousUserMiddleware is in the
+group, and they cannot render forms protected by {% csrf_token %}.
+"""
+import re
+from typing import Any, List, Sequence
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.exception import convert_exception_to_response
+from django.core.handlers.wsgi import WSGIHandler
+from django.utils.module_loading import import_string
+
+from fare.core.pagecache import is_anonymous
+
+
+class MiddlewareChainHandler(BaseHandler):
+    """
+    Handler whose middleware come from a list instead of settings.MIDDLEWARE
+
+    :attr middleware: dotted paths of the middleware, outermost first
+    :type middleware: list
+    """
+
+    def __init__(self, middleware):
+        self.middleware = middleware
+        super().__init__()
+
+    def load_middleware(self):
+        # BaseHandler.load_middleware, over self.middleware
+        self._view_middleware: List[Any] = []
+        self._template_response_middleware: List[Any] = []
+        self._exception_middleware: List[Any] = []
+
+        handler = convert_exception_to_response(self._get_response)
+        for middleware_path in reversed(self.middleware):
+            try:
+                instance = import_string(middleware_path)(handler)
+            except MiddlewareNotUsed:
+                continue
+            if instance is None:
+                raise ImproperlyConfigured(f"Middleware factory {middleware_path} returned None.")
+            if hasattr(instance, "process_view"):
+                self._view_middleware.insert(0, instance.process_view)
+            if hasattr(instance, "process_template_response"):
+                self._template_response_middleware.append(instance.process_template_response)
+            if hasattr(instance, "process_exception"):
+                self._exception_middleware.append(instance.process_exception)
+            handler = convert_exception_to_response(instance)
+        self._middleware_chain = handler
+
+
+class MiddlewareGroup:
+
+    def __init__(self, paths, middleware, anonymous_only=False):
+        self.paths = [re.compile(path) for path in paths]
+        self.anonymous_only = anonymous_only
+        self.handler = MiddlewareChainHandler(middleware)
+        self.handler.load_middleware()
+
+    def matches(self, request):
+        if self.anonymous_only and not is_anonymous(request):
+            return False
+        return any(path.search(request.path_info) for path in self.paths)
+
+
+class MiddlewareGroupsMixin(BaseHandler):
+    """
+    Send the requests of the MIDDLEWARE_GROUPS to their own chain, the others to settings.MIDDLEWARE
+    """
+
+    middleware_groups: Sequence[MiddlewareGroup] = ()
+
+    def load_middleware(self):
+        super().load_middleware()
+        self.middleware_groups = [
+            MiddlewareGroup(group["PATHS"], group["MIDDLEWARE"], group.get("ANONYMOUS_ONLY", False))
+            for group in getattr(settings, "MIDDLEWARE_GROUPS", [])
+        ]
+
+    def get_response(self, request):
+        for group in self.middleware_groups:
+            if group.matches(request):
+                return group.handler.get_response(request)
+        return super().get_response(request)
+
+
+class MiddlewareGroupsWSGIHandler(MiddlewareGroupsMixin, WSGIHandler):
+    pass
+
+
+def get_wsgi_application():
+    """
+    django.core.wsgi.get_wsgi_application, with the MIDDLEWARE_GROUPS, warmed
+    up when TEMPLATE_WARMUP is set
+    """
+    import django
+
+    django.setup(set_prefix=False)
+    handler = MiddlewareGroupsWSGIHandler()
+    if getattr(settings, "TEMPLATE_WARMUP", False):
+        from fare.core.warmup import warm_up
+
+        warm_up()
+    return handler
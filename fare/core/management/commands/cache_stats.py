@@ -0,0 +1,34 @@
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+
+from fare.core.cache_metrics import get_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Report the hit ratio, latency and payload size of the instrumented caches, by key prefix"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Forget the statistics gathered so far")
+
+    def handle(self, *args, **options):
+        report = get_cache_stats()
+        if options["reset"]:
+            for alias in report:
+                caches[alias].stats.reset()
+            return
+        if not report:
+            self.stdout.write("No instrumented cache, see fare.core.cache_metrics")
+            return
+
+        for alias, prefixes in report.items():
+            self.stdout.write(f"{alias}:")
+            self.stdout.write(
+                f"  {'prefix':<30} {'ops':>9} {'hit ratio':>9} {'mean ms':>8} {'p99 ms':>7} "
+                f"{'mean bytes':>10} {'errors':>7}"
+            )
+            for prefix, metrics in sorted(prefixes.items(), key=lambda item: -item[1]["ops"]):
+                self.stdout.write(
+                    f"  {prefix or '-':<30} {metrics['ops']:>9.0f} {metrics['hit_ratio']:>9.1%} "
+                    f"{metrics['mean_ms']:>8.2f} {metrics['p99_ms']:>7g} {metrics['mean_bytes']:>10.0f} "
+                    f"{metrics['errors']:>7.0f}"
+                )
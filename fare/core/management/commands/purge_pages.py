@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from fare.core.pagecache import DEFAULT_TAGS, purge_tags
+
+
+class Command(BaseCommand):
+    help = "Drop the anonymous pages cached with the given tags, run on deploy"
+
+    def add_arguments(self, parser):
+        parser.add_argument("tags", nargs="*", default=list(DEFAULT_TAGS), help="Defaults to every public page")
+
+    def handle(self, *args, **options):
+        purge_tags(options["tags"])
+        self.stdout.write(f"Purged the pages tagged {', '.join(options['tags'])}")
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from fare.core.models import SlowQuery
+
+ORDERINGS = {
+    "total": lambda query: query.total_ms,
+    "calls": lambda query: query.calls,
+    "max": lambda query: query.max_ms,
+    "p95": lambda query: query.percentile(95),
+}
+
+
+class Command(BaseCommand):
+    help = "Report the slowest statement fingerprints recorded in production"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=10)
+        parser.add_argument("--order", choices=sorted(ORDERINGS), default="total")
+        parser.add_argument("--plans", action="store_true", help="Print the EXPLAIN plan of each statement")
+        parser.add_argument("--reset", action="store_true", help="Forget every recorded statement")
+
+    def handle(self, *args, **options):
+        if options["reset"]:
+            SlowQuery.objects.all().delete()
+            return
+
+        queries = sorted(SlowQuery.objects.all(), key=ORDERINGS[options["order"]], reverse=True)
+        for query in queries[:options["limit"]]:
+            self.stdout.write(
+                f"{query.calls:>7} calls {query.total_ms:>11.1f}ms total "
+                f"p50 {query.percentile(50):.1f}ms p95 {query.percentile(95):.1f}ms p99 {query.percentile(99):.1f}ms "
+                f"max {query.max_ms:.1f}ms  {query.view}"
+            )
+            self.stdout.write(f"    {query.fingerprint}")
+            if options["plans"] and query.plan:
+                self.stdout.write("    " + query.plan.replace("\n", "\n    "))
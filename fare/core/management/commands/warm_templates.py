@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fare.core.warmup import warm_templates
+
+
+class Command(BaseCommand):
+    help = "Compile every project and app template, as the WSGI application does at boot"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--strict", action="store_true", help="Fail when a template does not compile")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        compiled, failed = warm_templates()
+        self.stdout.write(f"{compiled} templates compiled in {(time.perf_counter() - started) * 1000:.0f}ms")
+        for name in failed:
+            self.stdout.write(f"    failed: {name}")
+        if failed and options["strict"]:
+            raise CommandError(f"{len(failed)} templates do not compile")
@@ -0,0 +1,156 @@
+import logging
+import threading
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.signals import request_finished
+from django.db import OperationalError
+from django.dispatch import receiver
+
+from fare.core.queries import QueryRecorder
+from fare.core.replicas import drop_used_replicas, primary_reads, replica_reads
+from fare.core.tasks import record_slow_query
+from fare.core.transaction import forbid_writes, read_only_transaction
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "TRACE")
+
+logger = logging.getLogger("fare.core.queries")
+
+# slow statements of the request being served by this thread, enqueued once it finishes
+_slow_queries = threading.local()
+
+
+class ReplicaMiddleware:
+    """
+    Let safe requests read from the replicas, except for a client that wrote
+    less than DATABASE_REPLICA_STICKY_SECONDS ago: it would not see its write
+    until the replicas caught up
+
+    A view failing with OperationalError after reading from a replica, e.g.
+    one that went down since its last check, is run again on the primary.
+    """
+    cookie_name = "primary_db"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            response.set_cookie(
+                self.cookie_name, "1", max_age=settings.DATABASE_REPLICA_STICKY_SECONDS, httponly=True, samesite="Lax"
+            )
+            return response
+
+        if self.cookie_name in request.COOKIES:
+            return self.get_response(request)
+        with replica_reads():
+            return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, OperationalError) or not drop_used_replicas():
+            return None
+        match = request.resolver_match
+        with primary_reads():
+            response = match.func(request, *match.args, **match.kwargs)
+            if callable(getattr(response, "render", None)):
+                response = response.render()
+        return response
+
+
+class ReadOnlyViewMiddleware:
+    """
+    Apply the read-only guard of the views declared with fare.core.transaction.read_only
+
+    The guard stays on until the response is rendered, and must come after
+    the middlewares that write, e.g. SessionMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with ExitStack() as stack:
+            request.read_only_guard = stack
+            return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        mode = getattr(view_func, "read_only", None)
+        if mode is None:
+            return None
+        # loading the user may flush a session whose auth hash no longer matches
+        if hasattr(request, "user"):
+            request.user.is_authenticated
+        request.read_only_guard.enter_context(forbid_writes())
+        if mode == "snapshot":
+            request.read_only_guard.enter_context(read_only_transaction())
+        return None
+
+
+class AnonymousUserMiddleware:
+    """
+    Set request.user to an anonymous user without reading the session, for the
+    anonymous only middleware groups of fare.core.handlers
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.user = AnonymousUser()
+        return self.get_response(request)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Record the queries of each request and log their count and SQL time under
+    the view name
+
+    Statements run QUERY_REPEAT_THRESHOLD times (the mark of an N+1) are logged
+    as warnings. Statements slower than SLOW_QUERY_THRESHOLD_MS, sampled at
+    SLOW_QUERY_SAMPLE_RATE, are handed to a Celery task that stores their
+    EXPLAIN plan and timings in SlowQuery; the task is enqueued on
+    request_finished, once the server has sent the response.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder(settings.SLOW_QUERY_THRESHOLD_MS, settings.SLOW_QUERY_SAMPLE_RATE)
+        with recorder.record():
+            response = self.get_response(request)
+        self.report(request, recorder)
+        return response
+
+    def report(self, request, recorder):
+        view = request.resolver_match.view_name if request.resolver_match else "<unresolved>"
+        sql_time = recorder.duration * 1000
+        logger.info(
+            "%s: %d queries in %.1fms", view, recorder.count, sql_time,
+            extra={"view": view, "queries": recorder.count, "sql_time": sql_time},
+        )
+        for sql, count in recorder.repeated(settings.QUERY_REPEAT_THRESHOLD):
+            logger.warning(
+                "%s: statement run %d times, likely an N+1: %s", view, count, sql[:500],
+                extra={"view": view, "repeats": count, "fingerprint": sql},
+            )
+
+        _slow_queries.pending = [
+            (alias, sql, params, duration * 1000, view) for alias, sql, params, duration in recorder.slow
+        ]
+
+
+@receiver(request_finished)
+def enqueue_slow_queries(**kwargs):
+    pending, _slow_queries.pending = getattr(_slow_queries, "pending", []), []
+    for args in pending:
+        try:
+            record_slow_query.delay(*args)
+        except Exception:
+            # a broker outage must not fail the request
+            logger.warning("Cannot enqueue the slow query of %s", args[-1], exc_info=True)
@@ -0,0 +1,35 @@
+# Generated by Django 2.2.28 on 2026-10-18 11:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=32, unique=True)),
+                ('fingerprint', models.TextField(verbose_name='Fingerprint')),
+                ('example', models.TextField(verbose_name='Last statement')),
+                ('view', models.CharField(blank=True, max_length=200, verbose_name='Last view')),
+                ('calls', models.PositiveIntegerField(default=0, verbose_name='Calls')),
+                ('total_ms', models.FloatField(default=0, verbose_name='Total time (ms)')),
+                ('max_ms', models.FloatField(default=0, verbose_name='Slowest (ms)')),
+                ('samples', models.TextField(default='[]')),
+                ('plan', models.TextField(blank=True, verbose_name='Plan')),
+                ('first_seen', models.DateTimeField(auto_now_add=True, verbose_name='First seen')),
+                ('last_seen', models.DateTimeField(auto_now=True, verbose_name='Last seen')),
+            ],
+            options={
+                'verbose_name_plural': 'slow queries',
+                'ordering': ['-total_ms'],
+            },
+        ),
+    ]
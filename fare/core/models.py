@@ -0,0 +1,52 @@
+import json
+import math
+
+from django.db.models import CharField, DateTimeField, FloatField, Model, PositiveIntegerField, TextField
+from django.utils.translation import ugettext_lazy as _
+
+
+class SlowQuery(Model):
+    """
+    Timings and plan of a statement fingerprint seen above SLOW_QUERY_THRESHOLD_MS
+
+    :attr samples: JSON list of the last SAMPLES durations in milliseconds, for the percentiles
+    :type samples: string
+    """
+
+    SAMPLES = 200
+
+    digest = CharField(max_length=32, unique=True)
+    fingerprint = TextField(_("Fingerprint"))
+    example = TextField(_("Last statement"))
+    view = CharField(_("Last view"), max_length=200, blank=True)
+    calls = PositiveIntegerField(_("Calls"), default=0)
+    total_ms = FloatField(_("Total time (ms)"), default=0)
+    max_ms = FloatField(_("Slowest (ms)"), default=0)
+    samples = TextField(default="[]")
+    plan = TextField(_("Plan"), blank=True)
+    first_seen = DateTimeField(_("First seen"), auto_now_add=True)
+    last_seen = DateTimeField(_("Last seen"), auto_now=True)
+
+    class Meta:
+        ordering = ["-total_ms"]
+        verbose_name_plural = "slow queries"
+
+    def __str__(self):
+        return self.fingerprint[:100]
+
+    def add_sample(self, duration_ms):
+        samples = json.loads(self.samples)[-(self.SAMPLES - 1):]
+        samples.append(round(duration_ms, 3))
+        self.samples = json.dumps(samples)
+        self.calls += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+
+    def percentile(self, percent):
+        """
+        Nearest-rank percentile of the recent samples, in milliseconds
+        """
+        samples = sorted(json.loads(self.samples))
+        if not samples:
+            return 0.0
+        return samples[max(math.ceil(percent / 100 * len(samples)) - 1, 0)]
@@ -0,0 +1,164 @@
+"""
+Full-page cache of the public pages, for anonymous visitors only
+
+Views opt in with cache_anonymous; PageCacheMiddleware, near the top of the
+stack, answers their anonymous requests from the cache before the session,
+CSRF and authentication middleware run. A request is anonymous when it has no
+session, messages or CSRF cookie and no Authorization header, so a visitor
+who has logged in, or has a message waiting, always gets a fresh page.
+
+Pages are keyed by host, path, query string and language, and by the version
+of each of their tags: purge_tags (the purge_pages command, run on deploy)
+bumps the versions, and the old pages are never read again.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils import translation
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+PAGE_KEY = "pages:page:{digest}"
+TAG_KEY = "pages:tag:{tag}"
+DEFAULT_TAGS = ("pages",)
+STORED_HEADERS = ("Content-Language",)
+
+
+class PageCacheOptions:
+    """
+    :attr timeout: seconds a page is served from the cache
+    :type timeout: int
+    :attr browser_timeout: max-age given to the browsers and the proxy
+    :type browser_timeout: int
+    :attr tags: names purging the page
+    :type tags: tuple
+    """
+
+    def __init__(self, timeout, browser_timeout, tags):
+        self.timeout = timeout
+        self.browser_timeout = browser_timeout
+        self.tags = tuple(tags)
+
+
+def cache_anonymous(view=None, timeout=None, browser_timeout=None, tags=DEFAULT_TAGS):
+    """
+    Serve the anonymous requests of the view from PageCacheMiddleware
+
+    The timeouts default to PAGE_CACHE_TIMEOUT and PAGE_CACHE_BROWSER_TIMEOUT.
+    Usable with or without arguments, like read_only.
+    """
+    def decorator(view):
+        view.page_cache = PageCacheOptions(
+            timeout if timeout is not None else settings.PAGE_CACHE_TIMEOUT,
+            browser_timeout if browser_timeout is not None else settings.PAGE_CACHE_BROWSER_TIMEOUT,
+            tags,
+        )
+        return view
+
+    return decorator(view) if view is not None else decorator
+
+
+def _new_version():
+    return repr(time.time())
+
+
+def get_tag_versions(tags):
+    keys = [TAG_KEY.format(tag=tag) for tag in tags]
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        for key, version in missing.items():
+            cache.add(key, version, None)
+        versions.update(cache.get_many(list(missing)))
+    return [versions.get(key) or missing[key] for key in keys]
+
+
+def purge_tags(tags=DEFAULT_TAGS):
+    """
+    Drop every cached page carrying one of the tags
+    """
+    cache.set_many({TAG_KEY.format(tag=tag): _new_version() for tag in tags}, None)
+
+
+def request_language(request):
+    # the middleware runs before LocaleMiddleware, which has not activated the language yet
+    if "django.middleware.locale.LocaleMiddleware" in settings.MIDDLEWARE:
+        return translation.get_language_from_request(request)
+    return settings.LANGUAGE_CODE
+
+
+def is_anonymous(request):
+    cookies = (settings.SESSION_COOKIE_NAME, settings.CSRF_COOKIE_NAME, "messages")
+    return not any(name in request.COOKIES for name in cookies) and "HTTP_AUTHORIZATION" not in request.META
+
+
+def get_options(request):
+    """
+    Return the PageCacheOptions of the view serving the request, or None if it is not cached
+    """
+    if request.method not in ("GET", "HEAD") or not is_anonymous(request):
+        return None
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return None
+    return getattr(match.func, "page_cache", None)
+
+
+def page_key(request, options):
+    parts = [request.get_host(), request.get_full_path(), request_language(request)]
+    parts += get_tag_versions(options.tags)
+    return PAGE_KEY.format(digest=hashlib.md5("\n".join(parts).encode()).hexdigest())
+
+
+def add_cache_headers(response, options):
+    # the same URL is private for a logged in user, shared caches must tell them apart
+    patch_vary_headers(response, ("Cookie", "Accept-Language"))
+    patch_cache_control(response, public=True, max_age=options.browser_timeout)
+
+
+class PageCacheMiddleware:
+    """
+    Answer the anonymous requests of the cache_anonymous views from the cache
+
+    Only complete 200 responses setting no cookie are stored; responses of
+    those views to logged in users are marked private. Of the headers, only
+    the STORED_HEADERS are kept: the middleware adding headers to every
+    response, e.g. SecurityMiddleware or XFrameOptionsMiddleware, must come
+    before this one.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        options = get_options(request)
+        if options is None:
+            response = self.get_response(request)
+            if getattr(request, "resolver_match", None) and hasattr(request.resolver_match.func, "page_cache"):
+                patch_cache_control(response, private=True)
+            return response
+
+        key = page_key(request, options)
+        cached = cache.get(key)
+        if cached is not None:
+            content, status, content_type, headers = cached
+            # an explicit content type spares HttpResponse a (slow, deprecated) settings lookup
+            response = HttpResponse(content, status=status, content_type=content_type)
+            for name, value in headers:
+                response[name] = value
+            response["X-Page-Cache"] = "hit"
+            add_cache_headers(response, options)
+            return response
+
+        response = self.get_response(request)
+        if response.status_code == 200 and not response.streaming and not response.cookies:
+            headers = [(name, response[name]) for name in STORED_HEADERS if response.has_header(name)]
+            cached = (response.content, response.status_code, response["Content-Type"], headers)
+            cache.set(key, cached, options.timeout)
+            response["X-Page-Cache"] = "miss"
+            add_cache_headers(response, options)
+        return response
@@ -0,0 +1,205 @@
+"""
+A bounded, thread safe connection pool, one per process and database alias
+
+The pool does not know about any database driver: it is given the callables
+creating, checking, resetting and closing a connection. A pool inherited
+through fork (gunicorn workers, Celery prefork children) forgets the parent's
+connections without closing them, closing would end the parent's sessions.
+They stay referenced until the process exits: a driver closes a connection
+it collects (psycopg2 sends the terminate message on the shared socket).
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Tuple
+
+
+# connections inherited from the parent process, never used nor closed
+_inherited: List[Any] = []
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    :attr max_size: most connections open at once, idle or in use
+    :type max_size: int
+    :attr timeout: seconds a checkout waits for a connection before PoolExhausted
+    :type timeout: float
+    :attr check_interval: idle seconds after which a connection is checked before use
+    :type check_interval: float
+    :attr max_lifetime: seconds after which a connection is closed instead of reused
+    :type max_lifetime: float
+    """
+
+    def __init__(self, check, reset, close, max_size=4, timeout=5.0, check_interval=30.0, max_lifetime=30 * 60):
+        self.check = check
+        self.reset = reset
+        self.close = close
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.max_lifetime = max_lifetime
+        self._forget()
+
+    def _forget(self):
+        if getattr(self, "pid", None) not in (None, os.getpid()):
+            _inherited.extend(connection for connection, created in self._created.values())
+        self.pid = os.getpid()
+        self._condition = threading.Condition()
+        # (connection, created at, released at), the most recently released last
+        self._idle: Deque[Tuple[Any, float, float]] = deque()
+        # id -> (connection, created at), idle or in use
+        self._created: Dict[int, Tuple[Any, float]] = {}
+        self._size = 0
+        self.counters: Dict[str, float] = dict.fromkeys(
+            ("created", "closed", "checkouts", "waits", "wait_time", "max_wait", "timeouts", "failed_checks"), 0
+        )
+
+    def _check_fork(self):
+        if self.pid != os.getpid():
+            self._forget()
+
+    def stats(self):
+        self._check_fork()
+        with self._condition:
+            stats = dict(self.counters, size=self._size, idle=len(self._idle), max_size=self.max_size)
+        stats["in_use"] = stats["size"] - stats["idle"]
+        return stats
+
+    def _discard(self, connection):
+        # called with the condition held
+        self._size -= 1
+        self._created.pop(id(connection), None)
+        self.counters["closed"] += 1
+        self._condition.notify()
+
+    def _check(self, connection):
+        try:
+            return self.check(connection)
+        except Exception:
+            return False
+
+    def _close_quietly(self, connection):
+        try:
+            self.close(connection)
+        except Exception:
+            pass
+
+    def acquire(self, create):
+        """
+        Return an idle connection, or one made by ``create`` while the pool is not full
+
+        :raises PoolExhausted: after waiting ``timeout`` seconds for a connection
+        """
+        self._check_fork()
+        started = time.monotonic()
+        deadline = started + self.timeout
+        while True:
+            with self._condition:
+                waited = False
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.counters["timeouts"] += 1
+                        raise PoolExhausted(f"No database connection available after {self.timeout}s")
+                    waited = True
+                    self._condition.wait(remaining)
+
+                if waited:
+                    wait = time.monotonic() - started
+                    self.counters["waits"] += 1
+                    self.counters["wait_time"] += wait
+                    self.counters["max_wait"] = max(self.counters["max_wait"], wait)
+                self.counters["checkouts"] += 1
+
+                if self._idle:
+                    connection, created, released = self._idle.pop()
+                else:
+                    connection = None
+                    self._size += 1
+
+            if connection is None:
+                try:
+                    connection = create()
+                except BaseException:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+                with self._condition:
+                    self._created[id(connection)] = (connection, time.monotonic())
+                    self.counters["created"] += 1
+                return connection
+
+            now = time.monotonic()
+            expired = now - created > self.max_lifetime
+            if not expired and (now - released < self.check_interval or self._check(connection)):
+                return connection
+
+            # dead or too old: close it and try again within the same deadline
+            self._close_quietly(connection)
+            with self._condition:
+                if not expired:
+                    self.counters["failed_checks"] += 1
+                self._discard(connection)
+
+    def release(self, connection):
+        """
+        Give a connection back, closing it if it cannot be reset
+        """
+        self._check_fork()
+        with self._condition:
+            entry = self._created.get(id(connection))
+        if entry is None or entry[0] is not connection:
+            # inherited from the parent process: neither reuse nor close it here
+            _inherited.append(connection)
+            return
+        created = entry[1]
+        reusable = self._reset(connection)
+        if not reusable:
+            self._close_quietly(connection)
+        with self._condition:
+            if reusable:
+                self._idle.append((connection, created, time.monotonic()))
+                self._condition.notify()
+            else:
+                self._discard(connection)
+
+    def _reset(self, connection):
+        try:
+            return self.reset(connection)
+        except Exception:
+            return False
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, **options):
+    """
+    Return the pool of a database alias in this process, creating it with ``options``
+    """
+    pool = _pools.get(alias)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None:
+                pool = _pools[alias] = ConnectionPool(**options)
+    return pool
+
+
+def get_pool_stats():
+    return {alias: pool.stats() for alias, pool in list(_pools.items())}
+
+
+def reset_pools():
+    """
+    Forget every pooled connection inherited from the parent, right after a fork
+    """
+    for pool in list(_pools.values()):
+        pool._check_fork()
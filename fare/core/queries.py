@@ -0,0 +1,92 @@
+"""
+Query instrumentation: per-request counts, SQL time, repeated statements and slow statements
+
+QueryRecorder is an execute wrapper installed on every connection for the
+duration of a block, used by fare.core.middleware.QueryInstrumentationMiddleware
+and by the query_budget test fixture.
+"""
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from typing import Any, Counter as CounterType, List, Tuple
+
+from django.db import connections
+
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r"(?<![\w.\"])-?\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """
+    Normalize a statement so that it compares equal whatever its values
+    and the length of its IN lists
+    """
+    sql = _STRINGS.sub("?", sql)
+    sql = _NUMBERS.sub("?", sql.replace("%s", "?"))
+    sql = _LISTS.sub("(...)", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+def json_params(params):
+    return [param if isinstance(param, (str, int, float, bool, type(None))) else str(param) for param in params]
+
+
+class QueryRecorder:
+    """
+    Execute wrapper recording the statements run while it is installed
+
+    :attr count: statements run
+    :type count: int
+    :attr duration: seconds spent running them
+    :type duration: float
+    :attr fingerprints: how many times each normalized statement ran
+    :type fingerprints: Counter
+    :attr statements: every statement run, in order, when keep_statements is set
+    :type statements: list
+    :attr slow: (alias, sql, params, seconds) of the sampled slow statements
+    :type slow: list
+    """
+
+    def __init__(self, slow_threshold_ms=None, sample_rate=1.0, keep_statements=False):
+        self.slow_threshold = None if slow_threshold_ms is None else slow_threshold_ms / 1000
+        self.sample_rate = sample_rate
+        self.keep_statements = keep_statements
+        self.statements: List[str] = []
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints: CounterType[str] = Counter()
+        self.slow: List[Tuple[str, str, Any, float]] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.count += 1
+            self.duration += duration
+            self.fingerprints[fingerprint(sql)] += 1
+            if self.keep_statements:
+                self.statements.append(sql)
+            if (
+                self.slow_threshold is not None and duration >= self.slow_threshold and not many
+                and random.random() < self.sample_rate
+            ):
+                self.slow.append((context["connection"].alias, sql, json_params(params or ()), duration))
+
+    def repeated(self, threshold):
+        """
+        Return the statements run at least ``threshold`` times, the most repeated first
+        """
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count >= threshold]
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
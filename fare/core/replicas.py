@@ -0,0 +1,177 @@
+"""
+Read replica routing, see DATABASE_REPLICAS
+
+Reads of the DATABASE_REPLICA_APPS models go to a replica only inside
+replica_reads(), which ReplicaMiddleware enters for safe requests not pinned
+to the primary, and only outside a transaction: reads in a transaction must
+see its writes. Everything else, Celery tasks and commands included, uses the
+primary.
+
+Data cached under a change stamp must be read from a replica that has
+replayed the change, or the old row would be cached, or sent with a
+validator, under the new stamp. The stamps read in replica_reads() are
+passed to require_stamps(): the following reads only go to the replicas known
+to be current up to the newest of them, and to the primary when none is.
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, OperationalError, connections
+
+logger = logging.getLogger(__name__)
+
+# 0 when the replica replayed all it received, even if the last transaction is old
+LAG_QUERY = """
+    SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END
+"""
+# seconds a replica is assumed further behind than measured, for the clock
+# skew between the web servers and the databases and the WAL still in flight
+CLOCK_MARGIN = 1.0
+
+_state = threading.local()
+# alias -> (checked at, time up to which the replica has replayed the primary or None when unusable), per process
+_health: Dict[str, Tuple[float, Optional[float]]] = {}
+
+
+@contextmanager
+def replica_reads():
+    previous: Tuple[bool, float, Set[str]] = (
+        getattr(_state, "use_replicas", False), getattr(_state, "since", 0.0), getattr(_state, "used", set())
+    )
+    _state.use_replicas, _state.since, _state.used = True, 0.0, set()
+    try:
+        yield
+    finally:
+        _state.use_replicas, _state.since, _state.used = previous
+
+
+@contextmanager
+def primary_reads():
+    """
+    Read from the primary, even inside replica_reads()
+    """
+    previous = getattr(_state, "use_replicas", False)
+    _state.use_replicas = False
+    try:
+        yield
+    finally:
+        _state.use_replicas = previous
+
+
+def require_stamps(stamps):
+    """
+    Read from now on only from the replicas that have replayed the changes the
+    given stamps (time.time() values, as strings or floats) were made for
+    """
+    if stamps and getattr(_state, "use_replicas", False):
+        _state.since = max(getattr(_state, "since", 0.0), *(float(stamp) for stamp in stamps))
+
+
+def get_lag(alias):
+    connection = connections[alias]
+    if connection.vendor != "postgresql":
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(LAG_QUERY)
+        return float(cursor.fetchone()[0])
+
+
+def _check(alias):
+    """
+    Return the time up to which a replica has replayed the primary, or None
+    when it is unreachable or lags more than DATABASE_REPLICA_MAX_LAG seconds;
+    checked at most every DATABASE_REPLICA_CHECK_INTERVAL seconds
+    """
+    now = time.monotonic()
+    checked = _health.get(alias)
+    if checked is not None and now - checked[0] < settings.DATABASE_REPLICA_CHECK_INTERVAL:
+        return checked[1]
+    try:
+        lag = get_lag(alias)
+    except DatabaseError:
+        logger.warning("Replica %s is unreachable, reading from the primary", alias, exc_info=True)
+        current_until = None
+    else:
+        current_until = time.time() - lag - CLOCK_MARGIN if lag <= settings.DATABASE_REPLICA_MAX_LAG else None
+        if current_until is None:
+            logger.warning("Replica %s lags %.1fs behind, reading from the primary", alias, lag)
+    _health[alias] = (now, current_until)
+    return current_until
+
+
+def is_current(alias):
+    """
+    Tell whether rows read from ``alias`` may be used under the stamps required so far
+    """
+    if alias not in settings.DATABASE_REPLICAS:
+        return True
+    current_until = _check(alias)
+    return current_until is not None and current_until >= getattr(_state, "since", 0.0)
+
+
+def drop_used_replicas():
+    """
+    Skip the replicas read from in the current replica_reads() block until
+    their next check, e.g. after a query failed on one of them; return them
+    """
+    used = set(getattr(_state, "used", ()))
+    if used:
+        logger.warning("A query failed on replica %s, skipping it until the next check", ", ".join(sorted(used)))
+    now = time.monotonic()
+    for alias in used:
+        _health[alias] = (now, None)
+    return used
+
+
+def retry_on_primary(func, *args):
+    """
+    Call ``func``, and again on the primary if it fails with OperationalError
+    after reading from a replica, e.g. one that went down since its last check
+    """
+    try:
+        return func(*args)
+    except OperationalError:
+        if not drop_used_replicas():
+            raise
+    with primary_reads():
+        return func(*args)
+
+
+def get_replica():
+    replicas = [alias for alias in settings.DATABASE_REPLICAS if is_current(alias)]
+    if not replicas:
+        return None
+    alias = random.choice(replicas)
+    _state.used.add(alias)
+    return alias
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if not getattr(_state, "use_replicas", False) or model._meta.app_label not in settings.DATABASE_REPLICA_APPS:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return get_replica()
+
+    def db_for_write(self, model, **hints):
+        # an instance read from a replica would otherwise be saved back to it
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,47 @@
+import hashlib
+
+from django.db import DatabaseError, connections, transaction
+
+from fare.core.models import SlowQuery
+from fare.core.queries import fingerprint
+from fare.taskapp.celery import app
+
+EXPLAIN_PREFIXES = {"postgresql": "EXPLAIN (ANALYZE off) ", "sqlite": "EXPLAIN QUERY PLAN "}
+
+
+def explain(alias, sql, params):
+    """
+    Return the plan of a SELECT without running it, or an empty string
+    """
+    if sql.lstrip()[:6].upper() != "SELECT":
+        return ""
+    connection = connections[alias]
+    prefix = EXPLAIN_PREFIXES.get(connection.vendor, "EXPLAIN ")
+    try:
+        with transaction.atomic(using=alias), connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+    except DatabaseError as exc:
+        return f"EXPLAIN failed: {exc}"
+
+
+@app.task(ignore_result=True)
+def record_slow_query(alias, sql, params, duration_ms, view):
+    """
+    Add a slow statement to the SlowQuery of its fingerprint, explaining it the first time
+    """
+    normalized = fingerprint(sql)
+    digest = hashlib.md5(normalized.encode()).hexdigest()
+    # EXPLAIN outside of the row lock, and only for new fingerprints
+    plan = "" if SlowQuery.objects.filter(digest=digest).exclude(plan="").exists() else explain(alias, sql, params)
+
+    with transaction.atomic():
+        slow_query, _ = SlowQuery.objects.select_for_update().get_or_create(
+            digest=digest, defaults={"fingerprint": normalized}
+        )
+        slow_query.add_sample(duration_ms)
+        slow_query.example = sql
+        slow_query.view = view[:200]
+        if plan:
+            slow_query.plan = plan
+        slow_query.save()
@@ -0,0 +1,29 @@
+from contextlib import contextmanager
+from typing import List
+
+from fare.core.queries import QueryRecorder
+
+
+@contextmanager
+def assert_query_budget(budget, repeats=None):
+    """
+    Fail when the block runs more than ``budget`` queries, on any database,
+    or a statement more than ``repeats`` times
+
+    Available to the tests as the ``query_budget`` fixture.
+    """
+    recorder = QueryRecorder(keep_statements=True)
+    with recorder.record():
+        yield recorder
+
+    problems: List[str] = []
+    if recorder.count > budget:
+        problems.append(f"{recorder.count} queries run, the budget is {budget}")
+    if repeats is not None:
+        problems += [
+            f"statement run {count} times, at most {repeats} allowed: {sql}"
+            for sql, count in recorder.repeated(repeats + 1)
+        ]
+    if problems:
+        statements = "\n".join(f"  {index}. {sql}" for index, sql in enumerate(recorder.statements, start=1))
+        raise AssertionError("\n".join(problems) + "\nQueries:\n" + statements)
@@ -0,0 +1,351 @@
+import queue
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Counter as CounterType, Dict
+
+import pytest
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from fare.core import cache as tiered
+from fare.core.cache import Computed, LocalLRU, LocalTier
+
+LATENCY = 0.002
+
+
+class CountingCache(LocMemCache):
+    """
+    Local memory cache counting its operations, slowed down like a network cache
+    """
+
+    ops: CounterType[str] = Counter()
+    latency = 0
+
+    def _op(self, name):
+        self.ops[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get(self, *args, **kwargs):
+        self._op("get")
+        return super().get(*args, **kwargs)
+
+    def get_many(self, keys, version=None):
+        # a single round-trip, not one get per key
+        self._op("get_many")
+        values = {key: LocMemCache.get(self, key, version=version) for key in keys}
+        return {key: value for key, value in values.items() if value is not None}
+
+    def set(self, *args, **kwargs):
+        self._op("set")
+        return super().set(*args, **kwargs)
+
+    def add(self, *args, **kwargs):
+        self._op("add")
+        return super().add(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        self._op("delete")
+        return super().delete(*args, **kwargs)
+
+
+class FakeBus:
+    """
+    The publish / subscribe commands of Redis, delivering to every subscriber
+    """
+
+    def __init__(self):
+        self.subscribers = []
+
+    def publish(self, channel, payload):
+        for subscribed, messages in self.subscribers:
+            if subscribed == channel:
+                messages.put({"data": payload.encode()})
+
+    def pubsub(self, ignore_subscribe_messages=True):
+        return FakePubSub(self)
+
+
+class FakePubSub:
+
+    def __init__(self, bus):
+        self.bus = bus
+
+    def subscribe(self, channel):
+        self.messages: queue.Queue[Dict[str, Any]] = queue.Queue()
+        self.bus.subscribers.append((channel, self.messages))
+
+    def listen(self):
+        while True:
+            yield self.messages.get()
+
+
+def make_settings(location, **options):
+    return {
+        "BACKEND": "fare.core.cache.TieredCache",
+        "LOCATION": location,
+        "OPTIONS": dict({"REMOTE": "counting"}, **options),
+    }
+
+
+@pytest.fixture
+def remote(settings, monkeypatch):
+    monkeypatch.setattr(tiered, "_tiers", {})
+    monkeypatch.setattr(CountingCache, "ops", Counter())
+    settings.CACHES = dict(
+        settings.CACHES,
+        counting={"BACKEND": "fare.core.tests.test_cache.CountingCache", "LOCATION": "counting"},
+        tiered=make_settings("tiered"),
+    )
+    caches["counting"].clear()
+    return CountingCache
+
+
+def test_lru_drops_the_least_recently_used_and_the_expired():
+    lru = LocalLRU(2)
+    lru.set("a", b"1", 60)
+    lru.set("b", b"2", 60)
+    lru.get("a")
+    lru.set("c", b"3", 60)
+    lru.set("c", b"3", -1)
+
+    assert lru.get("a") == b"1"
+    assert lru.get("b") is None
+    assert lru.get("c") is None
+
+
+def test_reads_are_served_locally(remote):
+    cache = caches["tiered"]
+    cache.set("key", {"value": 1})
+    remote.ops.clear()
+
+    for _ in range(10):
+        assert cache.get("key") == {"value": 1}
+        assert cache.get_many(["key"]) == {"key": {"value": 1}}
+
+    assert remote.ops["get"] == 1 and remote.ops["get_many"] == 0
+
+
+def test_local_copies_are_not_shared_objects(remote):
+    cache = caches["tiered"]
+    cache.set("key", {"value": 1})
+    cache.get("key")["value"] = 2
+
+    assert cache.get("key") == {"value": 1}
+
+
+def test_local_copies_expire(remote, settings):
+    settings.CACHES["tiered"] = make_settings("tiered", LOCAL_TIMEOUT=0.01)
+    cache = caches["tiered"]
+    cache.set("key", 1)
+    cache.get("key")
+    time.sleep(0.02)
+    remote.ops.clear()
+
+    assert cache.get("key") == 1
+    assert remote.ops["get"] == 1
+
+
+def test_writes_invalidate_the_other_processes(remote, settings, monkeypatch):
+    bus = FakeBus()
+    monkeypatch.setattr(LocalTier, "get_client", lambda tier: bus)
+    settings.CACHES["first"] = make_settings("first", PUBSUB_ALIAS="redis", CHANNEL="invalidate")
+    settings.CACHES["second"] = make_settings("second", PUBSUB_ALIAS="redis", CHANNEL="invalidate")
+    first, second = caches["first"], caches["second"]
+    for cache in (first, second):
+        cache.tier.usable()
+        while not cache.tier.subscribed:
+            time.sleep(0.001)
+
+    first.set("key", "old")
+    assert second.get("key") == "old"
+    first.set("key", "new")
+    deadline = time.monotonic() + 1
+    while second.tier.lru.get(second.make_key("key")) is not None and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+    assert second.get("key") == "new"
+    first.clear()
+    while len(second.tier.lru) and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert second.get("key") is None
+
+
+@pytest.mark.parametrize("read", [lambda cache: cache.get("key"), lambda cache: cache.get_many(["key"])["key"]])
+def test_invalidation_during_a_remote_read_is_not_lost(remote, monkeypatch, read):
+    cache, counting = caches["tiered"], caches["counting"]
+    cache.set("key", "old")
+    remote_get_many = counting.get_many
+
+    def racing(get):
+        def get_with_a_concurrent_write(*args, **kwargs):
+            found = get(*args, **kwargs)
+            # another process writes, and its invalidation arrives before the local copy is stored
+            LocMemCache.set(counting, "key", "new")
+            cache.tier.evict(cache.make_key("key"))
+            return found
+
+        return get_with_a_concurrent_write
+
+    monkeypatch.setattr(counting, "get", racing(counting.get))
+    monkeypatch.setattr(counting, "get_many", racing(remote_get_many))
+    assert read(cache) == "old"
+    monkeypatch.undo()
+
+    assert cache.get("key") == "new"
+
+
+def test_failed_publish_is_retried(remote, monkeypatch, caplog):
+    bus, failures = FakeBus(), Counter({"left": 1})
+
+    def get_client(tier):
+        if failures["left"]:
+            failures["left"] -= 1
+            raise ConnectionError("Connection closed by server")
+        return bus
+
+    monkeypatch.setattr(LocalTier, "get_client", get_client)
+    tier = LocalTier(10, "invalidate", "redis")
+    messages = bus.pubsub()
+    messages.subscribe("invalidate")
+
+    tier.publish(["key"])
+    assert messages.messages.get_nowait() == {"data": b"key"}
+    assert "Cannot publish" not in caplog.text
+
+    failures["left"] = 2
+    tier.publish(["key"])
+    assert messages.messages.empty()
+    assert "Cannot publish a cache invalidation" in caplog.text
+
+
+def test_counters_are_not_published(remote, monkeypatch):
+    published = []
+    monkeypatch.setattr(LocalTier, "publish", lambda tier, keys: published.append(list(keys)))
+    cache = caches["tiered"]
+    cache.add("hits", 0)
+    published.clear()
+    cache.get("hits")
+
+    assert cache.incr("hits") == 1
+    assert cache.decr("hits", 2) == -1
+    assert published == []
+    assert cache.get("hits") == -1
+
+
+def test_local_tier_is_off_until_subscribed(remote, settings, monkeypatch):
+    def unreachable(tier):
+        raise ConnectionError("Redis is down")
+
+    monkeypatch.setattr(LocalTier, "get_client", unreachable)
+    monkeypatch.setattr(tiered.time, "sleep", lambda seconds: None)
+    settings.CACHES["tiered"] = make_settings("down", PUBSUB_ALIAS="redis")
+    cache = caches["tiered"]
+    cache.set("key", 1)
+    remote.ops.clear()
+
+    assert cache.get("key") == 1 and cache.get("key") == 1
+    assert remote.ops["get"] == 2
+    # stops the listener retrying
+    cache.tier.pid = -1
+
+
+def test_forked_tier_forgets_its_copies(remote):
+    cache = caches["tiered"]
+    cache.set("key", 1)
+    cache.get("key")
+    cache.tier.pid = -1
+
+    cache.tier.usable()
+
+    assert len(cache.tier.lru) == 0
+
+
+def test_get_or_set_computes_a_missing_value_once(remote, settings):
+    settings.CACHES["tiered"] = make_settings("tiered", LOCK_POLL=0.005)
+    calls: CounterType[str] = Counter()
+
+    def compute():
+        calls["compute"] += 1
+        time.sleep(0.05)
+        return "value"
+
+    def read(_):
+        return caches["tiered"].get_or_set("cold", compute, 60)
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        results = list(executor.map(read, range(10)))
+
+    assert results == ["value"] * 10
+    assert calls["compute"] == 1
+
+
+def test_get_or_set_recomputes_before_expiry_and_serves_the_old_value(remote, monkeypatch):
+    cache = caches["tiered"]
+    # computed in 10s, expiring in 1s, and an unlucky draw: XFetch recomputes it now
+    monkeypatch.setattr(tiered.random, "random", lambda: 0.99)
+    cache.set("key", Computed("old", time.time() + 1, 10.0), 60)
+
+    assert cache.get_or_set("key", lambda: "new", 60) == "new"
+
+    cache.set("key", Computed("old", time.time() + 1, 10.0), 60)
+    caches["counting"].add("key:lock", 1, 60, version=None)
+    assert cache.get_or_set("key", lambda: "new", 60) == "old"
+
+
+def test_get_or_set_values_read_as_plain_values(remote):
+    cache = caches["tiered"]
+    cache.get_or_set("key", lambda: [1, 2], 60)
+
+    assert cache.get("key") == [1, 2]
+    assert cache.get_many(["key"]) == {"key": [1, 2]}
+
+
+def test_get_or_set_computes_when_the_remote_cache_fails(remote, monkeypatch):
+    # django_redis with IGNORE_EXCEPTIONS answers None to every command when Redis is down
+    monkeypatch.setattr(CountingCache, "add", lambda *args, **kwargs: None)
+    monkeypatch.setattr(CountingCache, "get", lambda *args, **kwargs: None)
+
+    assert caches["tiered"].get_or_set("key", lambda: "value", 60) == "value"
+
+
+def _p99(durations):
+    durations = sorted(durations)
+    return durations[int(len(durations) * 0.99)]
+
+
+def _read_hot_keys(alias, readers=8, reads=200):
+    def read(_):
+        cache = caches[alias]
+        durations = []
+        for index in range(reads):
+            started = time.perf_counter()
+            cache.get_many([f"stamp:{index % 5}", "stamp:directory"])
+            cache.get(f"fragment:{index % 5}")
+            durations.append(time.perf_counter() - started)
+        return durations
+
+    with ThreadPoolExecutor(max_workers=readers) as executor:
+        return [duration for durations in executor.map(read, range(readers)) for duration in durations]
+
+
+def test_hot_keys_cost_fewer_remote_operations_and_less_latency(remote, monkeypatch):
+    """
+    The read pattern of the profile pages, stamps and fragments, by concurrent
+    workers over a cache a couple of milliseconds away
+    """
+    for index in range(5):
+        caches["counting"].set_many({f"stamp:{index}": index, "stamp:directory": 0, f"fragment:{index}": "x" * 500})
+    monkeypatch.setattr(CountingCache, "latency", LATENCY)
+
+    remote.ops.clear()
+    direct = _read_hot_keys("counting")
+    direct_ops = sum(remote.ops.values())
+    remote.ops.clear()
+    layered = _read_hot_keys("tiered")
+    layered_ops = sum(remote.ops.values())
+
+    assert direct_ops == 3200
+    assert layered_ops <= direct_ops / 10
+    assert _p99(layered) < _p99(direct)
@@ -0,0 +1,173 @@
+from collections import defaultdict
+from io import StringIO
+from typing import DefaultDict, Dict
+
+import pytest
+from django.core.cache import caches
+from django.core.management import call_command
+from django.urls import reverse
+from redis.exceptions import ConnectionError
+
+from fare.core import cache_metrics
+from fare.core.cache_metrics import CacheStats, get_cache_stats, key_prefix
+
+
+class FakeRedis:
+    """
+    The hash commands the statistics are kept with
+    """
+
+    def __init__(self):
+        self.hashes: DefaultDict[str, Dict[bytes, float]] = defaultdict(dict)
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def hincrbyfloat(self, key, field, value):
+        self.hashes[key][field.encode()] = self.hashes[key].get(field.encode(), 0) + value
+
+    def execute(self):
+        return []
+
+    def hgetall(self, key):
+        return {field: str(value).encode() for field, value in self.hashes[key].items()}
+
+    def delete(self, key):
+        self.hashes.pop(key, None)
+
+
+@pytest.fixture
+def remote(settings, monkeypatch):
+    monkeypatch.setattr(cache_metrics, "_stats", {})
+    settings.CACHES = dict(
+        settings.CACHES,
+        measured={
+            "BACKEND": "fare.core.cache_metrics.InstrumentedCache",
+            "LOCATION": "measured",
+            "OPTIONS": {"CACHE": "locmem", "PREFIX_DEPTH": 2},
+        },
+    )
+    caches["locmem"].clear()
+    return caches["measured"]
+
+
+def test_key_prefix():
+    assert key_prefix("users:stamp:12", 2) == "users:stamp"
+    assert key_prefix("plain", 2) == "plain"
+
+
+def test_reads_and_writes_are_counted_by_prefix(remote):
+    remote.set("users:stamp:1", "1")
+    remote.set_many({"users:stamp:2": "2", "users:fragment:profile:2": "x" * 1000})
+    remote.get("users:stamp:1")
+    remote.get("users:stamp:3")
+    remote.get_many(["users:stamp:2", "users:fragment:profile:2", "users:fragment:profile:3"])
+
+    stats = get_cache_stats()["measured"]
+
+    assert stats["users:stamp"]["hits"] == 2
+    assert stats["users:stamp"]["misses"] == 1
+    assert stats["users:stamp"]["hit_ratio"] == pytest.approx(2 / 3)
+    assert stats["users:fragment"]["hits"] == 1
+    assert stats["users:fragment"]["misses"] == 1
+    assert stats["users:stamp"]["writes"] == 3
+    assert stats["users:stamp"]["ops"] == 5
+    assert stats["users:stamp"]["mean_bytes"] > 1000 / 3
+    assert 0 < stats["users:stamp"]["p99_ms"]
+
+
+def down(*args, **kwargs):
+    raise ConnectionError("Redis is down")
+
+
+def test_failures_are_counted_and_answered_as_misses(remote, monkeypatch, caplog):
+    for operation in ("get", "set", "add", "get_many"):
+        monkeypatch.setattr(type(caches["locmem"]), operation, down)
+
+    remote.set("users:stamp:1", "1")
+    assert remote.add("users:stamp:1", "1") is None
+    assert remote.get("users:stamp:1", "default") == "default"
+    assert remote.get_many(["users:stamp:1"]) == {}
+
+    stats = get_cache_stats()["measured"]["users:stamp"]
+    assert stats["errors"] == 4
+    assert stats["misses"] == 2
+    assert "Cache get of users:stamp:1 failed" in caplog.text
+
+
+def test_failures_propagate_unless_ignored(remote, settings, monkeypatch):
+    settings.CACHES = dict(settings.CACHES, measured={
+        "BACKEND": "fare.core.cache_metrics.InstrumentedCache",
+        "LOCATION": "measured",
+        "OPTIONS": {"CACHE": "locmem", "IGNORE_EXCEPTIONS": False},
+    })
+    monkeypatch.setattr(type(caches["locmem"]), "get", down)
+
+    with pytest.raises(ConnectionError):
+        caches["measured"].get("key")
+
+
+def test_processes_share_their_counters_through_redis(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(CacheStats, "get_client", lambda stats: redis)
+    first = CacheStats("remote", "redis", flush_interval=0)
+    second = CacheStats("remote", "redis", flush_interval=60)
+
+    first.record("users:stamp", 0.001, hits=1)
+    second.record("users:stamp", 0.001, misses=1)
+
+    assert first.counters == {}
+    totals = second.read()["users:stamp"]
+    assert totals["ops"] == 2 and totals["hits"] == 1 and totals["misses"] == 1
+    second.reset()
+    assert second.read() == {}
+
+
+def test_forked_process_does_not_count_its_parent_twice():
+    stats = CacheStats("remote", None, flush_interval=60)
+    stats.record("users:stamp", 0.001)
+    stats.pid = -1
+
+    stats.record("users:stamp", 0.001)
+
+    assert stats.counters["users:stamp", "ops"] == 1
+
+
+@pytest.mark.django_db
+class TestMetricsView:
+
+    def test_staff_and_token_holders_only(self, client, user, settings):
+        settings.METRICS_TOKEN = "secret"
+        assert client.get(reverse("metrics")).status_code == 403
+        client.force_login(user)
+        assert client.get(reverse("metrics")).status_code == 403
+
+        client.logout()
+        response = client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret")
+        assert response.status_code == 200
+
+    def test_renders_the_prometheus_format(self, client, remote, admin_user):
+        remote.set("users:stamp:1", "1")
+        remote.get("users:stamp:1")
+        client.force_login(admin_user)
+
+        body = client.get(reverse("metrics")).content.decode()
+
+        assert 'fare_cache_hits_total{cache="measured",prefix="users:stamp"} 1' in body
+        assert 'fare_cache_operation_seconds_bucket{cache="measured",prefix="users:stamp",le="+Inf"} 2' in body
+        assert 'fare_cache_operation_seconds_count{cache="measured",prefix="users:stamp"} 2' in body
+
+
+def test_command_reports_by_prefix(remote):
+    remote.set("users:fragment:profile:1", "x" * 100)
+    remote.get("users:fragment:profile:1")
+    stdout = StringIO()
+
+    call_command("cache_stats", stdout=stdout)
+
+    assert "measured:" in stdout.getvalue()
+    assert "users:fragment" in stdout.getvalue()
+    assert "50.0%" not in stdout.getvalue() and "100.0%" in stdout.getvalue()
+
+    call_command("cache_stats", reset=True)
+    assert get_cache_stats()["measured"] == {}
@@ -0,0 +1,111 @@
+import time
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, RequestFactory
+from django.test.client import ClientHandler
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from fare.core.handlers import MiddlewareChainHandler, MiddlewareGroupsMixin
+
+pytestmark = pytest.mark.django_db
+
+
+class GroupsClientHandler(MiddlewareGroupsMixin, ClientHandler):
+    pass
+
+
+@pytest.fixture
+def client():
+    client = Client()
+    client.handler = GroupsClientHandler()
+    return client
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    cache.clear()
+
+
+@pytest.mark.parametrize("name", ["home", "about", "health"])
+def test_lightweight_routes_touch_neither_database_nor_session(client, name, monkeypatch):
+    loaded = []
+
+    def load(store):
+        loaded.append(store)
+        return {}
+
+    monkeypatch.setattr("django.contrib.sessions.backends.db.SessionStore.load", load)
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(reverse(name))
+
+    assert response.status_code == 200
+    assert len(queries) == 0
+    assert loaded == []
+    assert not hasattr(response.wsgi_request, "session")
+    assert "Set-Cookie" not in response
+
+
+def test_anonymous_pages_render_for_anonymous_users(client):
+    response = client.get(reverse("home"))
+
+    assert b"Sign In" in response.content
+    assert response.wsgi_request.user.is_anonymous
+    assert "X-Frame-Options" in response
+
+
+def test_cached_anonymous_pages_keep_the_security_headers(client):
+    client.get(reverse("home"))
+
+    response = client.get(reverse("home"))
+
+    assert response["X-Page-Cache"] == "hit"
+    assert response["X-Frame-Options"] == "DENY"
+
+
+def test_visitors_with_a_session_get_the_full_chain(client, user):
+    client.force_login(user)
+
+    response = client.get(reverse("home"))
+
+    assert response.wsgi_request.user == user
+    assert user.username.encode() in response.content
+
+
+def test_other_routes_get_the_full_chain(client, user):
+    client.force_login(user)
+
+    response = client.get(reverse("users:list"))
+
+    assert response.status_code == 200
+    assert hasattr(response.wsgi_request, "session")
+
+
+def _overhead(handler, request_factory, path, requests=300):
+    started = time.perf_counter()
+    for _ in range(requests):
+        handler.get_response(request_factory.get(path))
+    return (time.perf_counter() - started) / requests
+
+
+@pytest.mark.benchmark
+def test_lightweight_chain_costs_less_per_request(settings):
+    """
+    Microbenchmark of the middleware alone: the health view does nothing, so
+    what is measured is the chain around it
+    """
+    full = MiddlewareChainHandler(settings.MIDDLEWARE)
+    full.load_middleware()
+    light = MiddlewareChainHandler(settings.MIDDLEWARE_GROUPS[0]["MIDDLEWARE"])
+    light.load_middleware()
+    factory = RequestFactory()
+    path = reverse("health")
+    _overhead(full, factory, path, requests=10)
+
+    full_cost = _overhead(full, factory, path)
+    light_cost = _overhead(light, factory, path)
+
+    assert light_cost < full_cost / 2
@@ -0,0 +1,142 @@
+import gc
+import time
+from io import StringIO
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.views.generic import TemplateView
+
+from fare.core.pagecache import get_options, page_key
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    cache.clear()
+
+
+def test_anonymous_pages_are_served_from_the_cache(client):
+    first = client.get(reverse("home"))
+    with CaptureQueriesContext(connection) as queries:
+        second = client.get(reverse("home"))
+
+    assert first["X-Page-Cache"] == "miss"
+    assert second["X-Page-Cache"] == "hit"
+    assert second.content == first.content
+    assert second["Content-Type"] == first["Content-Type"]
+    assert len(queries) == 0
+    assert "public" in second["Cache-Control"] and "max-age=60" in second["Cache-Control"]
+    assert "Cookie" in second["Vary"] and "Accept-Language" in second["Vary"]
+
+
+def test_hits_run_neither_the_view_nor_the_templates(client, monkeypatch):
+    views = []
+    get = TemplateView.get
+
+    def counting_get(view, request, *args, **kwargs):
+        views.append(request.path)
+        return get(view, request, *args, **kwargs)
+
+    monkeypatch.setattr(TemplateView, "get", counting_get)
+    first = client.get(reverse("home"))
+    second = client.get(reverse("home"))
+
+    assert second["X-Page-Cache"] == "hit"
+    assert views == [reverse("home")]
+    assert first.templates and not second.templates
+
+
+@pytest.mark.parametrize("cookie", ["sessionid", "messages", "csrftoken"])
+def test_visitors_with_a_session_or_messages_skip_the_cache(client, cookie):
+    client.get(reverse("home"))
+    client.cookies[cookie] = "value"
+
+    response = client.get(reverse("home"))
+
+    assert "X-Page-Cache" not in response
+
+
+def test_logged_in_pages_are_private(client, user):
+    client.get(reverse("home"))
+    client.force_login(user)
+
+    response = client.get(reverse("home"))
+
+    assert "X-Page-Cache" not in response
+    assert "private" in response["Cache-Control"]
+    assert user.username.encode() in response.content
+
+
+def test_cached_pages_keep_the_security_headers(client, settings):
+    settings.SECURE_CONTENT_TYPE_NOSNIFF = True
+    first = client.get(reverse("home"))
+    second = client.get(reverse("home"))
+
+    assert second["X-Page-Cache"] == "hit"
+    assert second["X-Frame-Options"] == first["X-Frame-Options"] == "DENY"
+    assert second["X-Content-Type-Options"] == "nosniff"
+
+
+def test_only_opted_in_views_are_cached(rf):
+    assert get_options(rf.get(reverse("about"))) is not None
+    assert get_options(rf.post(reverse("about"))) is None
+    assert get_options(rf.get(reverse("users:list"))) is None
+    assert get_options(rf.get("/missing/")) is None
+
+
+def test_keys_vary_on_host_and_language(rf, settings):
+    settings.ALLOWED_HOSTS = ["*"]
+    settings.MIDDLEWARE = ["django.middleware.locale.LocaleMiddleware"] + settings.MIDDLEWARE
+    options = get_options(rf.get(reverse("home")))
+
+    english = page_key(rf.get(reverse("home"), HTTP_ACCEPT_LANGUAGE="en"), options)
+    italian = page_key(rf.get(reverse("home"), HTTP_ACCEPT_LANGUAGE="it"), options)
+    other_host = page_key(rf.get(reverse("home"), HTTP_ACCEPT_LANGUAGE="en", HTTP_HOST="other.example"), options)
+
+    assert len({english, italian, other_host}) == 3
+    assert page_key(rf.get(reverse("home"), HTTP_ACCEPT_LANGUAGE="en"), options) == english
+
+
+def test_purge_drops_the_tagged_pages(client):
+    client.get(reverse("home"))
+    stdout = StringIO()
+
+    call_command("purge_pages", stdout=stdout)
+
+    assert client.get(reverse("home"))["X-Page-Cache"] == "miss"
+    assert "pages" in stdout.getvalue()
+
+
+def _rate(path, requests=200):
+    # a new client loads the middleware from the current settings
+    client = Client()
+    # as timeit does: collections of the heap left by the other tests would dominate
+    gc.collect()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        for _ in range(requests):
+            client.get(path)
+        return requests / (time.perf_counter() - started)
+    finally:
+        gc.enable()
+
+
+@pytest.mark.benchmark
+def test_cached_home_page_serves_more_requests_per_second(settings):
+    """
+    Anonymous home page requests through the whole stack, with and without the page cache
+    """
+    with_cache = settings.MIDDLEWARE
+    settings.MIDDLEWARE = [name for name in with_cache if name != "fare.core.pagecache.PageCacheMiddleware"]
+    uncached = _rate(reverse("home"))
+    settings.MIDDLEWARE = with_cache
+    cached = _rate(reverse("home"))
+
+    assert cached > 4 * uncached
@@ -0,0 +1,177 @@
+import threading
+import time
+
+import pytest
+
+from fare.core import pool as pool_module
+from fare.core.pool import ConnectionPool, PoolExhausted
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+        self.alive = True
+        self.dirty = False
+        self.users = 0
+
+
+def make_pool(**options):
+    def check(connection):
+        return connection.alive
+
+    def reset(connection):
+        connection.dirty = False
+        return connection.alive
+
+    def close(connection):
+        connection.closed = True
+
+    return ConnectionPool(check, reset, close, **options)
+
+
+class TestConnectionPool:
+
+    def test_connections_are_reused(self):
+        pool = make_pool(max_size=2)
+
+        first = pool.acquire(FakeConnection)
+        pool.release(first)
+
+        assert pool.acquire(FakeConnection) is first
+        assert pool.stats()["created"] == 1
+
+    def test_checkout_waits_then_fails_when_full(self):
+        pool = make_pool(max_size=1, timeout=0.05)
+        pool.acquire(FakeConnection)
+
+        with pytest.raises(PoolExhausted):
+            pool.acquire(FakeConnection)
+
+        stats = pool.stats()
+        assert (stats["in_use"], stats["timeouts"]) == (1, 1)
+
+    def test_waiting_checkout_gets_the_released_connection(self):
+        pool = make_pool(max_size=1, timeout=5)
+        connection = pool.acquire(FakeConnection)
+        threading.Timer(0.05, pool.release, [connection]).start()
+
+        assert pool.acquire(FakeConnection) is connection
+        stats = pool.stats()
+        assert stats["waits"] == 1
+        assert 0.04 < stats["max_wait"] < 5
+
+    def test_dead_connections_are_replaced_on_checkout(self):
+        pool = make_pool(check_interval=0)
+        connection = pool.acquire(FakeConnection)
+        pool.release(connection)
+        connection.alive = False
+
+        replacement = pool.acquire(FakeConnection)
+
+        assert replacement is not connection and connection.closed
+        assert pool.stats()["failed_checks"] == 1
+        assert pool.stats()["size"] == 1
+
+    def test_broken_and_old_connections_are_closed(self):
+        pool = make_pool(max_lifetime=0)
+        broken = pool.acquire(FakeConnection)
+        broken.alive = False
+        pool.release(broken)
+        old = pool.acquire(FakeConnection)
+        pool.release(old)
+
+        assert pool.acquire(FakeConnection) is not old
+        assert broken.closed and old.closed
+        assert pool.stats()["closed"] == 2
+
+    def test_failed_creation_frees_its_slot(self):
+        pool = make_pool(max_size=1)
+
+        def fail():
+            raise ConnectionError()
+
+        with pytest.raises(ConnectionError):
+            pool.acquire(fail)
+        assert pool.acquire(FakeConnection)
+
+    def test_forked_process_forgets_the_parent_connections(self, monkeypatch):
+        monkeypatch.setattr(pool_module, "_inherited", [])
+        pool = make_pool(max_size=2)
+        inherited = pool.acquire(FakeConnection)
+        idle = pool.acquire(FakeConnection)
+        pool.release(idle)
+
+        monkeypatch.setattr(pool_module.os, "getpid", lambda: -1)
+        pool.release(inherited)
+
+        assert pool.acquire(FakeConnection) not in (inherited, idle)
+        assert not inherited.closed and not idle.closed
+        # collecting them would close the sockets shared with the parent
+        assert {id(connection) for connection in pool_module._inherited} == {id(inherited), id(idle)}
+
+    def test_concurrent_clients(self):
+        # 200 clients, each running 5 short "requests", share 10 connections
+        pool = make_pool(max_size=10, timeout=10)
+        lock = threading.Lock()
+        peak = {"in_use": 0, "max": 0}
+        errors = []
+
+        def client():
+            for _ in range(5):
+                connection = pool.acquire(FakeConnection)
+                with lock:
+                    connection.users += 1
+                    peak["in_use"] += 1
+                    peak["max"] = max(peak["max"], peak["in_use"])
+                    if connection.users > 1:
+                        errors.append("connection shared by two clients")
+                time.sleep(0.001)
+                with lock:
+                    connection.users -= 1
+                    peak["in_use"] -= 1
+                pool.release(connection)
+
+        threads = [threading.Thread(target=client) for _ in range(200)]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        stats = pool.stats()
+        assert errors == []
+        assert peak["max"] <= 10
+        assert stats["created"] <= 10 and stats["checkouts"] == 1000
+        assert (stats["in_use"], stats["timeouts"]) == (0, 0)
+        assert stats["waits"] > 0
+        assert stats["max_wait"] < elapsed
+
+
+class FakePsycopgConnection:
+
+    def __init__(self, status):
+        self.closed = False
+        self.status = status
+        self.autocommit = False
+        self.rolled_back = False
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+@pytest.mark.parametrize("in_transaction", [False, True])
+def test_released_connections_are_back_in_autocommit(in_transaction):
+    extensions = pytest.importorskip("psycopg2.extensions")
+    from fare.core.db.postgresql_pool.base import reset_connection
+
+    status = extensions.TRANSACTION_STATUS_INTRANS if in_transaction else extensions.TRANSACTION_STATUS_IDLE
+    connection = FakePsycopgConnection(status)
+
+    assert reset_connection(connection)
+    assert connection.autocommit
+    assert connection.rolled_back == in_transaction
@@ -0,0 +1,140 @@
+import logging
+from io import StringIO
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.signals import request_finished
+from django.http import HttpResponse
+from django.urls import reverse
+
+from fare.core.middleware import QueryInstrumentationMiddleware
+from fare.core.models import SlowQuery
+from fare.core.queries import QueryRecorder, fingerprint
+from fare.core.tasks import record_slow_query
+from fare.users.tests.factories import UserFactory
+
+User = get_user_model()
+
+
+def test_fingerprint_ignores_values_and_list_lengths():
+    first = fingerprint("SELECT * FROM users_user WHERE id IN (1, 2, 3) AND username = 'a''b'")
+    second = fingerprint("SELECT  *  FROM users_user WHERE id IN (%s) AND username = %s")
+
+    assert first == second == "SELECT * FROM users_user WHERE id IN (...) AND username = ?"
+
+
+@pytest.mark.django_db
+def test_recorder_counts_and_groups_statements():
+    users = UserFactory.create_batch(3)
+
+    with QueryRecorder(keep_statements=True).record() as recorder:
+        for user in users:
+            User.objects.get(pk=user.pk)
+        User.objects.count()
+
+    assert recorder.count == len(recorder.statements) == 4
+    assert recorder.duration > 0
+    [(sql, count)] = recorder.repeated(3)
+    assert count == 3 and "WHERE" in sql
+
+
+@pytest.mark.django_db
+def test_recorder_samples_slow_statements():
+    with QueryRecorder(slow_threshold_ms=0).record() as recorder:
+        User.objects.filter(username="someone").exists()
+    with QueryRecorder(slow_threshold_ms=0, sample_rate=0).record() as unsampled:
+        User.objects.filter(username="someone").exists()
+
+    [(alias, sql, params, duration)] = recorder.slow
+    assert alias == "default" and params == ["someone"]
+    assert unsampled.slow == []
+
+
+@pytest.mark.django_db
+class TestQueryInstrumentationMiddleware:
+
+    def test_logs_queries_by_view(self, client, caplog):
+        UserFactory.create_batch(2)
+        with caplog.at_level(logging.INFO, logger="fare.core.queries"):
+            client.get(reverse("users:available"), {"username": "newcomer"})
+
+        [record] = [record for record in caplog.records if record.name == "fare.core.queries"]
+        assert record.view == "users:available"
+        assert record.queries >= 1
+        assert record.sql_time >= 0
+
+    def test_warns_about_repeated_statements(self, client, caplog, settings, user):
+        settings.QUERY_REPEAT_THRESHOLD = 1
+        client.force_login(user)
+        with caplog.at_level(logging.WARNING, logger="fare.core.queries"):
+            client.get(reverse("users:list"))
+
+        assert any("likely an N+1" in record.getMessage() for record in caplog.records)
+
+    def test_slow_statements_are_stored_with_their_plan(self, client, settings, user):
+        settings.SLOW_QUERY_THRESHOLD_MS = 0
+        client.force_login(user)
+        client.get(reverse("users:list"))
+
+        slow_query = SlowQuery.objects.get(fingerprint__contains="users_directoryentry")
+        assert slow_query.view == "users:list"
+        assert slow_query.calls == 1
+        assert slow_query.plan
+
+    def test_slow_statements_are_enqueued_once_the_request_finished(self, rf, settings, monkeypatch, caplog):
+        settings.SLOW_QUERY_THRESHOLD_MS = 0
+        enqueued = []
+
+        def delay(*args):
+            enqueued.append(args)
+            raise ConnectionError("broker is down")
+
+        monkeypatch.setattr(record_slow_query, "delay", delay)
+        middleware = QueryInstrumentationMiddleware(lambda request: HttpResponse(User.objects.count()))
+
+        response = middleware(rf.get("/"))
+        assert response.status_code == 200
+        assert enqueued == []
+
+        request_finished.send(sender=None)
+        assert len(enqueued) == 1
+        assert "Cannot enqueue the slow query" in caplog.text
+
+
+@pytest.mark.django_db
+class TestRecordSlowQuery:
+
+    def test_samples_accumulate_per_fingerprint(self):
+        for duration in (300, 100, 200):
+            record_slow_query("default", "SELECT 1 FROM users_user WHERE id = %s", [duration], duration, "view")
+
+        slow_query = SlowQuery.objects.get()
+        assert slow_query.calls == 3
+        assert slow_query.total_ms == 600
+        assert slow_query.max_ms == 300
+        assert slow_query.percentile(50) == 200
+        assert slow_query.percentile(99) == 300
+
+    def test_writes_are_not_explained(self):
+        record_slow_query("default", "UPDATE users_user SET name = %s", ["x"], 500, "view")
+
+        assert SlowQuery.objects.get().plan == ""
+
+    def test_failing_explain_is_recorded(self):
+        record_slow_query("default", "SELECT * FROM missing_table", [], 500, "view")
+
+        assert SlowQuery.objects.get().plan.startswith("EXPLAIN failed")
+
+
+@pytest.mark.django_db
+def test_command_reports_the_slowest():
+    record_slow_query("default", "SELECT 1 FROM users_user", [], 50, "users:list")
+    record_slow_query("default", "SELECT 2 FROM users_user WHERE id > %s", [1], 900, "users:detail")
+    stdout = StringIO()
+
+    call_command("slow_queries", order="p95", limit=1, plans=True, stdout=stdout)
+
+    output = stdout.getvalue()
+    assert "users:detail" in output and "users:list" not in output
+    assert "p95 900.0ms" in output
@@ -0,0 +1,139 @@
+import time
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.db import DatabaseError, OperationalError, connections, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from fare.core import replicas
+from fare.core.middleware import ReplicaMiddleware
+from fare.core.replicas import ReplicaRouter, primary_reads, replica_reads, require_stamps
+from fare.users.tests.factories import UserFactory
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def replica(settings, monkeypatch):
+    settings.DATABASE_REPLICAS = ["replica"]
+    monkeypatch.setattr(replicas, "_health", {})
+    # the test replica mirrors the primary: it is current up to its check
+    monkeypatch.setattr(replicas, "CLOCK_MARGIN", 0.0)
+
+
+@pytest.fixture
+def lagging_replica(monkeypatch):
+    monkeypatch.setattr(replicas, "get_lag", lambda alias: 2.0)
+
+
+class TestReplicaRouter:
+
+    def test_reads_go_to_replicas_only_when_allowed(self):
+        router = ReplicaRouter()
+
+        assert router.db_for_read(User) is None
+        with replica_reads():
+            assert router.db_for_read(User) == "replica"
+            assert router.db_for_read(Session) is None
+            assert router.db_for_write(User) == "default"
+            with primary_reads():
+                assert router.db_for_read(User) is None
+            assert router.db_for_read(User) == "replica"
+
+    def test_stamps_newer_than_the_replica_read_from_the_primary(self, lagging_replica):
+        router = ReplicaRouter()
+
+        with replica_reads():
+            require_stamps([repr(time.time() - 10)])
+            assert router.db_for_read(User) == "replica"
+            require_stamps([repr(time.time())])
+            assert router.db_for_read(User) is None
+
+        with replica_reads():
+            assert router.db_for_read(User) == "replica"
+
+    @pytest.mark.django_db
+    def test_transactions_read_from_the_primary(self):
+        with replica_reads(), transaction.atomic():
+            assert ReplicaRouter().db_for_read(User) is None
+
+    @pytest.mark.parametrize("lag", [DatabaseError("replica is down"), 60.0])
+    def test_failing_or_lagging_replica_falls_back_to_primary(self, monkeypatch, lag):
+        def get_lag(alias):
+            if isinstance(lag, Exception):
+                raise lag
+            return lag
+
+        monkeypatch.setattr(replicas, "get_lag", get_lag)
+
+        with replica_reads():
+            assert ReplicaRouter().db_for_read(User) is None
+
+
+@pytest.mark.django_db(transaction=True)
+class TestReplicaMiddleware:
+
+    def replica_queries(self, client, method, url, **data):
+        with CaptureQueriesContext(connections["replica"]) as queries:
+            response = getattr(client, method)(url, data)
+        return response, len(queries)
+
+    def test_safe_requests_read_from_the_replica(self, client):
+        user = UserFactory()
+        client.force_login(user)
+
+        response, queries = self.replica_queries(client, "get", reverse("users:search"), q=user.username)
+
+        assert response.status_code == 200
+        assert queries > 0
+
+    @pytest.mark.parametrize("name, kwargs", [("users:detail", {"username": "ada"}), ("users:list", {})])
+    def test_stamp_cached_reads_wait_for_the_replica(self, client, name, kwargs, monkeypatch):
+        client.force_login(UserFactory(username="ada"))
+        url = reverse(name, kwargs=kwargs)
+
+        monkeypatch.setattr(replicas, "get_lag", lambda alias: 2.0)
+        response, queries = self.replica_queries(client, "get", url)
+        assert response.status_code == 200
+        assert queries == 0
+
+        # the replica has replayed the changes since
+        monkeypatch.undo()
+        monkeypatch.setattr(replicas, "_health", {})
+        monkeypatch.setattr(replicas, "CLOCK_MARGIN", 0.0)
+        response, queries = self.replica_queries(client, "get", url)
+        assert response.status_code == 200
+        assert queries > 0
+
+    @pytest.mark.parametrize("cached_user", [False, True])
+    def test_failing_replica_is_retried_on_the_primary(self, client, monkeypatch, cached_user):
+        user = UserFactory()
+        client.force_login(user)
+        if cached_user:
+            # the view, rather than the authentication, is the first to read from the replica
+            client.get(reverse("users:redirect"))
+            monkeypatch.setattr(replicas, "_health", {})
+
+        def down(execute, sql, params, many, context):
+            raise OperationalError("server closed the connection unexpectedly")
+
+        with connections["replica"].execute_wrapper(down):
+            response, _ = self.replica_queries(client, "get", reverse("users:search"), q=user.username)
+
+        assert response.status_code == 200
+        assert user.username in response.content.decode()
+        assert replicas._health["replica"][1] is None
+
+    def test_writes_stick_to_the_primary(self, client, settings):
+        user = UserFactory()
+        client.force_login(user)
+
+        response, queries = self.replica_queries(client, "post", reverse("users:update"), name="Ada")
+        assert response.status_code == 302
+        assert queries == 0
+        assert response.cookies[ReplicaMiddleware.cookie_name]["max-age"] == settings.DATABASE_REPLICA_STICKY_SECONDS
+
+        _, queries = self.replica_queries(client, "get", reverse("users:detail", kwargs={"username": user.username}))
+        assert queries == 0
@@ -0,0 +1,70 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.http import JsonResponse
+from django.urls import include, path, reverse
+
+from fare.core.transaction import ReadOnlyViolation, is_write, read_only
+
+pytestmark = pytest.mark.django_db
+
+User = get_user_model()
+
+
+def transaction_state(request):
+    if request.GET.get("write"):
+        User.objects.create(username="written")
+    return JsonResponse({"atomic": connection.in_atomic_block, "users": User.objects.count()})
+
+
+urlpatterns = [
+    path("read/", read_only(transaction_state), name="read"),
+    path("snapshot/", read_only(transaction_state, snapshot=True), name="snapshot"),
+    path("write/", transaction_state, name="write"),
+    # the error pages link to the site pages
+    path("", include("config.urls")),
+]
+
+
+@pytest.fixture(autouse=True)
+def urls(settings):
+    settings.ROOT_URLCONF = __name__
+
+
+@pytest.mark.parametrize("sql, write", [
+    ('SELECT "users_user"."id" FROM "users_user"', False),
+    ('  insert into "users_user" ("username") values (%s)', True),
+    ('UPDATE "users_user" SET "name" = %s', True),
+    ('SELECT "users_user"."id" FROM "users_user" FOR UPDATE', True),
+    ("", False),
+])
+def test_is_write(sql, write):
+    assert is_write(sql) is write
+
+
+class TestReadOnly:
+
+    def test_read_only_view_runs_in_autocommit(self, client):
+        # the test transaction wraps everything, only the request level atomic block can be told apart
+        outer = connection.in_atomic_block
+
+        assert client.get(reverse("read")).json() == {"atomic": outer, "users": 0}
+
+    def test_read_only_view_cannot_write(self, client):
+        # a savepoint stands for the autocommit the view would run in outside the tests
+        with pytest.raises(ReadOnlyViolation), transaction.atomic():
+            client.get(reverse("read"), {"write": 1})
+        assert not User.objects.exists()
+
+    def test_snapshot_view_runs_in_a_transaction(self, client):
+        assert client.get(reverse("snapshot")).json()["atomic"] is True
+        with pytest.raises(ReadOnlyViolation):
+            client.get(reverse("snapshot"), {"write": 1})
+
+    def test_other_views_keep_atomic_requests(self, client):
+        assert client.get(reverse("write"), {"write": 1}).json() == {"atomic": True, "users": 1}
+
+    def test_guard_ends_with_the_request(self, client):
+        client.get(reverse("read"))
+
+        User.objects.create(username="after")
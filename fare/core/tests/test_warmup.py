@@ -0,0 +1,101 @@
+import time
+from io import StringIO
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.template import engines
+from django.template.loaders.filesystem import Loader
+from django.test import Client
+from django.urls import reverse
+
+from fare.core.warmup import iter_template_names, warm_templates, warm_up
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def engine():
+    return engines["django"].engine
+
+
+@pytest.fixture(autouse=True)
+def cold_loader(engine):
+    # each test starts with nothing compiled, and leaves nothing half compiled
+    engine.template_loaders[0].reset()
+    cache.clear()
+    yield
+    engine.template_loaders[0].reset()
+
+
+@pytest.fixture
+def disk_reads(monkeypatch):
+    reads = []
+    get_contents = Loader.get_contents
+
+    def counting_get_contents(loader, origin):
+        reads.append(origin.name)
+        return get_contents(loader, origin)
+
+    monkeypatch.setattr(Loader, "get_contents", counting_get_contents)
+    return reads
+
+
+def test_names_cover_project_and_app_templates(engine):
+    names = set(iter_template_names(engine))
+
+    assert {"base.html", "pages/home.html", "users/user_detail.html", "account/login.html"} <= names
+
+
+def test_every_template_compiles(engine):
+    compiled, failed = warm_templates()
+
+    assert failed == []
+    assert compiled == len(set(iter_template_names(engine)))
+
+
+def test_first_request_after_warm_up_reads_no_template(disk_reads, user):
+    warm_up()
+    disk_reads.clear()
+    client = Client()
+
+    assert client.get(reverse("home")).status_code == 200
+    client.force_login(user)
+    assert client.get(reverse("users:detail", kwargs={"username": user.username})).status_code == 200
+
+    assert disk_reads == []
+
+
+def test_command_reports_the_templates(engine):
+    stdout = StringIO()
+
+    call_command("warm_templates", "--strict", stdout=stdout)
+
+    assert f"{len(set(iter_template_names(engine)))} templates compiled" in stdout.getvalue()
+
+
+def _first_request(path):
+    cache.clear()
+    started = time.perf_counter()
+    Client().get(path)
+    return time.perf_counter() - started
+
+
+@pytest.mark.benchmark
+def test_warm_first_request_is_faster(engine, user):
+    """
+    First request of a fresh process, with and without the warm-up: the cold
+    one reads and compiles the templates it renders
+    """
+    path = reverse("account_login")
+    Client().get(path)
+
+    cold, warm = [], []
+    for _ in range(5):
+        engine.template_loaders[0].reset()
+        cold.append(_first_request(path))
+        engine.template_loaders[0].reset()
+        warm_templates()
+        warm.append(_first_request(path))
+
+    assert min(warm) < min(cold)
@@ -0,0 +1,72 @@
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.db import DatabaseError, connections, transaction
+
+# statements a read-only view must never send, SELECT ... FOR UPDATE included
+WRITE_STATEMENTS = {"INSERT", "UPDATE", "DELETE", "MERGE", "CREATE", "ALTER", "DROP", "TRUNCATE", "GRANT", "REVOKE"}
+
+
+class ReadOnlyViolation(DatabaseError):
+    pass
+
+
+def is_write(sql):
+    words = sql.split(None, 1)
+    return bool(words) and (words[0].upper() in WRITE_STATEMENTS or " FOR UPDATE" in sql.upper())
+
+
+def block_writes(execute, sql, params, many, context):
+    if is_write(sql):
+        raise ReadOnlyViolation(f"Write attempted in a read-only view: {sql[:200]}")
+    return execute(sql, params, many, context)
+
+
+@contextmanager
+def forbid_writes():
+    """
+    Raise ReadOnlyViolation instead of sending a write statement, on every database
+    """
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(block_writes))
+        yield
+
+
+@contextmanager
+def read_only_transaction(using=None):
+    """
+    A transaction the database itself refuses to write in, where supported
+
+    Every query sees the same snapshot, at the cost of the BEGIN/COMMIT a
+    plain read-only view avoids.
+    """
+    with transaction.atomic(using=using):
+        connection = transaction.get_connection(using)
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION READ ONLY")
+        yield
+
+
+def read_only(view=None, snapshot=False):
+    """
+    Declare a view read-only: it runs in autocommit instead of the ATOMIC_REQUESTS
+    transaction, and any write it (or its template) attempts raises ReadOnlyViolation
+
+    Use as ``read_only(view)``, or ``read_only(view, snapshot=True)`` when the view
+    needs all its queries to see the same data, see read_only_transaction.
+    The guard is applied by fare.core.middleware.ReadOnlyViewMiddleware, so
+    it also covers the lazy rendering of template responses.
+    """
+    if view is None:
+        return lambda view: read_only(view, snapshot=snapshot)
+
+    # a new function, the same view may be routed elsewhere without the guard
+    @wraps(view)
+    def read_only_view(*args, **kwargs):
+        return view(*args, **kwargs)
+
+    setattr(read_only_view, "_non_atomic_requests", set(getattr(view, "_non_atomic_requests", ())))
+    setattr(read_only_view, "read_only", "snapshot" if snapshot else "autocommit")
+    return transaction.non_atomic_requests(read_only_view)
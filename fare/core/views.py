@@ -0,0 +1,71 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from fare.core.cache_metrics import BUCKETS, get_cache_stats
+from fare.core.transaction import read_only
+
+COUNTERS = (
+    ("hits", "fare_cache_hits_total", "Cache reads finding a value"),
+    ("misses", "fare_cache_misses_total", "Cache reads finding nothing, failed reads included"),
+    ("writes", "fare_cache_writes_total", "Values written to the cache"),
+    ("bytes", "fare_cache_written_bytes_total", "Pickled size of the values written to the cache"),
+    ("deletes", "fare_cache_deletes_total", "Keys deleted from the cache"),
+    ("errors", "fare_cache_errors_total", "Cache operations failing, swallowed as misses"),
+)
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+
+def render_metrics(report):
+    """
+    Render the cache statistics in the Prometheus text format
+    """
+    lines = []
+    for metric, name, help_text in COUNTERS:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for alias, prefixes in report.items():
+            for prefix, metrics in prefixes.items():
+                lines.append(f"{name}{_labels(cache=alias, prefix=prefix)} {metrics.get(metric, 0):g}")
+
+    name = "fare_cache_operation_seconds"
+    lines += [f"# HELP {name} Latency of the cache operations", f"# TYPE {name} histogram"]
+    for alias, prefixes in report.items():
+        for prefix, metrics in prefixes.items():
+            seen = 0
+            for bound in BUCKETS:
+                seen += metrics.get(f"le:{bound}", 0)
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{name}_bucket{_labels(cache=alias, prefix=prefix, le=le)} {seen:g}")
+            lines.append(f"{name}_sum{_labels(cache=alias, prefix=prefix)} {metrics.get('seconds', 0):g}")
+            lines.append(f"{name}_count{_labels(cache=alias, prefix=prefix)} {metrics.get('ops', 0):g}")
+    return "\n".join(lines) + "\n"
+
+
+def has_metrics_access(request):
+    """
+    Staff users, and scrapers sending "Authorization: Bearer <METRICS_TOKEN>"
+    """
+    token = getattr(settings, "METRICS_TOKEN", "")
+    header = request.META.get("HTTP_AUTHORIZATION", "")
+    if token and hmac.compare_digest(header, f"Bearer {token}"):
+        return True
+    return request.user.is_authenticated and request.user.is_staff
+
+
+@read_only
+def health_view(request):
+    """
+    Liveness check of the load balancer, served by a middleware group without sessions nor database
+    """
+    return HttpResponse("ok", content_type="text/plain")
+
+
+@read_only
+def metrics_view(request):
+    if not has_metrics_access(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(get_cache_stats()), content_type="text/plain; version=0.0.4")
@@ -0,0 +1,90 @@
+"""
+Boot-time warm-up: compile every template before the process serves a request
+
+With the cached template loader, a template is read and compiled by each
+process the first time it is rendered, which makes the first requests after a
+deploy or a worker recycle slow. warm_up compiles all the templates found by
+the loaders of the Django engines, project and apps alike, and fills the URL
+resolver. It runs from fare.core.handlers.get_wsgi_application when
+TEMPLATE_WARMUP is set; with gunicorn --preload that is once in the master,
+and the workers share the compiled templates copy-on-write.
+"""
+import logging
+import os
+import time
+from typing import Set
+
+from django.db import connections
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_EXTENSIONS = (".html", ".txt", ".xml")
+
+
+def _loader_dirs(loader):
+    # the cached loader wraps the others and has no directories of its own
+    for inner in getattr(loader, "loaders", ()):
+        yield from _loader_dirs(inner)
+    if hasattr(loader, "get_dirs"):
+        yield from loader.get_dirs()
+
+
+def iter_template_names(engine):
+    """
+    Yield the name of every template the engine can load, once
+    """
+    seen: Set[str] = set()
+    for loader in engine.template_loaders:
+        for directory in _loader_dirs(loader):
+            directory = str(directory)
+            for root, dirs, files in os.walk(directory):
+                dirs[:] = [name for name in dirs if not name.startswith(".")]
+                for file_name in files:
+                    if not file_name.endswith(TEMPLATE_EXTENSIONS):
+                        continue
+                    name = os.path.relpath(os.path.join(root, file_name), directory).replace(os.sep, "/")
+                    if name not in seen:
+                        seen.add(name)
+                        yield name
+
+
+def warm_templates():
+    """
+    Compile the templates of every Django engine into its cached loader
+
+    :return: templates compiled, and the names of those that failed to compile
+    :rtype: tuple
+    """
+    compiled, failed = 0, []
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        for name in iter_template_names(backend.engine):
+            try:
+                backend.engine.get_template(name)
+            except (TemplateSyntaxError, TemplateDoesNotExist):
+                # e.g. a template of an app using a tag library of a package that is not installed
+                logger.debug("Cannot compile the template %s", name, exc_info=True)
+                failed.append(name)
+            else:
+                compiled += 1
+    return compiled, failed
+
+
+def warm_up():
+    """
+    Compile the templates and populate the URL resolver, logging how long it took
+    """
+    started = time.perf_counter()
+    compiled, failed = warm_templates()
+    get_resolver()._populate()
+    # nothing above should connect, but a connection must not be inherited by forked workers
+    connections.close_all()
+    logger.info(
+        "Warmed up in %.0fms: %d templates compiled, %d failed",
+        (time.perf_counter() - started) * 1000, compiled, len(failed),
+    )
+    return compiled, failed
@@ -0,0 +1,33 @@
+import json
+
+from django.contrib import admin
+from django.db import transaction
+from django.utils.translation import ugettext_lazy as _
+
+from fare.taskapp.models import DeadLetterEmail
+from fare.taskapp.tasks import send_email
+
+
+@admin.register(DeadLetterEmail)
+class DeadLetterEmailAdmin(admin.ModelAdmin):
+
+    list_display = ["subject", "recipients", "created", "error"]
+    readonly_fields = ["subject", "recipients", "created", "error", "payload"]
+    search_fields = ["recipients"]
+    actions = ["requeue"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def requeue(self, request, queryset):
+        payloads = [json.loads(payload) for payload in queryset.values_list("payload", flat=True)]
+        queryset.delete()
+
+        def enqueue():
+            for payload in payloads:
+                send_email.delay(payload)
+
+        transaction.on_commit(enqueue)
+        self.message_user(request, _("%(count)d emails requeued.") % {"count": len(payloads)})
+
+    setattr(requeue, "short_description", _("Send again"))
@@ -0,0 +1,24 @@
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import transaction
+
+from fare.taskapp.tasks import message_to_dict, send_email
+
+
+class CeleryEmailBackend(BaseEmailBackend):
+    """
+    Queue messages to Celery instead of sending them inside the request
+
+    The tasks are enqueued once the current transaction commits, so a rolled
+    back signup sends nothing and the worker always finds the committed rows.
+    The messages are then sent by CELERY_EMAIL_BACKEND.
+    """
+
+    def send_messages(self, email_messages):
+        payloads = [message_to_dict(message) for message in email_messages if message.recipients()]
+
+        def enqueue():
+            for payload in payloads:
+                send_email.delay(payload)
+
+        transaction.on_commit(enqueue)
+        return len(payloads)
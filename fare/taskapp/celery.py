@@ -1,9 +1,12 @@
 
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 from django.apps import apps, AppConfig
 from django.conf import settings
 
+from fare.core.pool import reset_pools
+
 
 if not settings.configured:
     # set the default Django settings module for the 'celery' program.
@@ -27,6 +30,12 @@ class CeleryAppConfig(AppConfig):
         app.autodiscover_tasks(lambda: installed_apps, force=True)
 
 
+@worker_process_init.connect
+def reset_connection_pools(**kwargs):
+    # the pooled connections were opened by the parent, which keeps using them
+    reset_pools()
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')  # pragma: no cover
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="DeadLetterEmail",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True, verbose_name="Created")),
+                ("subject", models.CharField(max_length=255, verbose_name="Subject")),
+                ("recipients", models.TextField(verbose_name="Recipients")),
+                ("payload", models.TextField(verbose_name="Payload")),
+                ("error", models.TextField(verbose_name="Error")),
+            ],
+            options={"ordering": ["-created"], "verbose_name": "dead letter email"},
+        )
+    ]
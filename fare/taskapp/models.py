@@ -0,0 +1,25 @@
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+
+class DeadLetterEmail(models.Model):
+    """
+    An email the Celery backend gave up sending after its last retry, kept
+    so it can be inspected and requeued from the admin
+
+    :attr payload: the serialized message, as passed to the send task
+    :type payload: string
+    """
+
+    created = models.DateTimeField(_("Created"), auto_now_add=True)
+    subject = models.CharField(_("Subject"), max_length=255)
+    recipients = models.TextField(_("Recipients"))
+    payload = models.TextField(_("Payload"))
+    error = models.TextField(_("Error"))
+
+    class Meta:
+        ordering = ["-created"]
+        verbose_name = _("dead letter email")
+
+    def __str__(self):
+        return self.subject
@@ -0,0 +1,88 @@
+import base64
+import json
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+
+from fare.taskapp.celery import app
+from fare.taskapp.models import DeadLetterEmail
+
+logger = logging.getLogger(__name__)
+
+
+def message_to_dict(message):
+    """
+    Serialize an EmailMessage to JSON compatible data for the send task
+
+    Attachments must be (filename, content, mimetype) tuples, MIMEBase
+    instances are not supported.
+    """
+    attachments = []
+    for filename, content, mimetype in message.attachments:
+        if isinstance(content, str):
+            content = content.encode()
+        attachments.append([filename, base64.b64encode(content).decode(), mimetype])
+
+    return {
+        "subject": message.subject,
+        "body": message.body,
+        "from_email": message.from_email,
+        "to": message.to,
+        "cc": message.cc,
+        "bcc": message.bcc,
+        "reply_to": message.reply_to,
+        "headers": message.extra_headers,
+        "content_subtype": message.content_subtype,
+        "alternatives": [list(alternative) for alternative in getattr(message, "alternatives", [])],
+        "attachments": attachments,
+    }
+
+
+def message_from_dict(data):
+    message = EmailMultiAlternatives(
+        subject=data["subject"],
+        body=data["body"],
+        from_email=data["from_email"],
+        to=data["to"],
+        cc=data["cc"],
+        bcc=data["bcc"],
+        reply_to=data["reply_to"],
+        headers=data["headers"],
+        alternatives=[tuple(alternative) for alternative in data["alternatives"]],
+    )
+    message.content_subtype = data["content_subtype"]
+    for filename, content, mimetype in data["attachments"]:
+        message.attach(filename, base64.b64decode(content), mimetype)
+    return message
+
+
+def retry_countdown(retries):
+    # 30s, 1m, 2m, 4m... capped at 30 minutes
+    return min(30 * 2 ** retries, 30 * 60)
+
+
+@app.task(bind=True, acks_late=True, ignore_result=True, max_retries=None)
+def send_email(self, data):
+    """
+    Send a message through CELERY_EMAIL_BACKEND, retrying with a growing delay
+    and dead-lettering it after CELERY_EMAIL_MAX_RETRIES failures
+    """
+    message = message_from_dict(data)
+    try:
+        get_connection(settings.CELERY_EMAIL_BACKEND).send_messages([message])
+    except Exception as exc:
+        retries = self.request.retries
+        if retries < settings.CELERY_EMAIL_MAX_RETRIES:
+            if self.request.is_eager:
+                # no worker to schedule the retry (and eager retries raise): try again at once
+                self.apply(args=[data], retries=retries + 1)
+                return
+            raise self.retry(exc=exc, countdown=retry_countdown(retries))
+        logger.exception("Giving up sending %r to %s", message.subject, message.recipients())
+        DeadLetterEmail.objects.create(
+            subject=message.subject[:255],
+            recipients=", ".join(message.recipients()),
+            payload=json.dumps(data),
+            error=repr(exc),
+        )
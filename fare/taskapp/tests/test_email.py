@@ -0,0 +1,100 @@
+import json
+
+import pytest
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import transaction
+from django.urls import reverse
+
+from fare.taskapp.models import DeadLetterEmail
+from fare.taskapp.tasks import message_from_dict, message_to_dict
+
+# the messages are queued on commit, which needs real transactions
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+class FlakyBackend(EmailBackend):
+    failures = 0
+
+    def send_messages(self, messages):
+        if FlakyBackend.failures:
+            FlakyBackend.failures -= 1
+            raise ConnectionError("Mailgun is down")
+        return super().send_messages(messages)
+
+
+@pytest.fixture(autouse=True)
+def celery_email(settings):
+    settings.EMAIL_BACKEND = "fare.taskapp.backends.CeleryEmailBackend"
+    settings.CELERY_EMAIL_BACKEND = "fare.taskapp.tests.test_email.FlakyBackend"
+    settings.CELERY_EMAIL_MAX_RETRIES = 2
+    FlakyBackend.failures = 0
+
+
+class TestCeleryEmailBackend:
+
+    def test_sends_after_commit_only(self):
+        with transaction.atomic():
+            mail.send_mail("Hello", "Text", "noreply@example.com", ["ada@example.com"], html_message="<p>Html</p>")
+            assert mail.outbox == []
+
+        assert len(mail.outbox) == 1
+        assert mail.outbox[0].alternatives == [("<p>Html</p>", "text/html")]
+
+    def test_rolled_back_transaction_sends_nothing(self):
+        with pytest.raises(RuntimeError), transaction.atomic():
+            mail.send_mail("Hello", "Text", "noreply@example.com", ["ada@example.com"])
+            raise RuntimeError()
+
+        assert mail.outbox == []
+
+    def test_failures_are_retried(self):
+        FlakyBackend.failures = 2
+
+        mail.send_mail("Hello", "Text", "noreply@example.com", ["ada@example.com"])
+
+        assert len(mail.outbox) == 1
+        assert not DeadLetterEmail.objects.exists()
+
+    def test_dead_letters_can_be_requeued(self, admin_client):
+        FlakyBackend.failures = 3
+        mail.send_mail("Hello", "Text", "noreply@example.com", ["ada@example.com"])
+
+        dead_letter = DeadLetterEmail.objects.get()
+        assert mail.outbox == []
+        assert dead_letter.recipients == "ada@example.com"
+        assert "Mailgun is down" in dead_letter.error
+
+        admin_client.post(
+            reverse("admin:taskapp_deadletteremail_changelist"),
+            {"action": "requeue", "_selected_action": [dead_letter.pk]},
+        )
+        assert len(mail.outbox) == 1
+        assert not DeadLetterEmail.objects.exists()
+
+    def test_signup_email_is_queued(self, client):
+        response = client.post(reverse("account_signup"), {
+            "username": "ada",
+            "email": "ada@example.com",
+            "password1": "a-long enough password",
+            "password2": "a-long enough password",
+        })
+
+        assert response.status_code == 302
+        assert [message.to for message in mail.outbox] == [["ada@example.com"]]
+
+
+def test_messages_survive_serialization():
+    message = mail.EmailMultiAlternatives(
+        "Subject", "Body", "from@example.com", ["to@example.com"], bcc=["bcc@example.com"],
+        headers={"X-Tag": "signup"}, alternatives=[("<p>Body</p>", "text/html")],
+    )
+    message.attach("notes.txt", "Some notes", "text/plain")
+
+    copy = message_from_dict(json.loads(json.dumps(message_to_dict(message))))
+
+    assert (copy.subject, copy.recipients(), copy.extra_headers) == (
+        "Subject", ["to@example.com", "bcc@example.com"], {"X-Tag": "signup"}
+    )
+    assert copy.alternatives == [("<p>Body</p>", "text/html")]
+    assert copy.attachments == [("notes.txt", "Some notes", "text/plain")]
@@ -1,8 +1,11 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth import admin as auth_admin
 from django.contrib.auth import get_user_model
+from django.utils.translation import ugettext_lazy as _
 
 from fare.users.forms import UserChangeForm, UserCreationForm
+from fare.users.search import search_filter
+from fare.users.services import SUPERUSER, UPDATED, set_staff_member
 
 User = get_user_model()
 
@@ -15,4 +18,33 @@ class UserAdmin(auth_admin.UserAdmin):
     fieldsets = (("Review permission", {"fields": ("staff_member",)}),)
     fieldsets += (("User", {"fields": ("name",)}),) + auth_admin.UserAdmin.fieldsets
     list_display = ["username", "name", "is_superuser", "staff_member"]
-    search_fields = ["name"]
+    search_fields = ["username", "name"]
+    actions = ["grant_staff_member", "revoke_staff_member"]
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Use the indexed username prefix / name search instead of the default icontains scan
+        """
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(search_filter(search_term)), False
+
+    def _set_staff_member(self, request, queryset, staff_member):
+        results = set_staff_member(queryset.values_list("username", flat=True), staff_member)
+        updated = sum(1 for result in results.values() if result == UPDATED)
+        skipped = sum(1 for result in results.values() if result == SUPERUSER)
+        self.message_user(request, _("%(count)d users updated.") % {"count": updated})
+        if skipped:
+            self.message_user(
+                request, _("%(count)d admins skipped.") % {"count": skipped}, level=messages.WARNING
+            )
+
+    def grant_staff_member(self, request, queryset):
+        self._set_staff_member(request, queryset, True)
+
+    setattr(grant_staff_member, "short_description", _("Grant the staff member permission"))
+
+    def revoke_staff_member(self, request, queryset):
+        self._set_staff_member(request, queryset, False)
+
+    setattr(revoke_staff_member, "short_description", _("Revoke the staff member permission"))
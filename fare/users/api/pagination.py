@@ -0,0 +1,11 @@
+from rest_framework.pagination import CursorPagination
+
+
+class UserCursorPagination(CursorPagination):
+    """
+    Seek on the unique username instead of OFFSET, so every page costs the same
+    """
+    ordering = "username"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
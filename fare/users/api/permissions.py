@@ -0,0 +1,10 @@
+from rest_framework.permissions import SAFE_METHODS, BasePermission
+
+
+class IsStaffMemberOrReadOnly(BasePermission):
+    """
+    Only staff members can change users, as in ChangeStaffPermissionView
+    """
+
+    def has_permission(self, request, view):
+        return request.method in SAFE_METHODS or bool(request.user and request.user.staff_member)
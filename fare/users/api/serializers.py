@@ -0,0 +1,54 @@
+from typing import Any, Dict
+
+from django.contrib.auth import get_user_model
+from rest_framework import serializers
+
+User = get_user_model()
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Keep only the fields listed in the ``fields`` serializer context, if any
+    """
+
+    # set by the ModelSerializer it is mixed into
+    context: Dict[str, Any]
+    fields: Dict[str, Any]
+    Meta: Any
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.context.get("fields")
+        if requested:
+            for name in set(self.fields) - set(requested):
+                self.fields.pop(name)
+
+    @classmethod
+    def get_model_columns(cls, requested):
+        """
+        Return the model fields needed to serialize the requested fields,
+        to be passed to QuerySet.only()
+
+        :param requested: names of the requested serializer fields, all of them if empty
+        :type requested: list
+        """
+        fields = cls().fields
+        model_fields = {field.name for field in cls.Meta.model._meta.concrete_fields}
+        columns = set(getattr(cls.Meta, "required_columns", ()))
+        for name in requested or fields:
+            if name in fields and fields[name].source in model_fields:
+                columns.add(fields[name].source)
+        return sorted(columns)
+
+
+class UserSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+
+    url = serializers.HyperlinkedIdentityField(view_name="api:user-detail", lookup_field="username")
+    profile_url = serializers.CharField(source="get_absolute_url", read_only=True)
+
+    class Meta:
+        model = User
+        fields = ["username", "name", "staff_member", "url", "profile_url"]
+        read_only_fields = ["username", "name"]
+        # the links are built from the username, so it is always selected
+        required_columns = ["username"]
@@ -0,0 +1,85 @@
+from django.contrib.auth import get_user_model
+from rest_framework.mixins import ListModelMixin, RetrieveModelMixin, UpdateModelMixin
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.viewsets import GenericViewSet
+
+from fare.users.api.pagination import UserCursorPagination
+from fare.users.api.permissions import IsStaffMemberOrReadOnly
+from fare.users.api.serializers import UserSerializer
+from fare.users.cache import get_pk_for_username, get_stamps, remember_username
+from fare.users.conditional import conditional_get, make_validators
+
+User = get_user_model()
+
+
+class UserViewSet(RetrieveModelMixin, ListModelMixin, UpdateModelMixin, GenericViewSet):
+    """
+    Users of FARE
+
+    ``?fields=username,name`` returns only the listed fields and selects only
+    the columns they need. Only staff members can change ``staff_member``,
+    and admins are neither listed nor changeable, as in the HTML views.
+    Reads support ETag/Last-Modified validators built from the change stamps.
+    """
+    serializer_class = UserSerializer
+    pagination_class = UserCursorPagination
+    permission_classes = [IsAuthenticated, IsStaffMemberOrReadOnly]
+    lookup_field = "username"
+    lookup_value_regex = "[^/]+"
+    fields_param = "fields"
+
+    def get_requested_fields(self):
+        fields = self.request.query_params.get(self.fields_param, "")
+        return [name for name in (field.strip() for field in fields.split(",")) if name]
+
+    def get_queryset(self):
+        queryset = User.objects.all()
+        if self.action == "list" or self.request.method not in SAFE_METHODS:
+            queryset = queryset.filter(is_superuser=False)
+        if self.request.method not in SAFE_METHODS and not self.request.user.staff_member:
+            queryset = queryset.none()
+        if self.request.method in SAFE_METHODS:
+            queryset = queryset.only(*self.serializer_class.get_model_columns(self.get_requested_fields()))
+        return queryset
+
+    def get_object(self):
+        # the validators and the response share the same lookup
+        if not hasattr(self, "_object"):
+            self._object = super().get_object()
+        return self._object
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.method in SAFE_METHODS:
+            context["fields"] = self.get_requested_fields()
+        return context
+
+    def get_variants(self):
+        return self.request.accepted_renderer.format, self.request.query_params.urlencode()
+
+    def list(self, request, *args, **kwargs):
+        def get_validators():
+            return make_validators(get_stamps([], directory=True), *self.get_variants())
+
+        return conditional_get(request, get_validators, lambda: super(UserViewSet, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        username = kwargs[self.lookup_field]
+
+        def get_cached_validators():
+            pk = get_pk_for_username(username)
+            if pk is None:
+                return None
+            return make_validators(get_stamps([pk]), pk, *self.get_variants())
+
+        def get_validators():
+            pk = self.get_object().pk
+            remember_username(username, pk)
+            return make_validators(get_stamps([pk]), pk, *self.get_variants())
+
+        return conditional_get(
+            request,
+            get_validators,
+            lambda: super(UserViewSet, self).retrieve(request, *args, **kwargs),
+            get_cached_validators,
+        )
@@ -7,7 +7,5 @@ class UsersAppConfig(AppConfig):
     verbose_name = "Users"
 
     def ready(self):
-        try:
-            import users.signals  # noqa F401
-        except ImportError:
-            pass
+        # the signals keep the caches, the directory and the username filter in sync
+        import fare.users.signals  # noqa F401
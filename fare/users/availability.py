@@ -0,0 +1,311 @@
+import hashlib
+import logging
+import threading
+import uuid
+from typing import Union
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+User = get_user_model()
+
+# bit 0 of the bitmap is set once the filter has been fully built: if the key
+# is evicted or flushed the bit reads 0 again and the filter is rebuilt
+READY_BIT = 0
+REDIS_KEY = "users:username-filter"
+BUILD_CHUNK_SIZE = 5000
+# a rebuild whose process died gives the lock up after this many seconds
+BUILD_LOCK_TIMEOUT = 600
+# deletes the lock only if it still holds the token of the rebuild releasing it
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then return redis.call("del", KEYS[1]) end
+return 0
+"""
+# sets the bits in the filter, and in the one being built while the build lock
+# is held; atomic, so a RENAME of the build cannot come between the two
+SET_BITS_SCRIPT = """
+local keys = {KEYS[1]}
+if redis.call("exists", KEYS[3]) == 1 then keys[2] = KEYS[2] end
+for _, key in ipairs(keys) do
+    for _, position in ipairs(ARGV) do redis.call("setbit", key, position, 1) end
+end
+return #keys
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBitmap:
+    """
+    Bitmap held by the current process, for development and tests: another
+    process creating users does not update it
+    """
+
+    def __init__(self, size):
+        self.bits = bytearray(size // 8 + 1)
+        self.lock = threading.Lock()
+        self.build_token = None
+        self.building = None
+
+    @staticmethod
+    def _set(bits, positions):
+        for position in positions:
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def set_bits(self, positions):
+        with self.lock:
+            self._set(self.bits, positions)
+            if self.building is not None:
+                self._set(self.building, positions)
+
+    def get_bits(self, positions):
+        return [bool(self.bits[position >> 3] & (1 << (position & 7))) for position in positions]
+
+    def clear(self):
+        with self.lock:
+            self.bits[:] = bytes(len(self.bits))
+        return True
+
+    def acquire_build(self):
+        with self.lock:
+            if self.build_token is not None:
+                return None
+            self.build_token = uuid.uuid4().hex
+            return self.build_token
+
+    def release_build(self, token):
+        with self.lock:
+            if self.build_token == token:
+                self.build_token = None
+
+    def build(self, chunks):
+        with self.lock:
+            self.building = bytearray(len(self.bits))
+        for positions in chunks:
+            with self.lock:
+                self._set(self.building, positions)
+        with self.lock:
+            self._set(self.building, [READY_BIT])
+            self.bits, self.building = self.building, None
+        return True
+
+
+class RedisBitmap:
+    """
+    Bitmap shared by every process through Redis SETBIT/GETBIT, one round-trip
+    per operation
+
+    When Redis is unreachable every bit reads as set, so every check falls
+    back to the database. A rebuild fills a separate key, which replaces the
+    filter with a RENAME once complete; while the build lock is held, the bits
+    set meanwhile go to both keys.
+
+    A username that could not be added would be a false negative: the filter
+    is then dropped, so every process rebuilds it, and until the drop succeeds
+    this process reads every bit as set.
+
+    :attr stale: a write failed and the filter has not been dropped yet
+    :type stale: bool
+    """
+
+    def __init__(self, client, key=REDIS_KEY):
+        from redis.exceptions import RedisError
+
+        self.client = client
+        self.key = key
+        self.build_key = f"{key}:build"
+        self.lock_key = f"{key}:lock"
+        self.errors = RedisError
+        self.stale = False
+
+    def _set_bits(self, key, positions):
+        pipeline = self.client.pipeline(transaction=False)
+        for position in positions:
+            pipeline.setbit(key, position, 1)
+        pipeline.execute()
+
+    def set_bits(self, positions):
+        try:
+            self.client.eval(SET_BITS_SCRIPT, 3, self.key, self.build_key, self.lock_key, *positions)
+        except self.errors:
+            logger.exception("Cannot update the username filter, dropping it")
+            self.stale = True
+            self.clear()
+
+    def get_bits(self, positions):
+        if self.stale and not self.clear():
+            return [True] * len(positions)
+        pipeline = self.client.pipeline(transaction=False)
+        for position in positions:
+            pipeline.getbit(self.key, position)
+        try:
+            return [bool(bit) for bit in pipeline.execute()]
+        except self.errors:
+            logger.warning("Username filter unavailable, asking the database")
+            return [True] * len(positions)
+
+    def clear(self):
+        """
+        Drop the filter, return False if Redis could not be reached
+        """
+        try:
+            self.client.delete(self.key)
+        except self.errors:
+            logger.exception("Cannot drop the username filter")
+            return False
+        self.stale = False
+        return True
+
+    def acquire_build(self):
+        token = uuid.uuid4().hex
+        try:
+            return token if self.client.set(self.lock_key, token, nx=True, ex=BUILD_LOCK_TIMEOUT) else None
+        except self.errors:
+            logger.warning("Cannot lock the username filter rebuild", exc_info=True)
+            return None
+
+    def release_build(self, token):
+        try:
+            self.client.eval(RELEASE_SCRIPT, 1, self.lock_key, token)
+        except self.errors:
+            logger.warning("Cannot unlock the username filter rebuild", exc_info=True)
+
+    def build(self, chunks):
+        try:
+            self.client.delete(self.build_key)
+            for positions in chunks:
+                self._set_bits(self.build_key, positions)
+            self._set_bits(self.build_key, [READY_BIT])
+            self.client.rename(self.build_key, self.key)
+        except self.errors:
+            logger.exception("Cannot rebuild the username filter")
+            return False
+        return True
+
+
+class UsernameFilter:
+    """
+    Bloom filter of the taken usernames, case folded
+
+    "Not taken" needs no query, while "maybe taken" must be confirmed by the
+    database. Until the filter is built every username is "maybe taken", and
+    one process at a time rebuilds it in a Celery task.
+
+    Adding a username happens after its transaction commits, so the filter can
+    briefly miss a taken username: it only spares queries to the availability
+    endpoint, while signup and the forms always check the database.
+
+    :attr size: number of bits, ~10 per username keeps false positives near 1%
+    :type size: int
+    :attr hashes: number of bits set per username
+    :type hashes: int
+    """
+
+    def __init__(self, bitmap, size, hashes=7):
+        self.bitmap = bitmap
+        self.size = size
+        self.hashes = hashes
+
+    def _positions(self, username):
+        digest = hashlib.blake2b(username.lower().encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+        # double hashing; position 0 is the ready bit
+        return [1 + (first + index * second) % (self.size - 1) for index in range(self.hashes)]
+
+    def add(self, *usernames):
+        positions = [position for username in usernames for position in self._positions(username)]
+        if positions:
+            self.bitmap.set_bits(positions)
+
+    def might_contain(self, username):
+        """
+        Return False when the username is certainly not taken, True when it may be
+        """
+        ready, *bits = self.bitmap.get_bits([READY_BIT, *self._positions(username)])
+        if not ready:
+            self.request_rebuild()
+            return True
+        return all(bits)
+
+    def request_rebuild(self):
+        """
+        Enqueue a rebuild, unless one is already running or enqueued
+        """
+        from fare.users.tasks import rebuild_username_filter
+
+        token = self.bitmap.acquire_build()
+        if token is None:
+            return
+        try:
+            rebuild_username_filter.delay(token)
+        except Exception:
+            logger.exception("Cannot enqueue the username filter rebuild")
+            self.bitmap.release_build(token)
+
+    def _iter_positions(self):
+        chunk = []
+        for username in User.objects.values_list("username", flat=True).iterator(chunk_size=BUILD_CHUNK_SIZE):
+            chunk.extend(self._positions(username))
+            if len(chunk) >= BUILD_CHUNK_SIZE * self.hashes:
+                yield chunk
+                chunk = []
+        yield chunk
+
+    def rebuild(self, token=None):
+        """
+        Fill a new filter from the users table and swap it in once complete;
+        usernames saved meanwhile are added to both by the post_save signal
+
+        :param token: build lock already taken by request_rebuild, taken here if None
+        :type token: string
+        :return: False when another rebuild holds the lock or the build failed
+        :rtype: bool
+        """
+        if token is None:
+            token = self.bitmap.acquire_build()
+            if token is None:
+                return False
+        try:
+            return self.bitmap.build(self._iter_positions())
+        finally:
+            self.bitmap.release_build(token)
+
+
+_filter = None
+
+
+def get_username_filter():
+    """
+    Return the username filter, shared through Redis when USERNAME_FILTER_REDIS_ALIAS
+    names a django_redis cache
+    """
+    global _filter
+    if _filter is None:
+        size = getattr(settings, "USERNAME_FILTER_BITS", 2 ** 23)
+        alias = getattr(settings, "USERNAME_FILTER_REDIS_ALIAS", None)
+        if alias:
+            from django_redis import get_redis_connection
+
+            bitmap: Union[LocalBitmap, RedisBitmap] = RedisBitmap(get_redis_connection(alias))
+        else:
+            bitmap = LocalBitmap(size)
+        _filter = UsernameFilter(bitmap, size)
+    return _filter
+
+
+def is_username_taken(username, case_sensitive=True):
+    """
+    Tell whether a username is taken, asking the database only when the filter
+    cannot rule it out
+
+    The answer is a hint for the signup page: a username added a moment ago may
+    still be missing from the filter, so uniqueness checks must query the
+    database.
+
+    :param case_sensitive: compare as the username field does, otherwise as allauth does
+    :type case_sensitive: bool
+    """
+    if not get_username_filter().might_contain(username):
+        return False
+    lookup = "username" if case_sensitive else "username__iexact"
+    return User.objects.filter(**{lookup: username}).exists()
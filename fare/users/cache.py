@@ -0,0 +1,132 @@
+import time
+
+from django.core.cache import cache
+from django.utils.translation import get_language
+
+from fare.core.replicas import is_current, require_stamps
+
+STAMP_KEY = "users:stamp:{pk}"
+DIRECTORY_STAMP_KEY = "users:stamp:directory"
+USERNAME_KEY = "users:pk:{username}"
+FRAGMENT_KEY = "users:fragment:{name}:{pk}:{stamp}:{language}"
+AUTH_USER_KEY = "users:auth:{pk}:{session_hash}"
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+AUTH_USER_TIMEOUT = 60 * 60
+
+
+def _new_stamp():
+    return repr(time.time())
+
+
+def _get_stamps(keys):
+    stamps = cache.get_many(keys)
+    for key in keys:
+        if key not in stamps:
+            cache.add(key, _new_stamp(), None)
+            stamps[key] = cache.get(key) or _new_stamp()
+    # what is read next is cached or validated under these stamps
+    require_stamps(stamps.values())
+    return [stamps[key] for key in keys]
+
+
+def get_user_stamp(pk):
+    """
+    Return the change stamp of a user, creating it when it is missing
+
+    A stamp only ever moves forward: if Redis evicts it a fresh one is made,
+    so the entries keyed by the old stamp are simply never read again.
+    """
+    return _get_stamps([STAMP_KEY.format(pk=pk)])[0]
+
+
+def get_stamps(pks, directory=False):
+    """
+    Return the change stamps of the given users with a single cache round-trip,
+    followed by the directory stamp when ``directory`` is true
+    """
+    keys = [STAMP_KEY.format(pk=pk) for pk in pks]
+    if directory:
+        keys.append(DIRECTORY_STAMP_KEY)
+    return _get_stamps(keys)
+
+
+def touch_users(pks):
+    """
+    Bump the change stamp of the given users and of the directory,
+    invalidating everything cached for them
+    """
+    stamp = _new_stamp()
+    stamps = {STAMP_KEY.format(pk=pk): stamp for pk in pks}
+    stamps[DIRECTORY_STAMP_KEY] = stamp
+    cache.set_many(stamps, None)
+
+
+def touch_user(pk):
+    touch_users([pk])
+
+
+def get_pk_for_username(username):
+    """
+    Return the pk last seen for a username, or None
+
+    The mapping may be stale after a rename, which is harmless for validators:
+    the stamp of the renamed user has moved, so nothing matches it anymore.
+    """
+    return cache.get(USERNAME_KEY.format(username=username))
+
+
+def remember_username(username, pk):
+    cache.set(USERNAME_KEY.format(username=username), pk, FRAGMENT_TIMEOUT)
+
+
+def get_cached_user(pk, session_hash, load):
+    """
+    Return the authenticated user, calling ``load`` only when the cached one is
+    missing or older than the user's stamp
+
+    The entry is keyed by the session auth hash the user was verified against,
+    so a password change never matches the old entry, and stores the stamp it
+    was loaded under: the stamp and the entry come in a single round-trip.
+
+    :param load: callable returning the user, or an anonymous user if the session is not valid
+    :type load: function
+    """
+    stamp_key = STAMP_KEY.format(pk=pk)
+    user_key = AUTH_USER_KEY.format(pk=pk, session_hash=session_hash)
+    cached = cache.get_many([stamp_key, user_key])
+    stamp = cached.get(stamp_key)
+    if stamp is not None and user_key in cached and cached[user_key][0] == stamp:
+        return cached[user_key][1]
+
+    # the stamp is read before the row, so a concurrent change always outdates the entry
+    if stamp is None:
+        stamp = get_user_stamp(pk)
+    else:
+        require_stamps([stamp])
+    user = load()
+    if user.is_authenticated:
+        cache.set(user_key, (stamp, user), AUTH_USER_TIMEOUT)
+    return user
+
+
+def get_cached_fragment(name, user, render):
+    """
+    Return the fragment ``name`` rendered for ``user``, calling ``render`` only on a miss
+
+    :param name: fragment name, part of the cache key
+    :type name: string
+    :param user: the user the fragment is about
+    :type user: User
+    :param render: callable returning the rendered fragment
+    :type render: function
+
+    Hits and misses are counted under the "users:fragment" prefix by the
+    instrumented cache, see the cache_stats command.
+    """
+    key = FRAGMENT_KEY.format(name=name, pk=user.pk, stamp=get_user_stamp(user.pk), language=get_language())
+    if is_current(user._state.db):
+        # with the tiered cache, concurrent misses render the fragment only once
+        return cache.get_or_set(key, render, FRAGMENT_TIMEOUT)
+    # the user comes from a replica that may lack the change of the stamp: used, but not stored
+    fragment = cache.get(key)
+    return fragment if fragment is not None else render()
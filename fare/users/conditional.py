@@ -0,0 +1,100 @@
+import hashlib
+import time
+from abc import ABCMeta, abstractmethod
+
+from django.contrib import messages
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.utils.translation import get_language
+from django.views import View
+
+
+def make_validators(stamps, *variants):
+    """
+    Build the (ETag, Last-Modified) pair of a response from change stamps
+
+    Last-Modified has a resolution of one second, so it is None while the
+    newest stamp is in the current second: another change in the same second
+    would not move it, and a client revalidating with If-Modified-Since alone
+    would keep the old version.
+
+    :param stamps: change stamps of everything the response shows
+    :type stamps: list of strings
+    :param variants: anything else the response depends on, e.g. the viewer
+    :type variants: list
+    :return: a quoted ETag and a timestamp in seconds, or None
+    :rtype: tuple
+    """
+    parts = [str(part) for part in [*stamps, *variants, get_language()]]
+    etag = quote_etag(hashlib.md5("|".join(parts).encode()).hexdigest())
+    last_modified = int(max(float(stamp) for stamp in stamps))
+    if last_modified >= int(time.time()):
+        return etag, None
+    return etag, last_modified
+
+
+def is_conditional(request):
+    return "HTTP_IF_NONE_MATCH" in request.META or "HTTP_IF_MODIFIED_SINCE" in request.META
+
+
+def conditional_get(request, get_validators, respond, get_cached_validators=None):
+    """
+    Answer 304 when the client already has the current version, call ``respond`` otherwise
+
+    :param get_validators: callable returning the (ETag, Last-Modified) pair of the
+                           response; it is called before rendering, so a change
+                           made during the rendering is never hidden from the client
+    :type get_validators: function
+    :param respond: callable returning the full response
+    :type respond: function
+    :param get_cached_validators: optional callable returning the same pair from the
+                                  cache alone, or None; it is only trusted to answer 304
+    :type get_cached_validators: function
+
+    Pending messages are not part of the validators, so a request with some
+    gets the full response, without validators, to show them.
+    """
+    if request.method not in ("GET", "HEAD") or messages.get_messages(request):
+        return respond()
+    if get_cached_validators is not None and is_conditional(request):
+        validators = get_cached_validators()
+        if validators is not None:
+            response = get_conditional_response(request, etag=validators[0], last_modified=validators[1])
+            if response is not None:
+                return response
+
+    etag, last_modified = get_validators()
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+    response = respond()
+    if response.status_code == 200:
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+class ConditionalGetMixin(View, metaclass=ABCMeta):
+    """
+    Add ETag/Last-Modified support to a view implementing ``get_validators()``
+    and, optionally, ``get_cached_validators()``
+
+    It must come after LoginRequiredMixin, so anonymous users are redirected
+    before any validator is computed.
+    """
+
+    @abstractmethod
+    def get_validators(self):
+        """
+        Return the (ETag, Last-Modified) pair of the response, see make_validators
+        """
+
+    def get_cached_validators(self):
+        return None
+
+    def dispatch(self, request, *args, **kwargs):
+        def respond():
+            return super(ConditionalGetMixin, self).dispatch(request, *args, **kwargs)
+
+        return conditional_get(request, self.get_validators, respond, self.get_cached_validators)
@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from fare.users.cache import touch_users
+from fare.users.models import DirectoryEntry
+
+User = get_user_model()
+
+
+@transaction.atomic(savepoint=False)
+def sync_entry(user):
+    """
+    Write the directory entry of a user, or remove it for an admin
+
+    The entry is written from the user row, locked, rather than from the
+    instance: outside a request transaction the UPDATE of the user may have
+    committed before the entry is written, and a concurrent change in between
+    would otherwise be overwritten. The lock serializes the writers of the
+    same user, so the entry always follows the last committed write.
+    """
+    row = User.objects.select_for_update().filter(pk=user.pk).values_list(
+        "username", "staff_member", "is_superuser"
+    ).first()
+    if row is None or row[2]:
+        DirectoryEntry.objects.filter(pk=user.pk).delete()
+        return
+    values = {"username": row[0], "staff_member": row[1]}
+    if not DirectoryEntry.objects.filter(pk=user.pk).update(**values):
+        DirectoryEntry.objects.create(user_id=user.pk, **values)
+
+
+def entries_for(rows):
+    return [
+        DirectoryEntry(user_id=pk, username=username, staff_member=staff_member)
+        for pk, username, staff_member in rows
+    ]
+
+
+@transaction.atomic
+def rebuild_directory(chunk_size=2000):
+    """
+    Rebuild the whole directory from the users table, reading it in chunks
+
+    :return: the number of entries written
+    :rtype: int
+    """
+    DirectoryEntry.objects.all().delete()
+    rows = User.objects.filter(is_superuser=False).order_by("pk").values_list("pk", "username", "staff_member")
+    count, chunk = 0, []
+    for row in rows.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            count += len(DirectoryEntry.objects.bulk_create(entries_for(chunk)))
+            chunk = []
+    count += len(DirectoryEntry.objects.bulk_create(entries_for(chunk)))
+    # the directory stamp moves, so no page rendered from the old rows is served again
+    touch_users([])
+    return count
@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model, forms
 from django.core.exceptions import ValidationError
+from django.forms import BooleanField, CharField, Form, Textarea
 from django.utils.translation import ugettext_lazy as _
 
 User = get_user_model()
@@ -29,3 +30,19 @@ class UserCreationForm(forms.UserCreationForm):
             return username
 
         raise ValidationError(self.error_messages["duplicate_username"])
+
+
+class BulkStaffPermissionForm(Form):
+
+    usernames = CharField(
+        label=_("Usernames"),
+        widget=Textarea,
+        help_text=_("One username per line, or separated by commas or spaces."),
+    )
+    staff_member = BooleanField(label=_("Staff member"), required=False)
+
+    def clean_usernames(self):
+        usernames = self.cleaned_data["usernames"].replace(",", " ").split()
+        if not usernames:
+            raise ValidationError(_("Enter at least one username."))
+        return usernames
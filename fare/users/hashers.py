@@ -0,0 +1,53 @@
+from collections import OrderedDict
+
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher, PBKDF2SHA1PasswordHasher
+
+
+class Argon2WrappedPBKDF2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2 computed over a legacy PBKDF2 digest
+
+    A stored PBKDF2 hash can be wrapped without knowing the raw password, so
+    legacy hashes are upgraded in the background (see
+    ``fare.users.tasks.upgrade_legacy_password_hashes``); since the algorithm is
+    not the preferred one, the next login re-encodes the password as plain Argon2.
+
+    Encoded form: ``<algorithm>$<pbkdf2 iterations>$<pbkdf2 salt>$<argon2 variety>$...``
+    """
+    algorithm = "argon2_pbkdf2_sha256"
+    inner_hasher_class = PBKDF2PasswordHasher
+
+    def wrap(self, legacy_encoded):
+        """
+        Return the wrapped form of a hash encoded by the inner hasher
+        """
+        algorithm, iterations, salt, digest = legacy_encoded.split("$", 3)
+        assert algorithm == self.inner_hasher_class.algorithm
+        argon2_encoded = super().encode(digest, self.salt())
+        return f"{self.algorithm}${iterations}${salt}{argon2_encoded[len(self.algorithm):]}"
+
+    def _split(self, encoded):
+        algorithm, iterations, salt, argon2_rest = encoded.split("$", 3)
+        assert algorithm == self.algorithm
+        return int(iterations), salt, f"{self.algorithm}${argon2_rest}"
+
+    def encode(self, password, salt, iterations=None):
+        return self.wrap(self.inner_hasher_class().encode(password, salt, iterations))
+
+    def verify(self, password, encoded):
+        iterations, salt, argon2_encoded = self._split(encoded)
+        digest = self.inner_hasher_class().encode(password, salt, iterations).split("$", 3)[3]
+        return super().verify(digest, argon2_encoded)
+
+    def safe_summary(self, encoded):
+        iterations, salt, argon2_encoded = self._split(encoded)
+        summary = super().safe_summary(argon2_encoded)
+        return OrderedDict([*summary.items(), ("wrapped iterations", iterations)])
+
+    def must_update(self, encoded):
+        return True
+
+
+class Argon2WrappedPBKDF2SHA1PasswordHasher(Argon2WrappedPBKDF2PasswordHasher):
+    algorithm = "argon2_pbkdf2_sha1"
+    inner_hasher_class = PBKDF2SHA1PasswordHasher
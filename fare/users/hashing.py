@@ -0,0 +1,138 @@
+"""
+Password hashing off the request thread
+
+Argon2 costs tens of milliseconds of CPU. When PASSWORD_HASHING_POOL_SIZE is
+set, verification and hashing run in a small per-process pool, so a login
+burst is bounded to that many cores while the other gunicorn threads keep
+serving pages. PASSWORD_HASHING_MAX_PENDING bounds how many requests of a
+process may wait for the pool: past it, a request waits at most
+PASSWORD_HASHING_ADMISSION_TIMEOUT seconds for a slot and then fails fast with
+PasswordHashingBusy, answered as 503 by PasswordHashingBusyMiddleware.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+class PasswordHashingBusy(Exception):
+    pass
+
+
+def verify_password(password, encoded):
+    """
+    Return (is_correct, must_update) as django.contrib.auth.hashers.check_password
+    computes them, without calling the setter, so it can run in another process
+    """
+    preferred = hashers.get_hasher("default")
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False, False
+
+    hasher_changed = hasher.algorithm != preferred.algorithm
+    must_update = hasher_changed or preferred.must_update(encoded)
+    is_correct = hasher.verify(password, encoded)
+    if not is_correct and not hasher_changed and must_update:
+        hasher.harden_runtime(password, encoded)
+    return is_correct, must_update
+
+
+class HashingPool:
+    """
+    A process pool with admission control, recreated after a fork
+    """
+
+    def __init__(self, size, max_pending, timeout):
+        self.size = size
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        # (pid, executor, admission slots) of the process that started the pool
+        self._started: Optional[Tuple[int, ProcessPoolExecutor, threading.BoundedSemaphore]] = None
+
+    def _ensure_started(self):
+        # a pool inherited from the gunicorn master or a celery parent is unusable
+        started = self._started
+        if started is not None and started[0] == os.getpid():
+            return started
+        with self._lock:
+            if self._started is None or self._started[0] != os.getpid():
+                # the workers are forked from this process, with Django already set up
+                self._started = (
+                    os.getpid(),
+                    ProcessPoolExecutor(max_workers=self.size),
+                    threading.BoundedSemaphore(self.max_pending),
+                )
+            return self._started
+
+    def run(self, func, *args):
+        _, executor, slots = self._ensure_started()
+        if not slots.acquire(timeout=self.timeout):
+            raise PasswordHashingBusy()
+        try:
+            return executor.submit(func, *args).result()
+        finally:
+            slots.release()
+
+    def shutdown(self):
+        if self._started is not None and self._started[0] == os.getpid():
+            self._started[1].shutdown(wait=False)
+        self._started = None
+
+
+_pool = None
+
+
+def get_pool():
+    """
+    Return the pool of this process, or None when hashing runs inline
+    """
+    global _pool
+    size = getattr(settings, "PASSWORD_HASHING_POOL_SIZE", 0)
+    if not size:
+        return None
+    if _pool is None:
+        _pool = HashingPool(
+            size,
+            getattr(settings, "PASSWORD_HASHING_MAX_PENDING", size * 2),
+            getattr(settings, "PASSWORD_HASHING_ADMISSION_TIMEOUT", 2.0),
+        )
+    return _pool
+
+
+@receiver(setting_changed)
+def reset_pool(setting, **kwargs):
+    # the pool processes hold a copy of the settings taken when they started
+    global _pool
+    if setting.startswith("PASSWORD_HASH") and _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def _run(func, *args):
+    pool = get_pool()
+    return pool.run(func, *args) if pool else func(*args)
+
+
+def check_password(password, encoded, setter=None):
+    """
+    Same contract as django.contrib.auth.hashers.check_password, through the pool
+    """
+    if password is None or not hashers.is_password_usable(encoded):
+        return False
+    is_correct, must_update = _run(verify_password, password, encoded)
+    if setter and is_correct and must_update:
+        setter(password)
+    return is_correct
+
+
+def make_password(password):
+    if password is None:
+        return hashers.make_password(None)
+    return _run(hashers.make_password, password)
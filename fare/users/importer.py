@@ -0,0 +1,193 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+from allauth.account.models import EmailAddress
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+
+from fare.users.availability import get_username_filter
+from fare.users.cache import touch_users
+from fare.users.directory import entries_for
+from fare.users.models import DirectoryEntry
+
+User = get_user_model()
+
+CREATED = "created"
+DUPLICATE_USERNAME = "duplicate_username"
+DUPLICATE_EMAIL = "duplicate_email"
+INVALID = "invalid"
+FAILED = "failed"
+
+
+class ImportStats:
+    """
+    Running totals of an import, handed to the progress callback after every batch
+
+    :attr errors: database errors of the batches that were rolled back
+    :type errors: list
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.processed = 0
+        self.results = {CREATED: 0, DUPLICATE_USERNAME: 0, DUPLICATE_EMAIL: 0, INVALID: 0, FAILED: 0}
+        self.errors: List[str] = []
+
+    @property
+    def created(self):
+        return self.results[CREATED]
+
+    @property
+    def rate(self):
+        """
+        Users processed per second
+        """
+        elapsed = time.monotonic() - self.started
+        return self.processed / elapsed if elapsed else 0.0
+
+
+def _clean(row):
+    username = (row.get("username") or "").strip()
+    if not username:
+        return None
+    try:
+        User.username_validator(username)
+    except ValidationError:
+        return None
+    return {
+        "username": username,
+        "email": (row.get("email") or "").strip().lower(),
+        "name": (row.get("name") or "").strip(),
+        "password": row.get("password") or None,
+    }
+
+
+def _hash_passwords(passwords, executor):
+    # unusable passwords cost nothing, only the real ones go to the pool
+    hashed = [make_password(None) if password is None else None for password in passwords]
+    pending = [index for index, password in enumerate(passwords) if password is not None]
+    if pending:
+        raw = [passwords[index] for index in pending]
+        results = executor.map(make_password, raw, chunksize=64) if executor else map(make_password, raw)
+        for index, encoded in zip(pending, results):
+            hashed[index] = encoded
+    return hashed
+
+
+def _import_batch(rows, stats, executor, verified_email):
+    users = []
+    for row in rows:
+        cleaned = _clean(row)
+        if cleaned is None:
+            stats.results[INVALID] += 1
+        else:
+            users.append(cleaned)
+
+    # one set-based lookup per batch for each uniqueness rule, instead of one query per row;
+    # allauth looks usernames up case insensitively, "Alice" would clash with "alice" at login
+    usernames = {user["username"].lower() for user in users}
+    taken = set(
+        User.objects.annotate(folded=Lower("username")).filter(folded__in=usernames).values_list("folded", flat=True)
+    )
+    emails = [user["email"] for user in users if user["email"]]
+    taken_emails = set(EmailAddress.objects.filter(email__in=emails).values_list("email", flat=True))
+
+    accepted = []
+    for user in users:
+        if user["username"].lower() in taken:
+            stats.results[DUPLICATE_USERNAME] += 1
+        elif user["email"] and user["email"] in taken_emails:
+            stats.results[DUPLICATE_EMAIL] += 1
+        else:
+            taken.add(user["username"].lower())
+            if user["email"]:
+                taken_emails.add(user["email"])
+            accepted.append(user)
+
+    passwords = _hash_passwords([user["password"] for user in accepted], executor)
+    stats.processed += len(rows)
+    try:
+        pks = _insert_batch(accepted, passwords, verified_email)
+    except IntegrityError as error:
+        # e.g. someone signed up with one of the usernames since the check: the batch is rolled back
+        stats.results[FAILED] += len(accepted)
+        stats.errors.append(str(error))
+        return []
+    touch_users([])
+
+    stats.results[CREATED] += len(accepted)
+    return [pks[user["username"]] for user in accepted]
+
+
+def _insert_batch(accepted, passwords, verified_email):
+    with transaction.atomic():
+        User.objects.bulk_create(
+            User(username=user["username"], email=user["email"], name=user["name"], password=password)
+            for user, password in zip(accepted, passwords)
+        )
+        # bulk_create does not return the pks on every backend, read them back in one query
+        pks = dict(User.objects.filter(username__in=[user["username"] for user in accepted]).values_list(
+            "username", "pk"
+        ))
+        EmailAddress.objects.bulk_create(
+            EmailAddress(user_id=pks[user["username"]], email=user["email"], primary=True, verified=verified_email)
+            for user in accepted
+            if user["email"]
+        )
+        # bulk_create sends no post_save, so the directory read model is written here
+        DirectoryEntry.objects.bulk_create(
+            entries_for((pks[user["username"]], user["username"], False) for user in accepted)
+        )
+        # nor is the username filter updated by the signal; a rollback only leaves false positives
+        created = [user["username"] for user in accepted]
+        get_username_filter().add(*created)
+        # a rebuild reading the table before the commit would miss them
+        transaction.on_commit(lambda: get_username_filter().add(*created))
+    return pks
+
+
+def import_users(rows, batch_size=1000, workers=None, verified_email=False, progress=None):
+    """
+    Create users in bulk from an iterable of dicts with username, email, name and password
+
+    Rows without a password get an unusable one, their owners set it through the
+    password reset flow. Existing usernames, compared case insensitively, and
+    emails are skipped; a batch failing on a database constraint is rolled back
+    and counted as failed.
+
+    :param batch_size: rows checked and inserted together
+    :type batch_size: int
+    :param workers: processes hashing the passwords, 0 hashes in this process,
+                    None uses one per CPU
+    :type workers: int
+    :param verified_email: mark the imported email addresses as verified
+    :type verified_email: bool
+    :param progress: called with the ImportStats after every batch
+    :type progress: function
+    :return: the final statistics and the pks of the created users
+    :rtype: tuple
+    """
+    stats = ImportStats()
+    created: List[int] = []
+    executor = ProcessPoolExecutor(max_workers=workers) if workers != 0 else None
+    try:
+        batch: List[Dict[str, Any]] = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batch_size:
+                created += _import_batch(batch, stats, executor, verified_email)
+                batch = []
+                if progress:
+                    progress(stats)
+        if batch:
+            created += _import_batch(batch, stats, executor, verified_email)
+            if progress:
+                progress(stats)
+    finally:
+        if executor:
+            executor.shutdown()
+    return stats, created
@@ -0,0 +1,43 @@
+from typing import Any, Dict
+
+from django.contrib.auth import get_user_model
+from django.http import HttpRequest
+from django.shortcuts import get_object_or_404
+
+from fare.core.replicas import is_current
+
+User = get_user_model()
+
+
+def get_user_by_username(request, username):
+    """
+    Return the user with the given username, querying the database at most
+    once per request; raise Http404 when it does not exist
+
+    A user read from a replica is read again when the stamps read since then,
+    e.g. for the validators, require a more recent replica.
+
+    :param request: the current request, it holds the lookup cache
+    :type request: HttpRequest
+    :param username: username of the requested user
+    :type username: string
+    """
+    cache = request.__dict__.setdefault("_users_by_username", {})
+    if username not in cache or not is_current(cache[username]._state.db):
+        cache[username] = get_object_or_404(User, username=username)
+    return cache[username]
+
+
+class UserLookupMixin:
+    """
+    Resolve the object of a single-object view through the request lookup
+    cache, so permission checks, forms and templates share one query
+    """
+
+    # set by the single-object view it is mixed into
+    request: HttpRequest
+    kwargs: Dict[str, Any]
+    slug_url_kwarg: str
+
+    def get_object(self, queryset=None):
+        return get_user_by_username(self.request, self.kwargs[self.slug_url_kwarg])
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from fare.users.sessions import copy_database_sessions
+
+
+class Command(BaseCommand):
+    help = "Copy the unexpired database sessions to Redis before switching to the Redis session engine"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Rows read and keys written per batch")
+
+    def handle(self, *args, **options):
+        copied = copy_database_sessions(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"{copied} sessions copied"))
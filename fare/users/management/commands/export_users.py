@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from fare.users.export import CHUNK_SIZE, FORMATS, export_lines
+
+
+class Command(BaseCommand):
+    help = "Stream all the users as CSV or JSON Lines to stdout or to a file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+        parser.add_argument("--output", help="File to write, stdout by default")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows fetched per round-trip")
+
+    def handle(self, *args, **options):
+        lines = export_lines(options["format"], options["chunk_size"])
+        if options["output"]:
+            with open(options["output"], "w", newline="") as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
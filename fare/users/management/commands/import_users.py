@@ -0,0 +1,81 @@
+import csv
+import json
+
+from allauth.account.forms import default_token_generator
+from allauth.account.utils import user_pk_to_url_str
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from fare.users.importer import import_users
+
+User = get_user_model()
+
+
+def read_rows(path):
+    with open(path, newline="") as source:
+        if path.endswith(".jsonl"):
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(source)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create users in bulk from a CSV (with a header row) or JSON Lines file "
+        "with username, email, name and optional password fields"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, .csv or .jsonl")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--workers", type=int, default=None, help="Password hashing processes, 0 to hash inline"
+        )
+        parser.add_argument("--verified", action="store_true", help="Mark the imported emails as verified")
+        parser.add_argument(
+            "--reset-links",
+            metavar="PATH",
+            help="Write a CSV of password reset links for the created users without a password",
+        )
+
+    def progress(self, stats):
+        self.stdout.write(
+            f"{stats.processed} processed, {stats.created} created, {stats.rate:.0f} users/s"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            rows = read_rows(options["path"])
+            stats, created = import_users(
+                rows,
+                batch_size=options["batch_size"],
+                workers=options["workers"],
+                verified_email=options["verified"],
+                progress=self.progress,
+            )
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+
+        if options["reset_links"]:
+            self.write_reset_links(options["reset_links"], created)
+
+        for batch_error in stats.errors:
+            self.stderr.write(f"Batch rolled back: {batch_error}")
+        summary = ", ".join(f"{count} {result}" for result, count in stats.results.items())
+        self.stdout.write(self.style.SUCCESS(f"Import finished: {summary} ({stats.rate:.0f} users/s)"))
+
+    def write_reset_links(self, path, pks):
+        with open(path, "w", newline="") as output:
+            writer = csv.writer(output)
+            writer.writerow(["username", "email", "reset_path"])
+            for user in User.objects.filter(pk__in=pks).iterator():
+                if user.has_usable_password():
+                    continue
+                key = default_token_generator.make_token(user)
+                reset_path = reverse(
+                    "account_reset_password_from_key", kwargs={"uidb36": user_pk_to_url_str(user), "key": key}
+                )
+                writer.writerow([user.username, user.email, reset_path])
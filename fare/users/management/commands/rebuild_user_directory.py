@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from fare.users.directory import rebuild_directory
+
+
+class Command(BaseCommand):
+    help = "Rebuild the user directory read model from the users table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Rows read and written per batch")
+
+    def handle(self, *args, **options):
+        count = rebuild_directory(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Directory rebuilt with {count} entries"))
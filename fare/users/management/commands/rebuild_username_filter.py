@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from fare.users.availability import get_username_filter
+
+
+class Command(BaseCommand):
+    help = "Rebuild the username availability filter from the users table"
+
+    def handle(self, *args, **options):
+        if not get_username_filter().rebuild():
+            raise CommandError("Another rebuild is running, or the filter could not be written")
+        self.stdout.write(self.style.SUCCESS("Username filter rebuilt"))
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.http import HttpResponse
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import ugettext as _
+
+from fare.core.replicas import retry_on_primary
+from fare.users.cache import get_cached_user
+from fare.users.hashing import PasswordHashingBusy
+
+
+def get_user(request):
+    """
+    Return the user of the request as django.contrib.auth.get_user does, from
+    the cache unless the user changed since it was cached
+    """
+    session = request.session
+    user_id = session.get(auth.SESSION_KEY)
+    session_hash = session.get(auth.HASH_SESSION_KEY)
+    if user_id is None or session_hash is None or session.get(auth.BACKEND_SESSION_KEY) not in (
+        settings.AUTHENTICATION_BACKENDS
+    ):
+        return retry_on_primary(auth.get_user, request)
+    # a miss goes through auth.get_user, which verifies the session hash
+    return get_cached_user(user_id, session_hash, lambda: retry_on_primary(auth.get_user, request))
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    AuthenticationMiddleware loading request.user through the user cache
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
+
+
+class PasswordHashingBusyMiddleware:
+    """
+    Answer 503 with Retry-After when a login or signup is refused by the hashing pool
+    """
+    retry_after = 5
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, PasswordHashingBusy):
+            response = HttpResponse(_("Too many sign-ins right now, please retry in a few seconds."), status=503)
+            response["Retry-After"] = str(self.retry_after)
+            return response
+        return None
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+# Django compiles istartswith/icontains on PostgreSQL to UPPER(column::text) LIKE UPPER(...),
+# so the trigram indexes are built on that exact expression to be usable by the planner.
+INDEXES = {
+    "users_user_username_trgm": "username",
+    "users_user_name_trgm": "name",
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for index, column in INDEXES.items():
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {index} ON users_user USING gin ((UPPER({column}::text)) gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for index in INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {index}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("users", "0002_user_staff_member")]
+
+    operations = [migrations.RunPython(create_trigram_indexes, drop_trigram_indexes)]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.28 on 2026-10-18 11:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_directory(apps, schema_editor):
+    User = apps.get_model("users", "User")
+    DirectoryEntry = apps.get_model("users", "DirectoryEntry")
+    rows = User.objects.filter(is_superuser=False).values_list("pk", "username", "staff_member").iterator()
+    DirectoryEntry.objects.bulk_create(
+        (DirectoryEntry(user_id=pk, username=username, staff_member=staff_member) for pk, username, staff_member in rows),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirectoryEntry',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='directory_entry', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('username', models.CharField(max_length=150, unique=True)),
+                ('staff_member', models.BooleanField(default=False)),
+            ],
+            options={
+                'verbose_name_plural': 'directory entries',
+            },
+        ),
+        migrations.RunPython(populate_directory, migrations.RunPython.noop),
+    ]
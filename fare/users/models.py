@@ -1,8 +1,10 @@
 from django.contrib.auth.models import AbstractUser
-from django.db.models import CharField, BooleanField
+from django.db.models import CASCADE, BooleanField, CharField, Model, OneToOneField
 from django.urls import reverse
 from django.utils.translation import ugettext_lazy as _
 
+from fare.users import hashing
+
 
 class User(AbstractUser):
 
@@ -13,3 +15,38 @@ class User(AbstractUser):
 
     def get_absolute_url(self):
         return reverse("users:detail", kwargs={"username": self.username})
+
+    # Password hashing goes through fare.users.hashing, which can run it off the request thread.
+
+    def set_password(self, raw_password):
+        self.password = hashing.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        def setter(raw_password):
+            # the hash uses outdated parameters or algorithm, store the current one
+            self.set_password(raw_password)
+            self._password = None
+            self.save(update_fields=["password"])
+
+        return hashing.check_password(raw_password, self.password, setter)
+
+
+class DirectoryEntry(Model):
+    """
+    Read model of the user directory: one narrow row per non-admin user,
+    holding only what the directory shows
+
+    It is kept up to date by the User signals and by the bulk services, and can
+    be rebuilt from scratch with ``manage.py rebuild_user_directory``.
+    """
+
+    user = OneToOneField(User, on_delete=CASCADE, primary_key=True, related_name="directory_entry")
+    username = CharField(max_length=150, unique=True)
+    staff_member = BooleanField(default=False)
+
+    class Meta:
+        verbose_name_plural = "directory entries"
+
+    def __str__(self):
+        return self.username
@@ -0,0 +1,99 @@
+import base64
+import json
+
+from django.db.models import Q
+
+
+class KeysetPage:
+    """
+    A page of results fetched with keyset (seek) pagination
+
+    :attr object_list: the rows of the page
+    :type object_list: list
+    :attr next_cursor: opaque cursor pointing after the last row, None on the last page
+    :type next_cursor: string
+    :attr cursor: the cursor used to fetch this page, None on the first page
+    :type cursor: string
+    """
+
+    def __init__(self, object_list, next_cursor, cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset on an ordered pair of columns instead of OFFSET, so
+    fetching any page costs the same index range scan whatever its position
+
+    The last column must be unique to make the order total (usually the pk).
+
+    :attr keys: the ordering columns, e.g. ("username", "id")
+    :type keys: tuple
+    """
+
+    def __init__(self, queryset, per_page, keys=("username", "id")):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.keys = keys
+
+    @staticmethod
+    def encode_cursor(values):
+        raw = json.dumps(list(values), separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """
+        Return the key values stored in the cursor, or None if it is malformed
+        """
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        except (ValueError, TypeError):
+            return None
+        return values if isinstance(values, list) else None
+
+    def seek_filter(self, values):
+        """
+        Build the row-value comparison (k1, k2) > (v1, v2) as an OR of ANDs,
+        which every database backend can serve from a composite index
+        """
+        condition = Q()
+        for position, key in enumerate(self.keys):
+            step = Q(**{f"{key}__gt": values[position]})
+            for previous, value in zip(self.keys[:position], values[:position]):
+                step &= Q(**{previous: value})
+            condition |= step
+        return condition
+
+    def page(self, cursor=None):
+        queryset = self.queryset.order_by(*self.keys)
+        values = self.decode_cursor(cursor) if cursor else None
+        if values is not None and len(values) == len(self.keys):
+            queryset = queryset.filter(self.seek_filter(values))
+        else:
+            cursor = None
+
+        # one extra row tells whether a next page exists without a COUNT(*)
+        rows = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            last = rows[-1]
+            next_cursor = self.encode_cursor(getattr(last, key) for key in self.keys)
+
+        return KeysetPage(rows, next_cursor, cursor)
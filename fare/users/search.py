@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+
+User = get_user_model()
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+def search_filter(query):
+    """
+    Condition matching users whose username starts with the query or whose name contains it
+
+    Both lookups are case insensitive and served on PostgreSQL by the trigram
+    indexes of migration 0003, so neither needs a sequential scan.
+
+    :param query: text typed by the user
+    :type query: string
+    """
+    query = query.strip()
+    return Q(username__istartswith=query) | Q(name__icontains=query)
+
+
+def search_users(query, limit=DEFAULT_LIMIT, queryset=None):
+    """
+    Typeahead search over username and name, returning at most ``limit`` users
+
+    :param query: text typed by the user, an empty query matches nobody
+    :type query: string
+    :param limit: maximum number of results, capped at MAX_LIMIT
+    :type limit: int
+    :param queryset: users to search, all the non-admin users by default
+    :type queryset: QuerySet
+    """
+    if not query or not query.strip():
+        return User.objects.none()
+    if queryset is None:
+        queryset = User.objects.filter(is_superuser=False)
+    limit = max(1, min(limit, MAX_LIMIT))
+    return queryset.filter(search_filter(query)).order_by("username")[:limit]
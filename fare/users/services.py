@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from fare.users.cache import touch_users
+from fare.users.models import DirectoryEntry
+
+User = get_user_model()
+
+UPDATED = "updated"
+SUPERUSER = "superuser"
+NOT_FOUND = "not_found"
+
+
+@transaction.atomic(savepoint=False)
+def set_staff_member(usernames, staff_member):
+    """
+    Grant or revoke the staff_member permission of many users at once
+
+    The requested users are read with one SELECT and changed with one set-based
+    UPDATE (plus one on the directory read model); superusers are never changed,
+    as in ChangeStaffPermissionView. The SELECT locks the requested rows, so a
+    concurrent promotion to superuser waits for this transaction and the
+    outcomes reported are the ones written; the locks also keep concurrent
+    changes of the same users in the same order in the users table and in the
+    directory.
+
+    :param usernames: usernames of the users to change
+    :type usernames: iterable of strings
+    :param staff_member: new value of the permission
+    :type staff_member: bool
+    :return: the outcome for each requested username, one of UPDATED, SUPERUSER, NOT_FOUND
+    :rtype: dict
+    """
+    usernames = list(dict.fromkeys(usernames))
+    rows = (
+        User.objects.select_for_update()
+        .filter(username__in=usernames)
+        .values_list("username", "is_superuser", "pk")
+    )
+    superusers, pks = {}, []
+    for username, is_superuser, pk in rows:
+        superusers[username] = is_superuser
+        if not is_superuser:
+            pks.append(pk)
+
+    User.objects.filter(pk__in=pks).update(staff_member=staff_member)
+    DirectoryEntry.objects.filter(pk__in=pks).update(staff_member=staff_member)
+    # a queryset update sends no post_save, so the read model and the caches are updated here
+    touch_users(pks)
+    transaction.on_commit(lambda: touch_users(pks))
+
+    results = {}
+    for username in usernames:
+        if username not in superusers:
+            results[username] = NOT_FOUND
+        elif superusers[username]:
+            results[username] = SUPERUSER
+        else:
+            results[username] = UPDATED
+    return results
@@ -0,0 +1,250 @@
+"""
+Session engine keeping sessions in Redis, set SESSION_ENGINE = "fare.users.sessions"
+
+The sessions are stored as compact JSON, without the base64 and signature the
+database engine adds, under a key expiring with the session: an authenticated
+request costs a GET and no query. PostgreSQL is only involved when enabled:
+
+- SESSION_DB_FALLBACK: a session missing from Redis is read from the
+  django_session table and copied to Redis, and a session Redis cannot take is
+  written to the table, so switching engine (or losing Redis) signs nobody out
+- SESSION_WRITE_BEHIND: saved sessions are copied to the table by a Celery
+  task after the request, keeping the fallback up to date
+
+Without the fallback, a session Redis cannot read or write is lost: its
+visitor is signed out, but gets no error. A session Redis cannot delete is
+deleted by a Celery task retrying until Redis is back.
+"""
+import json
+import logging
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import CreateError, SessionBase
+from django.contrib.sessions.backends.db import SessionStore as DatabaseSessionStore
+from django.contrib.sessions.models import Session
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "session:"
+CLEANUP_CHUNK_SIZE = 5000
+
+
+class CompactSerializer:
+    """
+    JSON without whitespace, zlib compressed when that makes it smaller; the
+    first byte tells which
+    """
+
+    RAW = b"j"
+    COMPRESSED = b"z"
+    COMPRESS_MIN_LENGTH = 256
+
+    def dumps(self, obj):
+        data = json.dumps(obj, separators=(",", ":")).encode()
+        if len(data) >= self.COMPRESS_MIN_LENGTH:
+            compressed = zlib.compress(data)
+            if len(compressed) < len(data):
+                return self.COMPRESSED + compressed
+        return self.RAW + data
+
+    def loads(self, data):
+        data = zlib.decompress(data[1:]) if data[:1] == self.COMPRESSED else data[1:]
+        return json.loads(data.decode())
+
+
+def get_client():
+    return get_redis_connection(getattr(settings, "SESSION_REDIS_ALIAS", "default"))
+
+
+def db_fallback():
+    return getattr(settings, "SESSION_DB_FALLBACK", False)
+
+
+def write_behind():
+    return getattr(settings, "SESSION_WRITE_BEHIND", False)
+
+
+class SessionStore(SessionBase):
+
+    # SessionBase sets self.serializer from SESSION_SERIALIZER, used for the database rows
+    compact_serializer = CompactSerializer()
+
+    def load(self):
+        data = None
+        if self.session_key is not None:
+            try:
+                data = get_client().get(KEY_PREFIX + self.session_key)
+            except RedisError:
+                logger.warning("Cannot read the session from Redis", exc_info=True)
+
+        if data is not None:
+            try:
+                return self.compact_serializer.loads(data)
+            except ValueError:
+                logger.warning("Corrupted session %s", self.session_key)
+        elif self.session_key is not None and db_fallback():
+            session = self.load_from_database()
+            if session is not None:
+                return session
+
+        self._session_key = None
+        return {}
+
+    def load_from_database(self):
+        """
+        Read the session from the django_session table and copy it to Redis
+        """
+        store = DatabaseSessionStore(self.session_key)
+        row = store._get_session_from_db()
+        if row is None:
+            return None
+        session = store.decode(row.session_data)
+        ttl = int((row.expire_date - timezone.now()).total_seconds())
+        try:
+            get_client().set(KEY_PREFIX + self.session_key, self.compact_serializer.dumps(session), ex=max(ttl, 1))
+        except RedisError:
+            logger.warning("Cannot copy the session to Redis", exc_info=True)
+        return session
+
+    def save_to_database(self, session, must_create=False):
+        """
+        Write the session to the django_session table, when Redis cannot take it
+        """
+        defaults = {"session_data": DatabaseSessionStore().encode(session), "expire_date": self.get_expiry_date()}
+        if not must_create:
+            Session.objects.update_or_create(session_key=self.session_key, defaults=defaults)
+            return
+        try:
+            with transaction.atomic():
+                Session.objects.create(session_key=self.session_key, **defaults)
+        except IntegrityError:
+            raise CreateError
+
+    def exists(self, session_key):
+        try:
+            if get_client().exists(KEY_PREFIX + session_key):
+                return True
+        except RedisError:
+            logger.warning("Cannot check the session in Redis", exc_info=True)
+        return db_fallback() and Session.objects.filter(session_key=session_key).exists()
+
+    def create(self):
+        while True:
+            self._session_key = self._get_new_session_key()
+            try:
+                self.save(must_create=True)
+            except CreateError:
+                continue
+            self.modified = True
+            return
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        session = self._get_session(no_load=must_create)
+        data = self.compact_serializer.dumps(session)
+        try:
+            stored = get_client().set(KEY_PREFIX + self.session_key, data, ex=self.get_expiry_age(), nx=must_create)
+        except RedisError:
+            logger.warning("Cannot write the session to Redis", exc_info=True)
+            if db_fallback():
+                # no write behind: it would find nothing in Redis and drop the row
+                self.save_to_database(session, must_create)
+            return
+        if must_create and not stored:
+            raise CreateError
+        if write_behind():
+            from fare.users.tasks import write_session_behind
+
+            session_key = self.session_key
+            transaction.on_commit(lambda: write_session_behind.delay(session_key))
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        try:
+            delete_from_redis(session_key)
+        except RedisError:
+            logger.warning("Cannot delete the session from Redis, retrying in a task", exc_info=True)
+            from fare.users.tasks import delete_session_from_redis
+
+            # the session would be valid again once Redis is back; if the task
+            # cannot be queued either, the error fails the logout
+            delete_session_from_redis.delay(session_key)
+        # the database copy would bring the session back through the fallback
+        if db_fallback() or write_behind():
+            Session.objects.filter(session_key=session_key).delete()
+
+    @classmethod
+    def clear_expired(cls):
+        # Redis expires the keys by itself, only the database copies are left
+        clear_expired_database_sessions()
+
+
+def delete_from_redis(session_key):
+    get_client().delete(KEY_PREFIX + session_key)
+
+
+def clear_expired_database_sessions(chunk_size=CLEANUP_CHUNK_SIZE):
+    """
+    Delete the expired rows of the django_session table a chunk at a time, so
+    the cleanup never holds a long lock on it
+    """
+    deleted = 0
+    while True:
+        keys = list(
+            Session.objects.filter(expire_date__lt=timezone.now()).values_list("session_key", flat=True)[:chunk_size]
+        )
+        if not keys:
+            return deleted
+        deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+
+
+def write_to_database(session_key):
+    """
+    Copy a session from Redis to the django_session table, or drop the copy
+    if the session is gone
+    """
+    client = get_client()
+    key = KEY_PREFIX + session_key
+    data, ttl = client.get(key), client.ttl(key)
+    if data is None or ttl is None or ttl < 0:
+        Session.objects.filter(session_key=session_key).delete()
+        return
+    Session.objects.update_or_create(
+        session_key=session_key,
+        defaults={
+            "session_data": DatabaseSessionStore().encode(CompactSerializer().loads(data)),
+            "expire_date": timezone.now() + timedelta(seconds=ttl),
+        },
+    )
+
+
+def copy_database_sessions(chunk_size=1000):
+    """
+    Copy the unexpired sessions of the django_session table to Redis
+
+    :return: the number of sessions copied
+    """
+    client = get_client()
+    now = timezone.now()
+    store = DatabaseSessionStore()
+    serializer = CompactSerializer()
+    copied = 0
+    pipeline = client.pipeline(transaction=False)
+    for row in Session.objects.filter(expire_date__gt=now).iterator(chunk_size=chunk_size):
+        ttl = int((row.expire_date - now).total_seconds())
+        pipeline.set(KEY_PREFIX + row.session_key, serializer.dumps(store.decode(row.session_data)), ex=max(ttl, 1))
+        copied += 1
+        if copied % chunk_size == 0:
+            pipeline.execute()
+    pipeline.execute()
+    return copied
@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from fare.users.availability import get_username_filter
+from fare.users.cache import touch_user, touch_users
+from fare.users.directory import sync_entry
+
+User = get_user_model()
+
+
+def only_last_login(update_fields):
+    # logging in only updates last_login, which neither the cache nor the directory show
+    return bool(update_fields) and set(update_fields) == {"last_login"}
+
+
+@receiver(post_save, sender=User)
+def sync_directory_entry(sender, instance, update_fields=None, **kwargs):
+    if not only_last_login(update_fields):
+        sync_entry(instance)
+
+
+@receiver(post_save, sender=User)
+def add_to_username_filter(sender, instance, update_fields=None, **kwargs):
+    # deleted usernames are not removed, the database confirms every "maybe taken"
+    if only_last_login(update_fields):
+        return
+    username = instance.username
+    get_username_filter().add(username)
+    # a rebuild reading the table before the commit would miss the username
+    transaction.on_commit(lambda: get_username_filter().add(username))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, instance, update_fields=None, **kwargs):
+    if only_last_login(update_fields):
+        return
+    pk = instance.pk
+    touch_user(pk)
+    # with ATOMIC_REQUESTS a concurrent request may cache the old row until the
+    # transaction commits, so the stamp is bumped once more after the commit
+    transaction.on_commit(lambda: touch_user(pk))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_user_permissions(sender, instance, action, pk_set, **kwargs):
+    # the cached request.user must not keep the groups and permissions it was loaded with
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if isinstance(instance, User):
+        pks = [instance.pk]
+    elif sender is Group.permissions.through:
+        groups = [instance.pk] if isinstance(instance, Group) else pk_set
+        if groups is None:
+            groups = instance.group_set.values_list("pk", flat=True)
+        pks = list(User.objects.filter(groups__in=groups).values_list("pk", flat=True))
+    elif pk_set is not None:
+        # users added to a group or given a permission, from the group or permission side
+        pks = list(pk_set)
+    else:
+        pks = list(instance.user_set.values_list("pk", flat=True))
+    touch_users(pks)
+    transaction.on_commit(lambda: touch_users(pks))
@@ -0,0 +1,88 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hashers_by_algorithm
+from redis.exceptions import RedisError
+
+from fare.taskapp.celery import app
+from fare.taskapp.tasks import retry_countdown
+from fare.users.availability import get_username_filter
+from fare.users.cache import touch_users
+from fare.users.sessions import delete_from_redis, write_to_database
+
+User = get_user_model()
+
+
+def get_wrapping_hashers():
+    """
+    Return the installed wrapping hashers keyed by the algorithm they wrap
+    """
+    return {
+        hasher.inner_hasher_class.algorithm: hasher
+        for hasher in get_hashers_by_algorithm().values()
+        if hasattr(hasher, "inner_hasher_class")
+    }
+
+
+@app.task(ignore_result=True)
+def upgrade_legacy_password_hashes(batch_size=200, after_pk=0):
+    """
+    Wrap the legacy PBKDF2 hashes in Argon2, a batch at a time
+
+    Each batch re-enqueues the next one, so a worker is never busy for long.
+    BCrypt hashes cannot be wrapped and are upgraded on the next login.
+    Wrapping changes the stored hash, which signs the affected users out.
+    """
+    wrappers = get_wrapping_hashers()
+    if not wrappers:
+        return
+
+    legacy = User.objects.none()
+    for algorithm in wrappers:
+        legacy |= User.objects.filter(password__startswith=f"{algorithm}$")
+    users = list(legacy.filter(pk__gt=after_pk).order_by("pk").only("pk", "password")[:batch_size])
+
+    for user in users:
+        user.password = wrappers[user.password.split("$", 1)[0]].wrap(user.password)
+    User.objects.bulk_update(users, ["password"])
+    touch_users([user.pk for user in users])
+
+    if len(users) == batch_size:
+        upgrade_legacy_password_hashes.delay(batch_size, users[-1].pk)
+
+
+@app.task(ignore_result=True)
+def write_session_behind(session_key):
+    write_to_database(session_key)
+
+
+@app.task(ignore_result=True)
+def clear_expired_sessions():
+    """
+    Delete the expired sessions of the configured engine, as the clearsessions command does
+    """
+    store_class = getattr(import_module(settings.SESSION_ENGINE), "SessionStore")
+    store_class.clear_expired()
+
+
+@app.task(bind=True, ignore_result=True, max_retries=None)
+def delete_session_from_redis(self, session_key):
+    """
+    Delete a session Redis could not delete at logout, retrying with a growing delay
+    """
+    try:
+        delete_from_redis(session_key)
+    except RedisError as exc:
+        if self.request.is_eager:
+            # no worker to schedule the retry: the caller gets the error
+            raise
+        raise self.retry(exc=exc, countdown=retry_countdown(self.request.retries))
+
+
+@app.task(ignore_result=True)
+def rebuild_username_filter(token):
+    """
+    Rebuild the username filter under the build lock taken by request_rebuild
+    """
+    get_username_filter().rebuild(token)
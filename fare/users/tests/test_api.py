@@ -0,0 +1,97 @@
+import pytest
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from fare.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+User = get_user_model()
+
+
+def list_url():
+    return reverse("api:user-list", kwargs={"version": "v1"})
+
+
+def detail_url(username):
+    return reverse("api:user-detail", kwargs={"version": "v1", "username": username})
+
+
+def test_anonymous_is_rejected(client):
+    assert client.get(list_url()).status_code == 403
+
+
+class TestUserList:
+
+    def test_superusers_are_not_listed(self, client, user: settings.AUTH_USER_MODEL):
+        UserFactory(is_superuser=True)
+        client.force_login(user)
+
+        results = client.get(list_url()).json()["results"]
+
+        assert [result["username"] for result in results] == [user.username]
+
+    def test_cursor_pagination_walks_every_user(self, client, user: settings.AUTH_USER_MODEL):
+        User.objects.bulk_create(User(username=f"student{i:02}") for i in range(25))
+        client.force_login(user)
+
+        seen, url = [], list_url() + "?page_size=10"
+        while url:
+            page = client.get(url).json()
+            seen += [result["username"] for result in page["results"]]
+            url = page["next"]
+
+        assert seen == sorted(User.objects.values_list("username", flat=True))
+
+    def test_sparse_fieldset_shrinks_the_select(self, client, user: settings.AUTH_USER_MODEL):
+        client.force_login(user)
+
+        with CaptureQueriesContext(connection) as queries:
+            results = client.get(list_url(), {"fields": "name,unknown"}).json()["results"]
+
+        assert results == [{"name": user.name}]
+        select = next(query["sql"] for query in queries if "ORDER BY" in query["sql"])
+        assert '"users_user"."email"' not in select
+        assert '"users_user"."staff_member"' not in select
+
+    def test_page_is_one_query(self, client, user: settings.AUTH_USER_MODEL):
+        User.objects.bulk_create(User(username=f"student{i:03}") for i in range(150))
+        client.force_login(user)
+
+        with CaptureQueriesContext(connection) as queries:
+            assert len(client.get(list_url()).json()["results"]) == 100
+
+        assert sum('FROM "users_user"' in query["sql"] for query in queries) == 2  # request.user + page
+
+
+class TestUserUpdate:
+
+    def test_non_staff_cannot_change_permission(self, client, user: settings.AUTH_USER_MODEL):
+        target = UserFactory()
+        client.force_login(user)
+
+        response = client.patch(detail_url(target.username), {"staff_member": True}, content_type="application/json")
+
+        assert response.status_code == 403
+        target.refresh_from_db()
+        assert not target.staff_member
+
+    def test_staff_changes_permission(self, client):
+        target = UserFactory()
+        client.force_login(UserFactory(staff_member=True))
+
+        response = client.patch(detail_url(target.username), {"staff_member": True}, content_type="application/json")
+
+        assert response.status_code == 200
+        target.refresh_from_db()
+        assert target.staff_member
+
+    def test_superuser_cannot_be_changed(self, client):
+        target = UserFactory(is_superuser=True)
+        client.force_login(UserFactory(staff_member=True))
+
+        response = client.patch(detail_url(target.username), {"staff_member": True}, content_type="application/json")
+
+        assert response.status_code == 404
@@ -0,0 +1,225 @@
+import pytest
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from redis.exceptions import ConnectionError
+
+from fare.users import availability
+from fare.users.adapters import AccountAdapter
+from fare.users.availability import LocalBitmap, RedisBitmap, UsernameFilter, is_username_taken
+from fare.users.importer import import_users
+from fare.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+class FakePipeline:
+
+    def __init__(self, client):
+        self.client = client
+        self.queued = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.queued.append((getattr(self.client, name), args))
+
+    def execute(self):
+        return [command(*args) for command, args in self.queued]
+
+
+class FakeRedis:
+    """
+    The Redis commands of RedisBitmap
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def setbit(self, key, position, value):
+        self.data.setdefault(key, set()).add(position)
+
+    def getbit(self, key, position):
+        return int(position in self.data.get(key, ()))
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def rename(self, key, new_key):
+        self.data[new_key] = self.data.pop(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def eval(self, script, numkeys, *args):
+        if script == availability.SET_BITS_SCRIPT:
+            key, build_key, lock_key, *positions = args
+            for target in (key, build_key) if lock_key in self.data else (key,):
+                self.data.setdefault(target, set()).update(positions)
+        elif self.data.get(args[0]) == args[1]:
+            del self.data[args[0]]
+
+
+@pytest.fixture(autouse=True)
+def username_filter(monkeypatch):
+    username_filter = UsernameFilter(LocalBitmap(4096), 4096)
+    monkeypatch.setattr(availability, "_filter", username_filter)
+    return username_filter
+
+
+class TestUsernameFilter:
+
+    def test_is_built_from_the_users_table_on_first_use(self, username_filter):
+        UserFactory(username="ada")
+        username_filter.bitmap.clear()
+
+        assert username_filter.might_contain("ADA")
+        assert is_username_taken("ada")
+
+    def test_new_usernames_skip_the_database(self, username_filter):
+        UserFactory(username="ada")
+        username_filter.rebuild()
+
+        with CaptureQueriesContext(connection) as queries:
+            free = [name for name in (f"student{i}" for i in range(50)) if not is_username_taken(name)]
+
+        # false positives are confirmed by a query, everything else costs none
+        assert len(queries) == 50 - len(free)
+        assert len(free) >= 45
+
+    def test_signals_and_imports_keep_it_in_sync(self, username_filter):
+        username_filter.rebuild()
+        user = UserFactory(username="ada")
+        user.username = "lovelace"
+        user.save()
+        import_users([{"username": "grace", "email": "", "name": "", "password": "x"}], workers=0)
+
+        assert all(username_filter.might_contain(name) for name in ("ada", "lovelace", "grace"))
+        assert is_username_taken("lovelace") and is_username_taken("grace")
+        assert not is_username_taken("ada")
+
+    def test_case_sensitivity(self):
+        UserFactory(username="ada")
+
+        assert not is_username_taken("ADA")
+        assert is_username_taken("ADA", case_sensitive=False)
+
+    def test_answers_from_the_database_until_built(self, username_filter):
+        UserFactory(username="ada")
+        username_filter.bitmap.clear()
+        # a rebuild is running elsewhere
+        username_filter.bitmap.acquire_build()
+
+        assert username_filter.might_contain("grace")
+        assert not is_username_taken("grace")
+        assert username_filter.bitmap.get_bits([availability.READY_BIT]) == [False]
+
+    @pytest.mark.parametrize("bitmap", ["local", "redis"])
+    def test_rebuild_keeps_the_usernames_added_meanwhile(self, username_filter, bitmap, monkeypatch):
+        if bitmap == "redis":
+            username_filter.bitmap = RedisBitmap(FakeRedis())
+        UserFactory(username="ada")
+        iter_positions = username_filter._iter_positions
+
+        def created_during_the_build():
+            yield from iter_positions()
+            username_filter.add("grace")
+
+        monkeypatch.setattr(username_filter, "_iter_positions", created_during_the_build)
+
+        assert username_filter.rebuild()
+        assert username_filter.might_contain("ada") and username_filter.might_contain("grace")
+        assert username_filter.bitmap.get_bits([availability.READY_BIT]) == [True]
+
+    def test_one_rebuild_at_a_time(self, username_filter):
+        token = username_filter.bitmap.acquire_build()
+
+        assert not username_filter.rebuild()
+        with pytest.raises(CommandError):
+            call_command("rebuild_username_filter")
+
+        username_filter.bitmap.release_build(token)
+        assert username_filter.rebuild()
+
+    def test_failed_redis_build_keeps_the_filter_unready(self, username_filter, monkeypatch):
+        client = FakeRedis()
+        username_filter.bitmap = RedisBitmap(client)
+
+        def unreachable(*args):
+            raise ConnectionError()
+
+        monkeypatch.setattr(client, "rename", unreachable)
+
+        assert not username_filter.rebuild()
+        assert username_filter.might_contain("anything")
+        assert username_filter.bitmap.lock_key not in client.data
+
+    def test_failed_update_is_not_trusted_until_the_filter_is_dropped(self, username_filter, monkeypatch):
+        client = FakeRedis()
+        username_filter.bitmap = RedisBitmap(client)
+        username_filter.rebuild()
+
+        def unreachable(*args):
+            raise ConnectionError()
+
+        monkeypatch.setattr(client, "eval", unreachable)
+        monkeypatch.setattr(client, "delete", unreachable)
+        username_filter.add("ada")
+
+        assert username_filter.might_contain("ada")
+        assert username_filter.bitmap.key in client.data
+
+        monkeypatch.undo()
+        assert username_filter.might_contain("ada")
+        assert username_filter.bitmap.key not in client.data
+        assert not username_filter.bitmap.stale
+
+    def test_unreachable_redis_falls_back_to_the_database(self):
+        class BrokenPipeline:
+            def __getattr__(self, name):
+                return lambda *args: None
+
+            def execute(self):
+                raise ConnectionError()
+
+        class BrokenClient:
+            pipeline = delete = lambda self, *args, **kwargs: BrokenPipeline()
+
+        username_filter = UsernameFilter(RedisBitmap(BrokenClient()), 4096)
+
+        assert username_filter.might_contain("anything")
+
+
+class TestUsernameAvailabilityView:
+
+    def test_answers_anonymous_requests(self, client):
+        UserFactory(username="ada")
+        url = reverse("users:available")
+
+        assert client.get(url, {"username": "Ada"}).json() == {"username": "Ada", "available": False}
+        assert client.get(url, {"username": "grace"}).json() == {"username": "grace", "available": True}
+        assert client.get(url).status_code == 400
+
+
+class TestAccountAdapter:
+
+    def test_a_username_missing_from_the_filter_is_still_checked(self, username_filter, rf, monkeypatch):
+        username_filter.rebuild()
+        # e.g. created by another process whose filter update is not visible yet
+        monkeypatch.setattr(username_filter, "add", lambda *usernames: None)
+        UserFactory(username="ada")
+        adapter = AccountAdapter(rf.get("/"))
+
+        assert not username_filter.might_contain("ada")
+        assert adapter.clean_username("grace") == "grace"
+        with pytest.raises(ValidationError):
+            adapter.clean_username("Ada")
@@ -0,0 +1,86 @@
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from fare.users import views
+from fare.users.cache import get_user_stamp
+from fare.users.services import set_staff_member
+from fare.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def test_stamp_moves_on_save_and_delete(user: settings.AUTH_USER_MODEL):
+    pk = user.pk
+    first = get_user_stamp(pk)
+    assert get_user_stamp(pk) == first
+
+    user.save()
+    second = get_user_stamp(pk)
+    assert second != first
+
+    user.delete()
+    assert get_user_stamp(pk) != second
+
+
+def test_bulk_permission_change_moves_stamp(user: settings.AUTH_USER_MODEL):
+    stamp = get_user_stamp(user.pk)
+
+    set_staff_member([user.username], True)
+
+    assert get_user_stamp(user.pk) != stamp
+
+
+@pytest.fixture
+def profile_renders(monkeypatch):
+    renders = []
+
+    def render(template_name, context=None, request=None, using=None):
+        if template_name == views.UserDetailView.profile_template_name:
+            renders.append(context["object"].pk)
+        return render_to_string(template_name, context, request, using)
+
+    monkeypatch.setattr(views, "render_to_string", render)
+    return renders
+
+
+class TestUserDetailFragmentCache:
+
+    def test_profile_is_rendered_once_per_version(self, client, user: settings.AUTH_USER_MODEL, profile_renders):
+        target = UserFactory(name="Ada Lovelace")
+        client.force_login(user)
+        url = reverse("users:detail", kwargs={"username": target.username})
+
+        client.get(url)
+        response = client.get(url)
+
+        assert "Ada Lovelace" in response.content.decode()
+        assert profile_renders == [target.pk]
+
+        target.name = "Augusta Ada King"
+        target.save()
+        response = client.get(url)
+
+        assert "Augusta Ada King" in response.content.decode()
+        assert profile_renders == [target.pk, target.pk]
+
+    def test_owner_actions_are_not_cached(self, client, user: settings.AUTH_USER_MODEL, profile_renders):
+        url = reverse("users:detail", kwargs={"username": user.username})
+        update_url = reverse("users:update")
+
+        client.force_login(user)
+        assert update_url in client.get(url).content.decode()
+
+        client.force_login(UserFactory())
+        response = client.get(url)
+        assert update_url not in response.content.decode()
+        assert profile_renders == [user.pk]
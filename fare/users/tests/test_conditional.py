@@ -0,0 +1,136 @@
+import time
+
+import pytest
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from fare.users.conditional import make_validators
+from fare.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def user_selects(queries, user):
+    return [query for query in queries if user.username in query["sql"]]
+
+
+def test_last_modified_waits_for_the_second_to_end():
+    now = time.time()
+
+    assert make_validators([repr(now - 5)])[1] == int(now - 5)
+    assert make_validators([repr(now - 5), repr(now)])[1] is None
+
+
+class TestUserDetailConditionalGet:
+
+    def test_revalidation_skips_the_lookup(self, client, user: settings.AUTH_USER_MODEL):
+        target = UserFactory()
+        client.force_login(user)
+        url = reverse("users:detail", kwargs={"username": target.username})
+
+        response = client.get(url)
+        assert response.status_code == 200
+        etag = response["ETag"]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == 304
+        assert user_selects(queries, target) == []
+
+    def test_pending_messages_get_the_full_page(self, client, rf, user: settings.AUTH_USER_MODEL):
+        client.force_login(user)
+        url = reverse("users:detail", kwargs={"username": user.username})
+        etag = client.get(url)["ETag"]
+
+        # as allauth does after signing in, which changes nothing the validators depend on
+        storage = CookieStorage(rf.get("/"))
+        storage.add(messages.SUCCESS, "Successfully signed in.")
+        queued = HttpResponse()
+        storage.update(queued)
+        client.cookies.update(queued.cookies)
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == 200
+        assert "ETag" not in response
+        assert b"Successfully signed in." in response.content
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    def test_change_of_the_user_invalidates(self, client, user: settings.AUTH_USER_MODEL):
+        target = UserFactory()
+        client.force_login(user)
+        url = reverse("users:detail", kwargs={"username": target.username})
+        etag = client.get(url)["ETag"]
+
+        target.name = "Someone else"
+        target.save()
+
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    def test_validators_depend_on_the_viewer(self, client, user: settings.AUTH_USER_MODEL):
+        url = reverse("users:detail", kwargs={"username": user.username})
+        client.force_login(user)
+        etag = client.get(url)["ETag"]
+
+        client.force_login(UserFactory())
+
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+class TestUserListConditionalGet:
+
+    def test_any_user_change_invalidates(self, client, user: settings.AUTH_USER_MODEL):
+        client.force_login(user)
+        url = reverse("users:list")
+        etag = client.get(url)["ETag"]
+
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+        UserFactory()
+
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    def test_validators_depend_on_the_query_string(self, client, user: settings.AUTH_USER_MODEL):
+        client.force_login(user)
+        etag = client.get(reverse("users:list"))["ETag"]
+
+        response = client.get(reverse("users:list"), {"q": "someone"}, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == 200
+
+
+class TestApiConditionalGet:
+
+    def test_list_and_detail_revalidate(self, client, user: settings.AUTH_USER_MODEL):
+        client.force_login(user)
+        for url in [
+            reverse("api:user-list", kwargs={"version": "v1"}),
+            reverse("api:user-detail", kwargs={"version": "v1", "username": user.username}),
+        ]:
+            etag = client.get(url)["ETag"]
+            assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    def test_permission_change_invalidates_detail(self, client, user: settings.AUTH_USER_MODEL):
+        client.force_login(user)
+        url = reverse("api:user-detail", kwargs={"version": "v1", "username": user.username})
+        etag = client.get(url)["ETag"]
+
+        user.staff_member = True
+        user.save()
+
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response.json()["staff_member"]
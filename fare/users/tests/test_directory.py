@@ -0,0 +1,128 @@
+import random
+import threading
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+
+from fare.users.models import DirectoryEntry
+from fare.users.services import set_staff_member
+from fare.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+User = get_user_model()
+
+
+def assert_directory_consistent():
+    expected = set(User.objects.filter(is_superuser=False).values_list("pk", "username", "staff_member"))
+    assert set(DirectoryEntry.objects.values_list("pk", "username", "staff_member")) == expected
+
+
+class TestDirectorySync:
+
+    def test_follows_user_changes(self):
+        user = UserFactory()
+        assert_directory_consistent()
+
+        user.username = "renamed"
+        user.staff_member = True
+        user.save()
+        assert_directory_consistent()
+
+        user.is_superuser = True
+        user.save()
+        assert not DirectoryEntry.objects.exists()
+
+        user.is_superuser = False
+        user.save()
+        assert_directory_consistent()
+
+        user.delete()
+        assert not DirectoryEntry.objects.exists()
+
+    def test_login_does_not_write(self, django_assert_num_queries):
+        user = UserFactory()
+
+        with django_assert_num_queries(1):
+            user.save(update_fields=["last_login"])
+
+    def test_interleaved_permission_changes(self, client):
+        """
+        The changes of test_concurrent_permission_changes, one after the other
+        """
+        target = UserFactory()
+        stale_copy = User.objects.get(pk=target.pk)
+
+        set_staff_member([target.username], True)
+        assert_directory_consistent()
+
+        client.force_login(UserFactory(staff_member=True))
+        client.patch(
+            reverse("api:user-detail", kwargs={"version": "v1", "username": target.username}),
+            {"staff_member": False},
+            content_type="application/json",
+        )
+        assert_directory_consistent()
+
+        client.post(reverse("users:staff_permission", kwargs={"username": target.username}), {"staff_member": "on"})
+        assert_directory_consistent()
+
+        # a write based on a stale copy wins, and the directory follows it
+        stale_copy.save()
+        assert_directory_consistent()
+        assert not DirectoryEntry.objects.get(pk=target.pk).staff_member
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="SQLite serializes the writes")
+def test_concurrent_permission_changes():
+    """
+    Threads, each with its own connection, change the same users at once
+    through the bulk service, fresh saves and saves of stale copies
+    """
+    targets = UserFactory.create_batch(3)
+    start = threading.Barrier(6)
+    errors = []
+
+    def change(seed):
+        chooser = random.Random(seed)
+        try:
+            stale_copies = {user.pk: User.objects.get(pk=user.pk) for user in targets}
+            start.wait()
+            for _ in range(30):
+                target = chooser.choice(targets)
+                action = chooser.randrange(3)
+                if action == 0:
+                    set_staff_member([target.username], chooser.random() < 0.5)
+                elif action == 1:
+                    fresh = User.objects.get(pk=target.pk)
+                    fresh.staff_member = not fresh.staff_member
+                    fresh.save()
+                else:
+                    stale_copies[target.pk].save()
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=change, args=(seed,)) for seed in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert_directory_consistent()
+
+
+def test_rebuild_command():
+    users = UserFactory.create_batch(5)
+    UserFactory(is_superuser=True)
+    DirectoryEntry.objects.filter(pk=users[0].pk).delete()
+    DirectoryEntry.objects.filter(pk=users[1].pk).update(staff_member=True)
+
+    call_command("rebuild_user_directory", chunk_size=2)
+
+    assert_directory_consistent()
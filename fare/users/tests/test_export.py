@@ -0,0 +1,73 @@
+import csv
+import io
+import json
+
+import pytest
+from django.conf import settings
+from django.core.management import call_command
+from django.urls import reverse
+
+from fare.users.export import EXPORT_FIELDS
+from fare.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+class TestUserExportView:
+
+    def test_non_staff_is_redirected(self, client, user: settings.AUTH_USER_MODEL):
+        client.force_login(user)
+
+        response = client.get(reverse("users:export"))
+
+        assert response.status_code == 302
+        assert response.url == reverse("home")
+
+    def test_csv_is_streamed(self, client):
+        staff = UserFactory(staff_member=True)
+        UserFactory.create_batch(3)
+        UserFactory(is_superuser=True)
+        client.force_login(staff)
+
+        response = client.get(reverse("users:export"))
+
+        assert response.streaming
+        assert response["Content-Type"] == "text/csv"
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+        assert rows[0] == EXPORT_FIELDS
+        assert len(rows) == 1 + 4
+
+    def test_csv_cells_are_not_formulas(self, client):
+        staff = UserFactory(staff_member=True, name="=HYPERLINK(\"http://evil.example\")")
+        UserFactory(username="-ada", name="+1 555")
+        UserFactory(name="@SUM(A1)")
+        UserFactory(name="\tindented")
+        client.force_login(staff)
+
+        response = client.get(reverse("users:export"))
+
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+        names = {row[EXPORT_FIELDS.index("name")] for row in rows[1:]}
+        assert names == {"'+1 555", "'=HYPERLINK(\"http://evil.example\")", "'@SUM(A1)", "'\tindented"}
+        assert "'-ada" in {row[EXPORT_FIELDS.index("username")] for row in rows[1:]}
+
+    def test_jsonl(self, client):
+        staff = UserFactory(staff_member=True, name="Ada Lovelace")
+        client.force_login(staff)
+
+        response = client.get(reverse("users:export"), {"format": "jsonl"})
+
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        record = json.loads(lines[0])
+        assert record["username"] == staff.username
+        assert record["name"] == "Ada Lovelace"
+        assert record["staff_member"] is True
+
+
+def test_export_command(tmpdir):
+    UserFactory.create_batch(5)
+    output = tmpdir.join("users.jsonl")
+
+    call_command("export_users", format="jsonl", output=str(output), chunk_size=2)
+
+    assert len(output.readlines()) == 5
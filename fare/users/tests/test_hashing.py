@@ -0,0 +1,126 @@
+import threading
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, identify_hasher
+from django.test import RequestFactory
+
+from fare.users import hashing
+from fare.users.hashers import Argon2WrappedPBKDF2PasswordHasher
+from fare.users.middleware import PasswordHashingBusyMiddleware
+from fare.users.tasks import upgrade_legacy_password_hashes
+from fare.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+User = get_user_model()
+
+
+@pytest.fixture
+def argon2_hashers(settings):
+    settings.PASSWORD_HASHERS = [
+        "django.contrib.auth.hashers.Argon2PasswordHasher",
+        "fare.users.hashers.Argon2WrappedPBKDF2PasswordHasher",
+        "fare.users.hashers.Argon2WrappedPBKDF2SHA1PasswordHasher",
+        "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    ]
+
+
+def legacy_hash(password):
+    return PBKDF2PasswordHasher().encode(password, "legacysalt", iterations=1000)
+
+
+class TestHashingPool:
+
+    def test_inline_by_default(self):
+        encoded = hashing.make_password("s3cret")
+
+        assert hashing.get_pool() is None
+        assert hashing.check_password("s3cret", encoded)
+        assert not hashing.check_password("wrong", encoded)
+
+    def test_pool_hashes_and_verifies(self, settings):
+        settings.PASSWORD_HASHING_POOL_SIZE = 1
+        user = UserFactory.build()
+
+        user.set_password("s3cret")
+
+        assert hashing.get_pool() is not None
+        assert user.check_password("s3cret")
+        assert not user.check_password("wrong")
+
+    def test_admission_control_rejects_when_full(self, settings):
+        settings.PASSWORD_HASHING_POOL_SIZE = 1
+        settings.PASSWORD_HASHING_MAX_PENDING = 1
+        settings.PASSWORD_HASHING_ADMISSION_TIMEOUT = 0.01
+        pool = hashing.get_pool()
+        pool.run(hashing.make_password, None)
+        _, _, slots = pool._ensure_started()
+        slots.acquire()
+        try:
+            with pytest.raises(hashing.PasswordHashingBusy):
+                hashing.make_password("s3cret")
+        finally:
+            slots.release()
+
+    def test_busy_is_answered_with_503(self, request_factory: RequestFactory):
+        middleware = PasswordHashingBusyMiddleware(lambda request: None)
+
+        response = middleware.process_exception(request_factory.post("/accounts/login/"), hashing.PasswordHashingBusy())
+
+        assert response.status_code == 503
+        assert response["Retry-After"]
+
+    def test_concurrent_checks(self, settings):
+        settings.PASSWORD_HASHING_POOL_SIZE = 2
+        encoded = hashing.make_password("s3cret")
+        results = []
+
+        threads = [
+            threading.Thread(target=lambda: results.append(hashing.check_password("s3cret", encoded)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == [True] * 8
+
+
+@pytest.mark.usefixtures("argon2_hashers")
+class TestLegacyHashUpgrade:
+
+    def test_wrapped_hash_verifies_the_raw_password(self):
+        wrapped = Argon2WrappedPBKDF2PasswordHasher().wrap(legacy_hash("s3cret"))
+
+        assert identify_hasher(wrapped).algorithm == "argon2_pbkdf2_sha256"
+        assert hashing.check_password("s3cret", wrapped)
+        assert not hashing.check_password("wrong", wrapped)
+
+    def test_task_wraps_legacy_hashes_in_batches(self):
+        legacy = [UserFactory(password="") for _ in range(3)]
+        User.objects.filter(pk__in=[user.pk for user in legacy]).update(password=legacy_hash("s3cret"))
+        current = UserFactory()
+        current.set_password("s3cret")
+        current.save()
+
+        # the first batch enqueues the next one, run eagerly under the test settings
+        upgrade_legacy_password_hashes.delay(batch_size=2)
+
+        for user in legacy:
+            user.refresh_from_db()
+            assert user.password.startswith("argon2_pbkdf2_sha256$")
+            assert user.check_password("s3cret")
+        current.refresh_from_db()
+        assert current.password.startswith("argon2$")
+
+    def test_login_upgrades_to_plain_argon2(self):
+        user = UserFactory()
+        User.objects.filter(pk=user.pk).update(
+            password=Argon2WrappedPBKDF2PasswordHasher().wrap(legacy_hash("s3cret"))
+        )
+        user.refresh_from_db()
+
+        assert user.check_password("s3cret")
+        user.refresh_from_db()
+        assert user.password.startswith("argon2$")
@@ -0,0 +1,111 @@
+import csv
+
+import pytest
+from allauth.account.models import EmailAddress
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError
+
+from fare.users import importer
+from fare.users.importer import CREATED, DUPLICATE_EMAIL, DUPLICATE_USERNAME, FAILED, INVALID, import_users
+from fare.users.models import DirectoryEntry
+from fare.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+User = get_user_model()
+
+
+def rows(count, start=0):
+    return [
+        {"username": f"student{i}", "email": f"student{i}@example.com", "name": f"Student {i}", "password": "s3cret!"}
+        for i in range(start, start + count)
+    ]
+
+
+class TestImportUsers:
+
+    def test_creates_users_email_addresses_and_directory_entries(self):
+        stats, created = import_users(rows(5), batch_size=2, workers=0)
+
+        assert stats.results[CREATED] == 5
+        assert len(created) == 5
+        user = User.objects.get(username="student3")
+        assert user.check_password("s3cret!")
+        assert user.name == "Student 3"
+        assert EmailAddress.objects.get(user=user).primary
+        assert DirectoryEntry.objects.count() == 5
+
+    def test_skips_duplicates_and_invalid_rows(self):
+        UserFactory(username="student0")
+        import_users([{"username": "taken", "email": "student1@example.com"}], workers=0)
+        source = rows(3) + rows(1, start=2) + [{"username": "not valid!"}, {"email": "x@example.com"}]
+
+        stats, created = import_users(source, workers=0)
+
+        assert stats.results == {CREATED: 1, DUPLICATE_USERNAME: 2, DUPLICATE_EMAIL: 1, INVALID: 2, FAILED: 0}
+
+    def test_usernames_differing_in_case_are_duplicates(self):
+        UserFactory(username="alice")
+        source = [{"username": "Alice"}, {"username": "Grace"}, {"username": "GRACE"}]
+
+        stats, created = import_users(source, workers=0)
+
+        assert stats.results[CREATED] == 1 and stats.results[DUPLICATE_USERNAME] == 2
+        assert sorted(User.objects.values_list("username", flat=True)) == ["Grace", "alice"]
+
+    def test_a_failing_batch_is_reported_and_the_others_imported(self, monkeypatch):
+        def clashing_insert(accepted, passwords, verified_email):
+            if accepted[0]["username"] == "student0":
+                raise IntegrityError("UNIQUE constraint failed: users_user.username")
+            return insert_batch(accepted, passwords, verified_email)
+
+        insert_batch = importer._insert_batch
+        monkeypatch.setattr(importer, "_insert_batch", clashing_insert)
+
+        stats, created = import_users(rows(4), batch_size=2, workers=0)
+
+        assert stats.results[FAILED] == 2 and stats.results[CREATED] == 2
+        assert stats.errors == ["UNIQUE constraint failed: users_user.username"]
+        assert not User.objects.filter(username="student0").exists()
+
+    def test_query_count_is_per_batch(self, django_assert_num_queries):
+        # per batch: two uniqueness checks, users insert, pks read-back, emails and directory inserts,
+        # plus the savepoint pair of the batch transaction (small batches fit SQLite's parameter limit)
+        with django_assert_num_queries(2 * 8):
+            import_users(rows(100), batch_size=50, workers=0)
+
+    def test_passwords_are_hashed_in_a_process_pool(self):
+        import_users(rows(4), batch_size=2, workers=2)
+
+        assert User.objects.get(username="student1").check_password("s3cret!")
+
+
+def test_command_writes_reset_links(tmpdir):
+    source = tmpdir.join("users.csv")
+    with open(str(source), "w", newline="") as output:
+        writer = csv.DictWriter(output, fieldnames=["username", "email", "name"])
+        writer.writeheader()
+        writer.writerow({"username": "ada", "email": "ada@example.com", "name": "Ada Lovelace"})
+    links = tmpdir.join("links.csv")
+
+    call_command("import_users", str(source), workers=0, verified=True, reset_links=str(links))
+
+    ada = User.objects.get(username="ada")
+    assert not ada.has_usable_password()
+    assert EmailAddress.objects.get(user=ada).verified
+    assert "/accounts/password/reset/key/" in links.read()
+
+
+def test_command_reports_rolled_back_batches(tmpdir, monkeypatch, capsys):
+    def clashing_insert(accepted, passwords, verified_email):
+        raise IntegrityError("UNIQUE constraint failed: users_user.username")
+
+    monkeypatch.setattr(importer, "_insert_batch", clashing_insert)
+    source = tmpdir.join("users.jsonl")
+    source.write('{"username": "ada"}\n')
+
+    call_command("import_users", str(source), workers=0)
+
+    output = capsys.readouterr()
+    assert "Batch rolled back: UNIQUE constraint failed" in output.err
+    assert "1 failed" in output.out
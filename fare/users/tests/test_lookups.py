@@ -0,0 +1,80 @@
+import pytest
+from django.conf import settings
+from django.http import Http404
+from django.test import RequestFactory
+
+from fare.users.lookups import get_user_by_username
+from fare.users.tests.factories import UserFactory
+from fare.users.views import change_permission_view
+
+pytestmark = pytest.mark.django_db
+
+
+def test_lookup_is_cached_per_request(
+    user: settings.AUTH_USER_MODEL, request_factory: RequestFactory, django_assert_num_queries
+):
+    request = request_factory.get("/fake-url/")
+
+    with django_assert_num_queries(1):
+        assert get_user_by_username(request, user.username) == user
+        assert get_user_by_username(request, user.username) is get_user_by_username(request, user.username)
+
+    with django_assert_num_queries(1):
+        get_user_by_username(request_factory.get("/fake-url/"), user.username)
+
+
+def test_lookup_of_missing_user_raises_404(request_factory: RequestFactory):
+    with pytest.raises(Http404):
+        get_user_by_username(request_factory.get("/fake-url/"), "nobody")
+
+
+class TestChangeStaffPermissionQueryBudget:
+
+    def test_get_resolves_target_once(self, request_factory: RequestFactory, django_assert_num_queries):
+        staff, target = UserFactory(staff_member=True), UserFactory()
+        request = request_factory.get("/fake-url/")
+        request.user = staff
+
+        with django_assert_num_queries(1):
+            response = change_permission_view(request, username=target.username)
+            response.render()
+
+        assert response.status_code == 200
+
+    def test_post_resolves_target_once_and_saves(self, request_factory: RequestFactory, django_assert_num_queries):
+        staff, target = UserFactory(staff_member=True), UserFactory()
+        request = request_factory.post("/fake-url/", {"staff_member": "on"})
+        request.user = staff
+
+        # select the target, update it, lock it again and update its directory entry
+        with django_assert_num_queries(4):
+            response = change_permission_view(request, username=target.username)
+
+        assert response.status_code == 302
+        target.refresh_from_db()
+        assert target.staff_member
+
+    def test_superuser_target_is_rejected_with_one_query(
+        self, request_factory: RequestFactory, django_assert_num_queries
+    ):
+        staff, target = UserFactory(staff_member=True), UserFactory(is_superuser=True)
+        request = request_factory.post("/fake-url/", {"staff_member": "on"})
+        request.user = staff
+
+        with django_assert_num_queries(1):
+            response = change_permission_view(request, username=target.username)
+
+        assert response.status_code == 302
+        target.refresh_from_db()
+        assert not target.staff_member
+
+    def test_non_staff_is_rejected_without_queries(
+        self, user: settings.AUTH_USER_MODEL, request_factory: RequestFactory, django_assert_num_queries
+    ):
+        request = request_factory.get("/fake-url/")
+        request.user = user
+
+        with django_assert_num_queries(0):
+            response = change_permission_view(request, username="whoever")
+
+        assert response.status_code == 302
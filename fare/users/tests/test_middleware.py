@@ -0,0 +1,71 @@
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from fare.users.cache import get_user_stamp
+from fare.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    cache.clear()
+
+
+def user_queries(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    return response, [query for query in queries if 'FROM "users_user"' in query["sql"]]
+
+
+class TestCachedAuthenticationMiddleware:
+
+    def test_user_row_is_loaded_once(self, client, user):
+        client.force_login(user)
+
+        _, first = user_queries(client, reverse("users:redirect"))
+        response, second = user_queries(client, reverse("users:redirect"))
+
+        assert len(first) == 1
+        assert second == []
+        assert response.url == reverse("users:detail", kwargs={"username": user.username})
+
+    def test_staff_change_takes_effect_immediately(self, client):
+        target = UserFactory(staff_member=True)
+        client.force_login(target)
+        assert "Change many" in client.get(reverse("users:list")).content.decode()
+
+        staff = Client()
+        staff.force_login(UserFactory(staff_member=True))
+        staff.post(reverse("users:staff_permission", kwargs={"username": target.username}), {"staff_member": False})
+
+        assert "Change many" not in client.get(reverse("users:list")).content.decode()
+
+    def test_password_change_signs_out(self, client, user):
+        client.force_login(user)
+        client.get(reverse("users:redirect"))
+
+        user.set_password("another password")
+        user.save()
+
+        assert client.get(reverse("users:redirect")).url.startswith(reverse("account_login"))
+
+    def test_permission_changes_outdate_the_cached_user(self, user):
+        group = Group.objects.create(name="reviewers")
+        permission = Permission.objects.get(codename="change_user")
+
+        for change in (
+            lambda: user.groups.add(group),
+            lambda: group.permissions.add(permission),
+            lambda: permission.group_set.clear(),
+            lambda: permission.user_set.add(user),
+            lambda: group.user_set.remove(user),
+        ):
+            stamp = get_user_stamp(user.pk)
+            change()
+            assert get_user_stamp(user.pk) != stamp
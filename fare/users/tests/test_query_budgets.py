@@ -0,0 +1,70 @@
+"""
+Query budgets of the users pages
+
+A page going over its budget, or running a statement once per row, fails
+here with the list of its statements instead of slowing down production.
+"""
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+
+from fare.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def viewer(client):
+    # session, viewer and the rows of the page; the cached lookups start cold
+    cache.clear()
+    user = UserFactory()
+    client.force_login(user)
+    return user
+
+
+@pytest.fixture
+def many_users():
+    return UserFactory.create_batch(20)
+
+
+def test_list_page(client, viewer, many_users, query_budget):
+    with query_budget(3, repeats=1):
+        response = client.get(reverse("users:list"))
+    assert response.status_code == 200
+
+
+def test_list_search(client, viewer, many_users, query_budget):
+    with query_budget(3, repeats=1):
+        response = client.get(reverse("users:list"), {"q": many_users[0].username[:3]})
+    assert response.status_code == 200
+
+
+def test_detail_page(client, viewer, many_users, query_budget):
+    with query_budget(3, repeats=1):
+        response = client.get(reverse("users:detail", kwargs={"username": many_users[0].username}))
+    assert response.status_code == 200
+
+
+def test_search(client, viewer, many_users, query_budget):
+    with query_budget(3, repeats=1):
+        response = client.get(reverse("users:search"), {"q": many_users[0].username[:3]})
+    assert response.status_code == 200
+
+
+def test_budget_does_not_grow_with_the_users(client, viewer, many_users, query_budget):
+    client.get(reverse("users:list"))
+    with query_budget(3) as few:
+        client.get(reverse("users:list"))
+    UserFactory.create_batch(30)
+    with query_budget(few.count):
+        client.get(reverse("users:list"))
+
+
+def test_over_budget_lists_the_statements(query_budget):
+    with pytest.raises(AssertionError) as excinfo:
+        with query_budget(1, repeats=1):
+            for user in UserFactory.create_batch(3):
+                list(type(user).objects.filter(pk=user.pk))
+    assert "the budget is 1" in str(excinfo.value)
+    assert "at most 1 allowed" in str(excinfo.value)
+    assert "Queries:" in str(excinfo.value)
@@ -0,0 +1,65 @@
+import pytest
+from django.conf import settings
+from django.db import connection
+from django.urls import reverse
+
+from fare.users.search import MAX_LIMIT, search_users
+from fare.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+class TestSearchUsers:
+
+    def test_matches_username_prefix_and_name_substring(self):
+        ada = UserFactory(username="ada", name="Ada Lovelace")
+        alan = UserFactory(username="alan", name="Alan Turing")
+        grace = UserFactory(username="grace", name="Grace Hopper")
+
+        assert list(search_users("AD")) == [ada]
+        assert list(search_users("turing")) == [alan]
+        assert list(search_users("ace")) == [ada, grace]
+
+    def test_excludes_superusers_and_empty_queries(self):
+        UserFactory(username="root", is_superuser=True)
+
+        assert list(search_users("ro")) == []
+        assert list(search_users("  ")) == []
+
+    def test_results_are_bounded(self):
+        UserFactory.create_batch(MAX_LIMIT + 5, name="Same Name")
+
+        assert len(search_users("same", limit=1000)) == MAX_LIMIT
+        assert len(search_users("same", limit=3)) == 3
+
+    @pytest.mark.skipif(connection.vendor != "postgresql", reason="trigram indexes exist on PostgreSQL only")
+    def test_query_plan_uses_trigram_indexes(self):
+        queryset = search_users("ada")
+
+        with connection.cursor() as cursor:
+            # the planner prefers a sequential scan on a tiny test table
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            plan = queryset.explain()
+
+        assert "users_user_username_trgm" in plan
+        assert "users_user_name_trgm" in plan
+
+
+def test_search_view_returns_bounded_json(client, user: settings.AUTH_USER_MODEL):
+    UserFactory(username="ada", name="Ada Lovelace")
+    client.force_login(user)
+
+    response = client.get(reverse("users:search"), {"q": "lovel", "limit": "5"})
+
+    assert response.json() == {"results": [{"username": "ada", "name": "Ada Lovelace", "url": "/users/ada/"}]}
+
+
+def test_user_list_filters_on_search_query(client):
+    UserFactory(username="ada", name="Ada Lovelace")
+    # a fixed viewer, a random username could match the search too
+    client.force_login(UserFactory(username="grace", name="Grace Hopper"))
+
+    response = client.get(reverse("users:list"), {"q": "ada"})
+
+    assert [member.username for member in response.context["user_list"]] == ["ada"]
+    assert response.context["search_query"] == "ada"
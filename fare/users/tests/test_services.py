@@ -0,0 +1,39 @@
+import pytest
+from django.contrib.auth import get_user_model
+
+from fare.users.services import NOT_FOUND, SUPERUSER, UPDATED, set_staff_member
+from fare.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+User = get_user_model()
+
+
+class TestSetStaffMember:
+
+    def test_reports_result_per_username(self):
+        student, admin = UserFactory(), UserFactory(is_superuser=True)
+
+        results = set_staff_member([student.username, admin.username, "ghost"], True)
+
+        assert results == {student.username: UPDATED, admin.username: SUPERUSER, "ghost": NOT_FOUND}
+        student.refresh_from_db()
+        admin.refresh_from_db()
+        assert student.staff_member
+        assert not admin.staff_member
+
+    def test_revoke(self):
+        tutor = UserFactory(staff_member=True)
+
+        assert set_staff_member([tutor.username], False) == {tutor.username: UPDATED}
+        tutor.refresh_from_db()
+        assert not tutor.staff_member
+
+    def test_query_count_does_not_depend_on_the_number_of_users(self, django_assert_num_queries):
+        User.objects.bulk_create(User(username=f"tutor{i}") for i in range(500))
+        usernames = [f"tutor{i}" for i in range(500)]
+
+        with django_assert_num_queries(3):
+            results = set_staff_member(usernames, True)
+
+        assert set(results.values()) == {UPDATED}
+        assert User.objects.filter(staff_member=True).count() == 500
@@ -0,0 +1,209 @@
+import time
+from datetime import timedelta
+from typing import List
+
+import pytest
+from django.contrib.sessions.backends.db import SessionStore as DatabaseSessionStore
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from redis.exceptions import ConnectionError
+
+from fare.users import sessions, tasks
+from fare.users.sessions import (
+    KEY_PREFIX, CompactSerializer, SessionStore, clear_expired_database_sessions, write_to_database,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+class FakeRedis:
+    """
+    The few Redis commands the session engine uses, with expiry
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def _alive(self, key):
+        value = self.data.get(key)
+        if value is not None and value[1] < time.time():
+            del self.data[key]
+            value = None
+        return value
+
+    def get(self, key):
+        value = self._alive(key)
+        return value and value[0]
+
+    def set(self, key, value, ex, nx=False):
+        if nx and self._alive(key):
+            return None
+        self.data[key] = (value, time.time() + ex)
+        return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def exists(self, key):
+        return int(self._alive(key) is not None)
+
+    def ttl(self, key):
+        value = self._alive(key)
+        return int(value[1] - time.time()) if value else -2
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        return []
+
+
+@pytest.fixture
+def redis(monkeypatch, settings):
+    settings.SESSION_ENGINE = "fare.users.sessions"
+    settings.SESSION_DB_FALLBACK = False
+    settings.SESSION_WRITE_BEHIND = False
+    client = FakeRedis()
+    monkeypatch.setattr(sessions, "get_client", lambda: client)
+    return client
+
+
+class BrokenRedis:
+
+    def __getattr__(self, name):
+        def unreachable(*args, **kwargs):
+            raise ConnectionError("Redis is down")
+
+        return unreachable
+
+
+@pytest.fixture
+def broken_redis(redis, monkeypatch):
+    monkeypatch.setattr(sessions, "get_client", lambda: BrokenRedis())
+
+
+def database_session(**data):
+    store = DatabaseSessionStore()
+    store.update(data)
+    store.create()
+    return store.session_key
+
+
+class TestCompactSerializer:
+
+    def test_round_trip(self):
+        serializer = CompactSerializer()
+        small = {"_auth_user_id": "1"}
+        large = {"history": ["/users/~search/?q=a"] * 100}
+
+        assert serializer.dumps(small) == b'j{"_auth_user_id":"1"}'
+        assert serializer.dumps(large)[:1] == b"z"
+        assert len(serializer.dumps(large)) < 200
+        assert serializer.loads(serializer.dumps(small)) == small
+        assert serializer.loads(serializer.dumps(large)) == large
+
+
+class TestSessionStore:
+
+    def test_authenticated_requests_do_not_query_the_session_table(self, redis, client, user):
+        client.force_login(user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse("users:redirect"))
+
+        assert response.status_code == 302
+        assert not [query for query in queries if "django_session" in query["sql"]]
+        assert len(redis.data) == 1
+
+    def test_database_sessions_are_read_through(self, redis, settings):
+        session_key = database_session(answer=42)
+        assert SessionStore(session_key).load() == {}
+
+        settings.SESSION_DB_FALLBACK = True
+        assert SessionStore(session_key).load() == {"answer": 42}
+        assert redis.get(KEY_PREFIX + session_key) is not None
+
+    def test_delete_removes_the_database_copy(self, redis, settings):
+        settings.SESSION_DB_FALLBACK = True
+        session_key = database_session(answer=42)
+        store = SessionStore(session_key)
+        store.load()
+
+        store.delete()
+
+        assert not Session.objects.exists()
+        assert SessionStore(session_key).load() == {}
+
+    def test_write_behind_copies_the_session(self, redis):
+        store = SessionStore()
+        store["answer"] = 42
+        store.create()
+
+        write_to_database(store.session_key)
+        assert DatabaseSessionStore(store.session_key).load() == {"answer": 42}
+
+        redis.delete(KEY_PREFIX + store.session_key)
+        write_to_database(store.session_key)
+        assert not Session.objects.exists()
+
+    def test_lost_redis_falls_back_to_the_database(self, broken_redis, client, user, settings, monkeypatch):
+        settings.SESSION_DB_FALLBACK = True
+        settings.SESSION_WRITE_BEHIND = True
+        retried: List[str] = []
+        monkeypatch.setattr(tasks.delete_session_from_redis, "delay", retried.append)
+
+        client.force_login(user)
+        response = client.get(reverse("users:redirect"))
+
+        assert response.status_code == 302
+        assert response.wsgi_request.user == user
+        assert Session.objects.count() == 1
+
+        session_key = client.cookies[settings.SESSION_COOKIE_NAME].value
+        client.logout()
+        assert not Session.objects.exists()
+        assert session_key in retried
+
+    def test_undeleted_session_is_deleted_once_redis_is_back(self, redis, monkeypatch):
+        store = SessionStore()
+        store["answer"] = 42
+        store.create()
+        monkeypatch.setattr(sessions, "get_client", lambda: BrokenRedis())
+
+        # no worker in the tests: the failed attempt reaches the caller
+        with pytest.raises(ConnectionError):
+            store.delete()
+
+        monkeypatch.setattr(sessions, "get_client", lambda: redis)
+        tasks.delete_session_from_redis.delay(store.session_key)
+        assert SessionStore(store.session_key).load() == {}
+
+    def test_lost_redis_without_fallback_signs_out_without_error(self, broken_redis, client, user):
+        client.force_login(user)
+
+        response = client.get(reverse("users:redirect"))
+
+        assert response.status_code == 302
+        assert response.wsgi_request.user.is_anonymous
+        assert not Session.objects.exists()
+
+    def test_copy_command(self, redis):
+        session_key = database_session(answer=42)
+
+        call_command("copy_sessions_to_redis")
+
+        assert SessionStore(session_key).load() == {"answer": 42}
+
+
+def test_expired_database_sessions_are_cleared_in_chunks():
+    for _ in range(5):
+        database_session()
+    live = database_session()
+    Session.objects.exclude(session_key=live).update(expire_date=timezone.now() - timedelta(seconds=1))
+
+    assert clear_expired_database_sessions(chunk_size=2) == 5
+    assert list(Session.objects.values_list("session_key", flat=True)) == [live]
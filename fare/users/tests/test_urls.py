@@ -26,3 +26,18 @@ def test_update():
 def test_redirect():
     assert reverse("users:redirect") == "/users/~redirect/"
     assert resolve("/users/~redirect/").view_name == "users:redirect"
+
+
+def test_bulk_staff_permission():
+    assert reverse("users:bulk_staff_permission") == "/users/~changepermission/"
+    assert resolve("/users/~changepermission/").view_name == "users:bulk_staff_permission"
+
+
+def test_search():
+    assert reverse("users:search") == "/users/~search/"
+    assert resolve("/users/~search/").view_name == "users:search"
+
+
+def test_export():
+    assert reverse("users:export") == "/users/~export/"
+    assert resolve("/users/~export/").view_name == "users:export"
@@ -3,9 +3,12 @@ from django.conf import settings
 from django.test import RequestFactory, Client, TestCase
 # from django.contrib.auth.models import User
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from fare.users.views import UserRedirectView, UserUpdateView
+from fare.users.tests.factories import UserFactory
+from fare.users.views import UserListView, UserRedirectView, UserUpdateView
 
 pytestmark = pytest.mark.django_db
 MyUser = get_user_model()
@@ -311,3 +314,86 @@ class TestUserRedirectView:
         view.request = request
 
         assert view.get_redirect_url() == f"/users/{user.username}/"
+
+
+class TestUserListView:
+
+    def test_superusers_are_filtered_in_the_query(self, client, user: settings.AUTH_USER_MODEL):
+        UserFactory(username="root", is_superuser=True)
+        client.force_login(user)
+
+        response = client.get(reverse("users:list"))
+
+        usernames = [member.username for member in response.context["user_list"]]
+        assert usernames == [user.username]
+
+    def test_keyset_pages_cover_every_user_once(self, client, user: settings.AUTH_USER_MODEL):
+        UserFactory.create_batch(11)
+        client.force_login(user)
+        expected = sorted(MyUser.objects.values_list("username", flat=True))
+
+        seen, cursor = [], ""
+        while True:
+            response = client.get(reverse("users:list"), {"cursor": cursor})
+            page = response.context["page_obj"]
+            seen += [member.username for member in page]
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+
+        assert seen == expected
+
+    def test_page_query_is_bounded(self, rf: RequestFactory, user: settings.AUTH_USER_MODEL):
+        UserFactory.create_batch(30)
+        view = UserListView()
+        view.request = rf.get("/fake-url/")
+        view.request.user = user
+
+        with CaptureQueriesContext(connection) as queries:
+            paginator, page, object_list, is_paginated = view.paginate_queryset(view.get_queryset(), 10)
+
+        assert len(queries) == 1
+        sql = queries[0]["sql"].upper()
+        assert "OFFSET" not in sql
+        assert "LIMIT 11" in sql
+        assert "USERS_DIRECTORYENTRY" in sql
+        assert len(object_list) == 10 and is_paginated
+
+    def test_invalid_cursor_restarts_from_first_page(self, rf: RequestFactory, user: settings.AUTH_USER_MODEL):
+        view = UserListView()
+        view.request = rf.get("/fake-url/", {"cursor": "not-a-cursor"})
+        view.request.user = user
+
+        paginator, page, object_list, is_paginated = view.paginate_queryset(view.get_queryset(), 10)
+
+        assert [entry.username for entry in object_list] == [user.username]
+        assert not page.has_previous()
+
+
+class TestBulkChangeStaffPermissionView:
+
+    def test_non_staff_is_redirected(self, client, user: settings.AUTH_USER_MODEL):
+        target = UserFactory()
+        client.force_login(user)
+
+        response = client.post(reverse("users:bulk_staff_permission"), {"usernames": target.username})
+
+        assert response.status_code == 302
+        assert response.url == reverse("home")
+        target.refresh_from_db()
+        assert not target.staff_member
+
+    def test_staff_changes_many_users(self, client):
+        staff = UserFactory(staff_member=True)
+        tutors = UserFactory.create_batch(3)
+        admin = UserFactory(is_superuser=True)
+        client.force_login(staff)
+        usernames = "\n".join([tutor.username for tutor in tutors] + [admin.username])
+
+        response = client.post(
+            reverse("users:bulk_staff_permission"), {"usernames": usernames, "staff_member": "on"}
+        )
+
+        assert response.status_code == 200
+        assert response.context["results"][admin.username] == "superuser"
+        assert MyUser.objects.filter(staff_member=True).count() == 4
@@ -6,6 +6,10 @@ from fare.users.views import (
     user_update_view,
     user_detail_view,
     change_permission_view,
+    bulk_change_permission_view,
+    user_search_view,
+    user_export_view,
+    username_availability_view,
 )
 
 app_name = "users"
@@ -13,6 +17,10 @@ urlpatterns = [
     path("", view=user_list_view, name="list"),
     path("~redirect/", view=user_redirect_view, name="redirect"),
     path("~update/", view=user_update_view, name="update"),
+    path("~search/", view=user_search_view, name="search"),
+    path("~available/", view=username_availability_view, name="available"),
+    path("~export/", view=user_export_view, name="export"),
+    path("~changepermission/", view=bulk_change_permission_view, name="bulk_staff_permission"),
     path("<str:username>/", view=user_detail_view, name="detail"),
     path("changepermission/<str:username>/", view=change_permission_view, name="staff_permission"),
 ]
@@ -1,13 +1,28 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse
-from django.views.generic import DetailView, ListView, RedirectView, UpdateView
-from django.http import HttpResponseRedirect
+from django.views.generic import DetailView, FormView, ListView, RedirectView, UpdateView, View
+from django.db import transaction
+from django.http import HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from fare.core.transaction import read_only
+from fare.users.availability import is_username_taken
+from fare.users.cache import get_cached_fragment, get_pk_for_username, get_stamps, remember_username
+from fare.users.conditional import ConditionalGetMixin, make_validators
+from fare.users.export import FORMATS, export_lines
+from fare.users.forms import BulkStaffPermissionForm
+from fare.users.lookups import UserLookupMixin, get_user_by_username
+from fare.users.models import DirectoryEntry
+from fare.users.pagination import KeysetPaginator
+from fare.users.search import DEFAULT_LIMIT, search_filter, search_users
+from fare.users.services import set_staff_member
 
 User = get_user_model()
 
 
-class ChangeStaffPermissionView(LoginRequiredMixin, UpdateView):
+class ChangeStaffPermissionView(LoginRequiredMixin, UserLookupMixin, UpdateView):
     """
     This class allows to change the staff_member permission of a user
 
@@ -32,13 +47,19 @@ class ChangeStaffPermissionView(LoginRequiredMixin, UpdateView):
     fields = ('staff_member',)
     template_name_suffix = '_change_permission'
 
+    def has_permission(self):
+        """
+        The user must be a staff member and the requested user must not be an admin,
+        the requested user is resolved once and reused by the form and the save
+        """
+        return self.request.user.staff_member and not self.get_object().is_superuser
+
     def get(self, request, *args, **kwargs):
         """
         Manage the GET request, if the user has the permission and the requested user is not an admin,
         display the page where the he can modify the requested user's permission
         """
-        # verify if the user is a staff member and the requested user is not an admin
-        if request.user.staff_member and not User.objects.get(username=kwargs['username']).is_superuser:
+        if self.has_permission():
             return super().get(request, *args, **kwargs)
         else:
             return HttpResponseRedirect(reverse("home"))
@@ -48,8 +69,7 @@ class ChangeStaffPermissionView(LoginRequiredMixin, UpdateView):
         Manage the POST request, check the permission and if the user has it,
         change the field of the requested user unless he is an admin
         """
-        # verify if the user is a staff member and the requested user is not an admin
-        if request.user.staff_member and not User.objects.get(username=kwargs['username']).is_superuser:
+        if self.has_permission():
             return super().post(request, *args, **kwargs)
         else:
             return HttpResponseRedirect(reverse("home"))
@@ -64,24 +84,214 @@ class ChangeStaffPermissionView(LoginRequiredMixin, UpdateView):
 change_permission_view = ChangeStaffPermissionView.as_view()
 
 
-class UserDetailView(LoginRequiredMixin, DetailView):
+class BulkChangeStaffPermissionView(LoginRequiredMixin, FormView):
+    """
+    This class allows to change the staff_member permission of many users with a single request
+
+    :attr form_class: form with the list of usernames and the new permission
+    :type form_class: BulkStaffPermissionForm
+    :attr template_name: template showing the form and the per-user results
+    :type template_name: string
+    """
+    form_class = BulkStaffPermissionForm
+    template_name = "users/user_bulk_change_permission.html"
+
+    def dispatch(self, request, *args, **kwargs):
+        """
+        Only staff members can change permissions, the others are redirected to the home page
+        """
+        if request.user.is_authenticated and not request.user.staff_member:
+            return HttpResponseRedirect(reverse("home"))
+        return super().dispatch(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        """
+        Apply the change with one UPDATE and show the outcome for each requested username
+        """
+        results = set_staff_member(form.cleaned_data["usernames"], form.cleaned_data["staff_member"])
+        return self.render_to_response(self.get_context_data(form=form, results=results))
+
+
+bulk_change_permission_view = BulkChangeStaffPermissionView.as_view()
+
+
+class UserExportView(LoginRequiredMixin, View):
+    """
+    Stream all the users as CSV or JSON Lines, for course rosters
+
+    Rows are read in chunks and written to the client as they come, so the
+    export never holds the whole table in memory.
+
+    :attr format_kwarg: query string parameter holding the format, csv or jsonl
+    :type format_kwarg: string
+    """
+    http_method_names = ['get']
+    format_kwarg = "format"
+
+    def get(self, request, *args, **kwargs):
+        """
+        Only staff members can export, as for ChangeStaffPermissionView
+        """
+        if not request.user.staff_member:
+            return HttpResponseRedirect(reverse("home"))
+        export_format = request.GET.get(self.format_kwarg, "csv")
+        if export_format not in FORMATS:
+            export_format = "csv"
+        response = StreamingHttpResponse(export_lines(export_format), content_type=FORMATS[export_format][1])
+        response["Content-Disposition"] = f'attachment; filename="users.{export_format}"'
+        return response
+
+
+# the rows are streamed after the view returns, out of the request transaction
+user_export_view = transaction.non_atomic_requests(UserExportView.as_view())
+
+
+class UserDetailView(LoginRequiredMixin, ConditionalGetMixin, UserLookupMixin, DetailView):
+    """
+    Profile page of a user
 
+    The profile itself does not depend on the viewer, so it is rendered once per
+    version of the user and kept in the cache; the action buttons, which are
+    shown only to the owner, are rendered on every request.
+
+    The page changes only when the requested user or the viewer change, so its
+    validators come from their change stamps: a revalidation costs a couple of
+    cache lookups and no query for the requested user.
+
+    :attr profile_template_name: template of the cached profile fragment
+    :type profile_template_name: string
+    """
     model = User
     slug_field = "username"
     slug_url_kwarg = "username"
+    profile_template_name = "users/user_profile.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        profile = get_cached_fragment(
+            "profile", self.object, lambda: render_to_string(self.profile_template_name, {"object": self.object})
+        )
+        context["profile"] = mark_safe(profile)
+        return context
 
+    def get_cached_validators(self):
+        pk = get_pk_for_username(self.kwargs[self.slug_url_kwarg])
+        if pk is None:
+            return None
+        return make_validators(get_stamps([pk, self.request.user.pk]), pk, self.request.user.pk)
 
-user_detail_view = UserDetailView.as_view()
+    def get_validators(self):
+        pk = self.get_object().pk
+        remember_username(self.kwargs[self.slug_url_kwarg], pk)
+        return make_validators(get_stamps([pk, self.request.user.pk]), pk, self.request.user.pk)
 
 
-class UserListView(LoginRequiredMixin, ListView):
+user_detail_view = read_only(UserDetailView.as_view())
 
+
+class UserListView(LoginRequiredMixin, ConditionalGetMixin, ListView):
+    """
+    Directory of the registered users, superusers excluded
+
+    The list is read from the DirectoryEntry read model, which holds only the
+    columns the template renders, while searches go to the indexed users table.
+    Pages are fetched by keyset on (username, pk), so the cost of a page does
+    not grow with the number of users or with the position of the page. Its
+    validators come from the directory and viewer change stamps.
+
+    :attr paginate_by: number of users shown in a page
+    :type paginate_by: int
+    :attr cursor_kwarg: query string parameter holding the page cursor
+    :type cursor_kwarg: string
+    :attr search_kwarg: query string parameter holding the search text
+    :type search_kwarg: string
+    """
     model = User
     slug_field = "username"
     slug_url_kwarg = "username"
+    template_name = "users/user_list.html"
+    context_object_name = "user_list"
+    paginate_by = 50
+    cursor_kwarg = "cursor"
+    search_kwarg = "q"
+
+    def get_search_query(self):
+        return self.request.GET.get(self.search_kwarg, "").strip()
+
+    def get_queryset(self):
+        query = self.get_search_query()
+        if query:
+            return User.objects.filter(is_superuser=False).filter(search_filter(query)).only(
+                "id", "username", "staff_member"
+            )
+        return DirectoryEntry.objects.all()
+
+    def get_context_data(self, **kwargs):
+        kwargs.setdefault("search_query", self.get_search_query())
+        return super().get_context_data(**kwargs)
+
+    def get_validators(self):
+        viewer = self.request.user.pk
+        return make_validators(get_stamps([viewer], directory=True), viewer, self.request.GET.urlencode())
+
+    def paginate_queryset(self, queryset, page_size):
+        page = KeysetPaginator(queryset, page_size, keys=("username", "pk")).page(
+            self.request.GET.get(self.cursor_kwarg)
+        )
+        return (None, page, page.object_list, page.has_next() or page.has_previous())
+
+
+user_list_view = read_only(UserListView.as_view())
+
+
+class UserSearchView(LoginRequiredMixin, View):
+    """
+    Typeahead search over username and name, answering with a bounded JSON list
+
+    :attr limit_kwarg: query string parameter holding the maximum number of results
+    :type limit_kwarg: string
+    """
+    http_method_names = ['get']
+    search_kwarg = "q"
+    limit_kwarg = "limit"
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = int(request.GET.get(self.limit_kwarg, DEFAULT_LIMIT))
+        except ValueError:
+            limit = DEFAULT_LIMIT
+        users = search_users(request.GET.get(self.search_kwarg, ""), limit).values("username", "name")
+        results = [
+            dict(user, url=reverse("users:detail", kwargs={"username": user["username"]})) for user in users
+        ]
+        return JsonResponse({"results": results})
+
+
+user_search_view = read_only(UserSearchView.as_view())
+
+
+class UsernameAvailabilityView(View):
+    """
+    Tell the signup page whether a username is still free, without a query for
+    the usernames the filter rules out
+
+    :attr username_kwarg: query string parameter holding the username to check
+    :type username_kwarg: string
+    """
+    http_method_names = ['get']
+    username_kwarg = "username"
+
+    def get(self, request, *args, **kwargs):
+        username = request.GET.get(self.username_kwarg, "").strip()
+        max_length = User._meta.get_field("username").max_length
+        if not username or len(username) > max_length:
+            return JsonResponse({"error": "Enter a username."}, status=400)
+        # allauth compares usernames case insensitively at signup
+        available = not is_username_taken(username, case_sensitive=False)
+        return JsonResponse({"username": username, "available": available})
 
 
-user_list_view = UserListView.as_view()
+username_availability_view = read_only(UsernameAvailabilityView.as_view())
 
 
 class UserUpdateView(LoginRequiredMixin, UpdateView):
@@ -93,7 +303,7 @@ class UserUpdateView(LoginRequiredMixin, UpdateView):
         return reverse("users:detail", kwargs={"username": self.request.user.username})
 
     def get_object(self):
-        return User.objects.get(username=self.request.user.username)
+        return get_user_by_username(self.request, self.request.user.username)
 
 
 user_update_view = UserUpdateView.as_view()
@@ -107,4 +317,4 @@ class UserRedirectView(LoginRequiredMixin, RedirectView):
         return reverse("users:detail", kwargs={"username": self.request.user.username})
 
 
-user_redirect_view = UserRedirectView.as_view()
+user_redirect_view = read_only(UserRedirectView.as_view())